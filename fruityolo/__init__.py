@@ -0,0 +1,5 @@
+"""FruitYOLO2.0 command line entry point (`fruityolo <command>`).
+
+Subcommands are the scripts in `tools/`; they are imported only when invoked.
+"""
+__version__ = '2.0.0'
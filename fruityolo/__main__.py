@@ -0,0 +1,3 @@
+from fruityolo.cli import main
+
+raise SystemExit(main())
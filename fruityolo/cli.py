@@ -0,0 +1,126 @@
+"""Unified `fruityolo` CLI over the scripts in `tools/`.
+
+Only argparse-free string handling happens before dispatch: the chosen tool
+module is imported on demand, so `fruityolo --help` and lightweight commands
+never pay for torch/cv2/albumentations/pandas. Each tool keeps its own
+argparse; `fruityolo <command> ...` is equivalent to `python tools/<script>.py ...`.
+
+Global options go before the command and are shared by every tool:
+  --telemetry PATH                 append JSON-lines run events to PATH (tools/telemetry.py)
+  --profile cprofile|pyinstrument  profile the command and write the dump
+  --profile_out PATH               where to write it (default runs/profile/)
+"""
+import importlib
+import os
+import sys
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools')
+
+# command -> (module in tools/, one-line help)
+COMMANDS = {
+    'check-match': ('check_label_image_match', 'check image/label correspondence per split'),
+    'check-indices': ('check_label_indices', 'count class indices in label dirs'),
+    'stats': ('dataset_stats', 'box size/aspect/density histograms per split'),
+    'clean-empty': ('clean_empty_labels', 'remove empty labels and unlabeled images'),
+    'aug-preview': ('aug_preview', 'time augmentation steps and draw a contact sheet of samples'),
+    'fix-labels': ('fix_augmented_labels', 'normalize label lines and move orphan labels'),
+    'txn': ('label_txn', 'list, roll back or replay label-edit transactions'),
+    'resplit': ('resplit_dataset', 'deterministic hash-based train/val/test resplit'),
+    'augment': ('generate_augmented', 'albumentations-based offline augmentation'),
+    'remap': ('remap_external_labels', 'remap an external dataset to the project classes'),
+    'rewrite-external': ('rewrite_external_labels', 'fresh-and-rotten-fruits-3 remap preset'),
+    'compose': ('compose_dataset', 'build a manifest-based dataset mix'),
+    'pipeline': ('pipeline', 'run dataset stages with content-hash change tracking'),
+    'sweep-thresholds': ('sweep_thresholds', 'per-class conf/NMS-IoU threshold sweep'),
+    'distill': ('distill', 'cache teacher predictions and distill into a smaller student'),
+    'audit-labels': ('audit_labels', 'flag suspected mislabels from cached predictions'),
+    'mine-hard': ('mine_hard_examples', 'rank hard images from predictions and write a weight list'),
+    'ingest': ('ingest_unlabeled', 'dedup new images and rank them for labeling by model uncertainty'),
+    'ensemble': ('ensemble', 'multi-model / TTA inference fused with WBF, gain vs cost report'),
+    'gate': ('regression_gate', 'per-class AP / latency / memory gate of a candidate vs production (CPU)'),
+    'export-int8': ('export_int8', 'ONNX INT8 export calibrated on val, gated on test mAP'),
+    'convert-ckpt': ('convert_pt_to_ckpt', 'convert .pt to .ckpt'),
+    'inspect-ckpt': ('inspect_ckpt', 'list or diff checkpoint tensors without torch (mmap, constant memory)'),
+    'runs': ('run_registry', 'index runs into SQLite and query metrics across runs'),
+    'plateau': ('train_plateau_controller', 'restart training with lower LR on plateau'),
+    'profile-train': ('train_profiler', 'per-epoch dataloader/forward/val timing profile'),
+    'bench-codecs': ('bench_codecs', 'benchmark image codec backends'),
+    'bench-suite': ('bench_suite', 'time the dataset tools on synthetic datasets'),
+    'bench-startup': ('bench_startup', 'measure CLI startup time per command'),
+}
+
+
+def print_help():
+    print('usage: fruityolo <command> [args...]\n')
+    print('FruitYOLO2.0 dataset, training and evaluation tools.\n')
+    print('commands:')
+    width = max(len(c) for c in COMMANDS)
+    for name, (_, text) in COMMANDS.items():
+        print(f'  {name:{width}s}  {text}')
+    print('\nglobal options (before the command):')
+    print('  --telemetry PATH                 append JSON-lines run events (spans, counters) to PATH')
+    print('  --profile cprofile|pyinstrument  profile the command; --profile_out PATH sets the dump file')
+    print('\nRun `fruityolo <command> --help` for command options.')
+
+
+def run(command, argv, profile=None, profile_out=None):
+    module_name, _ = COMMANDS[command]
+    if TOOLS_DIR not in sys.path:
+        sys.path.insert(0, TOOLS_DIR)
+    telemetry = None
+    if profile or os.environ.get('FRUITYOLO_TELEMETRY'):
+        import telemetry
+        telemetry.start(command)
+    module = importlib.import_module(module_name)
+    saved = sys.argv
+    sys.argv = [f'fruityolo {command}'] + list(argv)
+    rc = 1
+    try:
+        rc = telemetry.profile_call(module.main, profile, profile_out) if profile else module.main()
+    except SystemExit as e:  # argparse errors and tools that exit directly
+        rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    finally:
+        sys.argv = saved
+        if telemetry:
+            telemetry.finish(rc or 0)
+    return rc or 0
+
+
+def split_global_options(argv):
+    """Strip the global options in front of the command; returns (options, rest) or raises ValueError."""
+    opts = {}
+    argv = list(argv)
+    while argv and argv[0] in ('--telemetry', '--profile', '--profile_out', '--profile-out'):
+        if len(argv) < 2:
+            raise ValueError(f'{argv[0]} needs a value')
+        key, value = argv[0].lstrip('-').replace('-', '_'), argv[1]
+        if key == 'profile' and value not in ('cprofile', 'pyinstrument'):
+            raise ValueError(f'--profile must be cprofile or pyinstrument, not {value!r}')
+        opts[key] = value
+        argv = argv[2:]
+    return opts, argv
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        opts, argv = split_global_options(argv)
+    except ValueError as e:
+        print(f'fruityolo: {e}', file=sys.stderr)
+        return 2
+    if 'telemetry' in opts:
+        os.environ['FRUITYOLO_TELEMETRY'] = opts['telemetry']  # inherited by pool workers and subprocesses
+    if not argv or argv[0] in ('-h', '--help'):
+        print_help()
+        return 0
+    if argv[0] in ('-V', '--version'):
+        from fruityolo import __version__
+        print('fruityolo', __version__)
+        return 0
+    command = argv[0]
+    if command not in COMMANDS:
+        print(f'fruityolo: unknown command {command!r}\n', file=sys.stderr)
+        print_help()
+        return 2
+    return run(command, argv[1:], opts.get('profile'), opts.get('profile_out'))
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Flag suspected mislabels by comparing cached model predictions with every labelled box.
+
+  python tools/audit_labels.py --model runs/detect/resplit_train_gpu_patience3/weights/best.pt
+  python tools/audit_labels.py --preds_root runs/audit/preds    # reuse cached predictions
+
+Predictions are made once per split on CPU (low conf, batched) and cached as
+txt under <out>/preds/<split>/labels with the model path/mtime; later runs,
+or runs with --preds_root, only read them. Each GT box is checked against
+the predictions overlapping it:
+  wrong_fruit   a confident prediction of another fruit covers the box
+  fresh_rotten  same fruit, other state (healthy <-> rotten)
+  loose_box     the model finds the same class, but the box overlaps poorly
+  no_support    nothing overlaps the box above --conf (spurious or bad box)
+and confident predictions overlapping no GT box are reported as `unlabeled`.
+Findings are scored in [0, 1] (conf x IoU, discounted by the model's own
+support for the labelled class) and ranked; the top --top go to a review queue
+(<out>/queue: crops with context, GT in green, prediction in red, plus
+queue.csv and index.html). Confusion pairs are also aggregated per file-name
+prefix (--group_regex), so a whole source mapped to the wrong fruit, e.g. a
+swapped entry in rewrite_external_labels.py, shows up as one systematic row.
+"""
+import argparse
+import csv
+import html
+import json
+import os
+import re
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from box_ops import box_iou, nms
+from dataset_stats import list_split
+from label_io import read_label_array, xywh_to_xyxy
+from mine_hard_examples import fruit_of, run_predictions
+from project_config import load_names
+
+KINDS = ('wrong_fruit', 'fresh_rotten', 'loose_box', 'no_support', 'unlabeled')
+
+
+def audit_image(gt, pr, names, conf, match_iou, unlabeled_conf):
+    """Findings for one image: [(kind, gt_index or -1, pred row or None, iou, score)]."""
+    out = []
+    pr = pr[pr[:, 5] >= min(conf, unlabeled_conf)]
+    gxy = xywh_to_xyxy(gt[:, 1:5])
+    pxy = xywh_to_xyxy(pr[:, 1:5])
+    iou = box_iou(gxy, pxy)
+    gcls = gt[:, 0].astype(np.int64)
+    pcls = pr[:, 0].astype(np.int64)
+    for j in range(len(gt)):
+        row = iou[j] if len(pr) else np.zeros(0)
+        confident = (pr[:, 5] >= conf) if len(pr) else np.zeros(0, bool)
+        hit = confident & (row >= match_iou)
+        same = hit & (pcls == gcls[j])
+        other = hit & (pcls != gcls[j])
+        support = float(pr[same, 5].max()) if same.any() else 0.0
+        if other.any():
+            k = int(np.flatnonzero(other)[pr[other, 5].argmax()])
+            if pr[k, 5] > support:
+                gn, pn = names_of(names, gcls[j]), names_of(names, pcls[k])
+                kind = 'fresh_rotten' if fruit_of(gn) == fruit_of(pn) else 'wrong_fruit'
+                out.append((kind, j, pr[k], float(row[k]), float(pr[k, 5] * row[k] * (1 - support))))
+                continue
+        if same.any():
+            continue
+        near = confident & (pcls == gcls[j]) & (row >= 0.1)
+        if near.any():
+            k = int(np.flatnonzero(near)[row[near].argmax()])
+            out.append(('loose_box', j, pr[k], float(row[k]), float(0.8 * pr[k, 5] * (1 - row[k]))))
+            continue
+        overlap = row >= 0.1
+        best = float(pr[overlap, 5].max()) if overlap.any() else 0.0
+        out.append(('no_support', j, None, 0.0, 0.5 * (1 - best)))
+    if len(pr):
+        # one finding per location: class-agnostic NMS over the confident unmatched predictions
+        cand = np.flatnonzero((pr[:, 5] >= unlabeled_conf) & ((iou.max(0) if len(gt) else np.zeros(len(pr))) < 0.1))
+        for k in cand[nms(pxy[cand], pr[cand, 5], 0.7)] if len(cand) else []:
+            out.append(('unlabeled', -1, pr[k], 0.0, float(pr[k, 5])))
+    return out
+
+
+def names_of(names, c):
+    return names[c] if 0 <= c < len(names) else str(int(c))
+
+
+def audit_chunk(task):
+    """Worker: audit one chunk of (label, image, pred) paths -> (findings, GT boxes per (group, class))."""
+    items, split, names, conf, match_iou, unlabeled_conf, group_re = task
+    group_re = re.compile(group_re)
+    findings = []
+    group_boxes = Counter()
+    for lab, img, pred in items:
+        gt = read_label_array(lab, 5) if lab else np.zeros((0, 5), np.float32)
+        pr = read_label_array(pred, 6) if pred else np.zeros((0, 6), np.float32)
+        stem = Path(lab or img).stem
+        m = group_re.match(stem)
+        group = m.group(0) if m else stem
+        group_boxes.update((group, names_of(names, int(c))) for c in gt[:, 0])
+        for kind, j, p, iou, score in audit_image(gt, pr, names, conf, match_iou, unlabeled_conf):
+            findings.append({
+                'kind': kind, 'score': round(score, 4), 'split': split, 'image': img, 'label': lab, 'group': group,
+                'box': j, 'gt': names_of(names, int(gt[j, 0])) if j >= 0 else None,
+                'gt_xywh': [round(float(v), 6) for v in gt[j, 1:5]] if j >= 0 else None,
+                'pred': names_of(names, int(p[0])) if p is not None else None,
+                'pred_xywh': [round(float(v), 6) for v in p[1:5]] if p is not None else None,
+                'conf': round(float(p[5]), 4) if p is not None else None, 'iou': round(iou, 4),
+            })
+    return findings, group_boxes
+
+
+def cached_predictions(model, img_dir, split, out, conf, imgsz, batch):
+    """Predict a split once and reuse the txt files while model and settings are unchanged."""
+    meta = {'model': str(Path(model).resolve()), 'mtime': os.stat(model).st_mtime_ns, 'conf': conf, 'imgsz': imgsz}
+    pred_dir = out / 'preds' / split / 'labels'
+    meta_path = out / 'preds' / split / 'cache.json'
+    if meta_path.exists() and json.loads(meta_path.read_text(encoding='utf-8')) == meta:
+        print(f'{split}: using cached predictions {pred_dir}')
+        return pred_dir
+    print(f'{split}: predicting {img_dir} on CPU (batch {batch})')
+    # Ultralytics only writes files for images with detections: stale ones must not survive a new model
+    shutil.rmtree(pred_dir, ignore_errors=True)
+    pred_dir = run_predictions(model, str(img_dir), conf, imgsz, out / 'preds', name=split, device='cpu', batch=batch)
+    meta_path.write_text(json.dumps(meta), encoding='utf-8')
+    return pred_dir
+
+
+def crop_finding(f, context, size, path):
+    """Crop the finding's region with context, draw GT (green) and prediction (red), save as jpg."""
+    import cv2
+    from image_codec import get_codec, imread
+    img = imread(get_codec('auto'), f['image']) if f['image'] else None
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    boxes = [xywh_to_xyxy(np.array(b, np.float32)) * [w, h, w, h] for b in (f['gt_xywh'], f['pred_xywh']) if b]
+    x1, y1 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+    x2, y2 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+    pad = context * max(x2 - x1, y2 - y1, 32)
+    cx1, cy1 = int(max(0, x1 - pad)), int(max(0, y1 - pad))
+    cx2, cy2 = int(min(w, x2 + pad)), int(min(h, y2 + pad))
+    view = img[cy1:cy2, cx1:cx2].copy()
+    t = max(1, round(max(view.shape[:2]) / size))
+    for b, color in zip([f['gt_xywh'], f['pred_xywh']], [(0, 200, 0), (0, 0, 255)]):
+        if b:
+            bx = xywh_to_xyxy(np.array(b, np.float32)) * [w, h, w, h] - [cx1, cy1, cx1, cy1]
+            cv2.rectangle(view, (int(bx[0]), int(bx[1])), (int(bx[2]), int(bx[3])), color, 2 * t)
+    r = size / max(view.shape[:2])
+    if r < 1:
+        view = cv2.resize(view, (max(1, round(view.shape[1] * r)), max(1, round(view.shape[0] * r))),
+                          interpolation=cv2.INTER_AREA)
+    cv2.imwrite(str(path), view)
+    return path
+
+
+def write_queue(findings, qdir, context, size, workers):
+    qdir.mkdir(parents=True, exist_ok=True)
+    paths = [qdir / f"{i + 1:04d}_{f['kind']}_{Path(f['image'] or f['label']).stem}_{f['box']}.jpg"
+             for i, f in enumerate(findings)]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        crops = list(ex.map(lambda a: crop_finding(a[0], context, size, a[1]), zip(findings, paths)))
+    cols = ['rank', 'kind', 'score', 'split', 'gt', 'pred', 'conf', 'iou', 'box', 'image', 'label', 'crop']
+    with open(qdir / 'queue.csv', 'w', newline='', encoding='utf-8') as fh:
+        wr = csv.writer(fh)
+        wr.writerow(cols)
+        for i, (f, c) in enumerate(zip(findings, crops)):
+            wr.writerow([i + 1] + [f[k] for k in cols[1:-1]] + [c.name if c else ''])
+    rows = []
+    for i, (f, c) in enumerate(zip(findings, crops)):
+        img = f'<img src="{html.escape(c.name)}">' if c else '(no image)'
+        rows.append(f"<tr><td>{i + 1}</td><td>{img}</td><td>{f['kind']}<br>score {f['score']}</td>"
+                    f"<td>gt: {html.escape(str(f['gt']))}<br>pred: {html.escape(str(f['pred']))}<br>"
+                    f"conf {f['conf']} iou {f['iou']}</td><td>{html.escape(str(f['image']))}<br>box {f['box']}</td></tr>")
+    (qdir / 'index.html').write_text(
+        '<html><meta charset="utf-8"><style>td{vertical-align:top;padding:4px;font:13px sans-serif}'
+        'img{max-width:256px}</style><table>' + '\n'.join(rows) + '</table></html>', encoding='utf-8')
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--root', default='Dataset_resplit_aug')
+    p.add_argument('--splits', default='train,val,test')
+    p.add_argument('--model', default=None, help='predict each split on CPU and cache the txt predictions')
+    p.add_argument('--preds_root', default=None, help='cached predictions: <preds_root>/<split>/labels/*.txt')
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--batch', type=int, default=16, help='prediction batch size')
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--conf', type=float, default=0.5, help='confidence at which the model contradicts a label')
+    p.add_argument('--unlabeled_conf', type=float, default=0.6, help='confidence for reporting unlabeled objects')
+    p.add_argument('--match_iou', type=float, default=0.5)
+    p.add_argument('--group_regex', default=r'[^_\d]+', help='file-name prefix used to group sources')
+    p.add_argument('--systematic', type=float, default=0.3,
+                   help="flag a group when this share of one class's boxes has the same confusion")
+    p.add_argument('--top', type=int, default=300, help='findings exported to the review queue')
+    p.add_argument('--context', type=float, default=0.5, help='crop padding as a fraction of the box size')
+    p.add_argument('--crop_size', type=int, default=256)
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--out', default='runs/audit')
+    args = p.parse_args()
+
+    if not args.model and not args.preds_root:
+        print('Pass --model or --preds_root')
+        return 1
+    names = load_names(classes=args.classes)
+    root = Path(args.root)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    findings = []
+    group_boxes = Counter()
+    for split in args.splits.split(','):
+        items, _, _ = list_split(root, split)
+        if not items:
+            continue
+        if args.model:
+            pred_dir = cached_predictions(args.model, root / 'images' / split, split, out,
+                                          min(0.05, args.conf), args.imgsz, args.batch)
+        else:
+            pred_dir = Path(args.preds_root) / split / 'labels'
+        triples = []
+        for lab, img in items:
+            pred = pred_dir / (Path(lab or img).stem + '.txt')
+            triples.append((lab, img, str(pred) if pred.exists() else None))
+        tasks = [(triples[i:i + 2000], split, names, args.conf, args.match_iou, args.unlabeled_conf, args.group_regex)
+                 for i in range(0, len(triples), 2000)]
+        if args.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as ex:
+                results = list(ex.map(audit_chunk, tasks))
+        else:
+            results = [audit_chunk(t) for t in tasks]
+        n0 = len(findings)
+        for f, g in results:
+            findings.extend(f)
+            group_boxes.update(g)
+        kinds = Counter(f['kind'] for f in findings[n0:])
+        print(f'{split:6s} {len(items)} images: ' + ', '.join(f'{k}={kinds[k]}' for k in KINDS))
+
+    findings.sort(key=lambda f: -f['score'])
+    pairs = Counter((f['gt'], f['pred']) for f in findings if f['kind'] in ('wrong_fruit', 'fresh_rotten'))
+    group_pairs = Counter((f['group'], f['gt'], f['pred']) for f in findings
+                          if f['kind'] in ('wrong_fruit', 'fresh_rotten'))
+    systematic = [{'group': g, 'gt': gn, 'pred': pn, 'boxes': c, 'share': round(c / group_boxes[g, gn], 3)}
+                  for (g, gn, pn), c in group_pairs.most_common()
+                  if c >= 5 and c / max(group_boxes[g, gn], 1) >= args.systematic]
+
+    if pairs:
+        print('Most frequent disagreements (label -> model):')
+        for (gn, pn), c in pairs.most_common(10):
+            print(f'  {gn:16s} -> {pn:16s} {c}')
+    for s in systematic:
+        print(f"Systematic: {s['share']:.0%} of the {s['gt']} boxes in '{s['group']}*' are predicted "
+              f"{s['pred']} (check the source mapping)")
+
+    report = {'root': str(root), 'conf': args.conf, 'match_iou': args.match_iou,
+              'counts': dict(Counter(f['kind'] for f in findings)),
+              'confusions': [{'gt': g, 'pred': pn, 'count': c} for (g, pn), c in pairs.most_common()],
+              'systematic': systematic, 'findings': findings}
+    (out / 'audit.json').write_text(json.dumps(report, indent=1), encoding='utf-8')
+    write_queue(findings[:args.top], out / 'queue', args.context, args.crop_size, args.workers)
+    print(f'{len(findings)} findings -> {out / "audit.json"}; top {min(args.top, len(findings))} '
+          f'review queue -> {out / "queue" / "index.html"}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""Preview and benchmark augmentation configs on CPU (no GPU, no torch).
+
+  python tools/aug_preview.py --config runs/detect/resplit_train_gpu_patience3/args.yaml
+  python tools/aug_preview.py --config builtin:train --compare my_aug.yaml --n 300
+
+A config is a YAML file with Ultralytics training hyperparameters at the top
+level (a run's args.yaml works as is: imgsz, mosaic, mixup, degrees, translate,
+scale, shear, perspective, hsv_h/s/v, flipud, fliplr; missing keys take the
+Ultralytics defaults) and optionally an `albumentations:` list of offline
+transforms (`- Name: {kwargs}`), applied to the source image first as
+generate_augmented.py does. Built-ins: builtin:train (Ultralytics defaults),
+builtin:offline (the Compose of generate_augmented.py, no training
+augmentation) and builtin:none.
+
+The Ultralytics steps are re-implemented with numpy/cv2 after
+ultralytics/data/augment.py (Mosaic -> RandomPerspective -> MixUp -> RandomHSV
+-> flips), close enough to judge cost and look, not bit-exact. Each of --n
+sampled training images runs through the pipeline in one process; per step we
+report ms/img, share of the total, boxes in/out and invalid boxes (outside the
+image or degenerate, the sign of a broken bbox transform), plus images/s.
+A contact sheet of the first --sheet samples with boxes and class names is
+written per config; with --compare both configs get the same images and seeds
+and their sheets are also joined side by side.
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+
+from image_codec import get_codec, imread
+from label_io import IMG_EXTS, read_label_array, xywh_to_xyxy
+from project_config import load_names
+
+ULTRALYTICS_DEFAULTS = dict(imgsz=640, mosaic=1.0, mixup=0.0, degrees=0.0, translate=0.1, scale=0.5, shear=0.0,
+                            perspective=0.0, hsv_h=0.015, hsv_s=0.7, hsv_v=0.4, flipud=0.0, fliplr=0.5)
+NO_AUGMENT = dict(ULTRALYTICS_DEFAULTS, mosaic=0.0, translate=0.0, scale=0.0, hsv_h=0.0, hsv_s=0.0, hsv_v=0.0,
+                  fliplr=0.0)
+PAD = 114
+
+
+def load_config(spec):
+    """-> (name, hyp, albumentations spec: None, 'offline' or a list of {Name: kwargs})"""
+    if spec == 'builtin:train':
+        return 'train', dict(ULTRALYTICS_DEFAULTS), None
+    if spec == 'builtin:offline':
+        return 'offline', dict(NO_AUGMENT), 'offline'
+    if spec == 'builtin:none':
+        return 'none', dict(NO_AUGMENT), None
+    import yaml
+    path = Path(spec)
+    with open(path, 'r', encoding='utf-8') as f:
+        d = yaml.safe_load(f) or {}
+    hyp = {k: d.get(k, v) for k, v in ULTRALYTICS_DEFAULTS.items()}
+    name = d.get('name') or (path.parent.name if path.name == 'args.yaml' else path.stem)
+    return str(name), hyp, d.get('albumentations')
+
+
+def albumentations_steps(spec):
+    """One single-transform Compose per transform, so each can be timed on its own."""
+    import albumentations as A
+    import cv2
+    if spec == 'offline':
+        from generate_augmented import build_transforms
+        transforms = build_transforms(A, cv2)
+    else:
+        transforms = []
+        for item in spec:
+            name, kwargs = next(iter(item.items())) if isinstance(item, dict) else (item, None)
+            transforms.append(getattr(A, name)(**(kwargs or {})))
+    bbox_params = A.BboxParams(format='pascal_voc', label_fields=['category_ids'])
+    return [(type(t).__name__, alb_step(A.Compose([t], bbox_params=bbox_params))) for t in transforms]
+
+
+def alb_step(comp):
+    def run(s, rng):
+        h, w = s['img'].shape[:2]
+        out = comp(image=s['img'], bboxes=clip_boxes(s['boxes'], w, h).tolist(), category_ids=s['cls'].tolist())
+        return {'img': out['image'], 'boxes': np.asarray(out['bboxes'], np.float32).reshape(-1, 4),
+                'cls': np.asarray(out['category_ids'], np.int64)}
+    return run
+
+
+def clip_boxes(boxes, w, h):
+    return np.stack([boxes[:, 0].clip(0, w), boxes[:, 1].clip(0, h), boxes[:, 2].clip(0, w), boxes[:, 3].clip(0, h)],
+                    1) if len(boxes) else boxes
+
+
+def invalid_boxes(s):
+    """Boxes outside the image (1px slack) or with non-positive size."""
+    b = s['boxes']
+    if not len(b):
+        return 0
+    h, w = s['img'].shape[:2]
+    bad = (b[:, 2] <= b[:, 0]) | (b[:, 3] <= b[:, 1]) | (b[:, :2] < -1).any(1) | (b[:, 2] > w + 1) | (b[:, 3] > h + 1)
+    return int(bad.sum())
+
+
+class Source:
+    """Sampled training images, loaded like Ultralytics load_image (long side resized to imgsz)."""
+
+    def __init__(self, paths, lab_dir, size):
+        self.paths = paths
+        self.lab_dir = Path(lab_dir)
+        self.size = size
+        self.codec = get_codec('auto')
+
+    def __len__(self):
+        return len(self.paths)
+
+    def load(self, i):
+        import cv2
+        p = self.paths[i]
+        img = imread(self.codec, p)
+        if img is None:
+            raise OSError(f'unreadable image {p}')
+        h, w = img.shape[:2]
+        r = self.size / max(h, w)
+        if r != 1:
+            img = cv2.resize(img, (round(w * r), round(h * r)), interpolation=cv2.INTER_LINEAR)
+        lab = read_label_array(self.lab_dir / (Path(p).stem + '.txt'), 5)
+        nh, nw = img.shape[:2]
+        boxes = xywh_to_xyxy(lab[:, 1:5]) * np.array([nw, nh, nw, nh], np.float32)
+        return {'img': img, 'boxes': clip_boxes(boxes, nw, nh), 'cls': lab[:, 0].astype(np.int64)}
+
+
+class Pipeline:
+    """Named steps mapping a sample {img, boxes (xyxy px), cls} to a new one, with per-step stats."""
+
+    def __init__(self, name, hyp, alb_spec, source):
+        self.name = name
+        self.hyp = hyp
+        self.size = int(hyp['imgsz'])
+        self.source = source
+        h = hyp
+        steps = albumentations_steps(alb_spec) if alb_spec else []
+        if h['mosaic'] > 0:
+            steps.append(('Mosaic', self.mosaic))
+        geometric = any(h[k] for k in ('degrees', 'translate', 'scale', 'shear', 'perspective')) or h['mosaic'] > 0
+        steps.append(('RandomPerspective' if geometric else 'LetterBox', self.perspective))
+        if h['mixup'] > 0:
+            steps.append(('MixUp', self.mixup))
+        if h['hsv_h'] or h['hsv_s'] or h['hsv_v']:
+            steps.append(('RandomHSV', self.hsv))
+        if h['flipud'] > 0:
+            steps.append(('FlipUD', self.flip(h['flipud'], 'ud')))
+        if h['fliplr'] > 0:
+            steps.append(('FlipLR', self.flip(h['fliplr'], 'lr')))
+        seen = {}
+        self.steps = []
+        for n, fn in steps:
+            seen[n] = seen.get(n, 0) + 1
+            self.steps.append((n if seen[n] == 1 else f'{n}#{seen[n]}', fn))
+        self.stats = {n: {'time': 0.0, 'boxes_in': 0, 'boxes_out': 0, 'invalid': 0, 'errors': 0, 'first_error': None}
+                      for n in ['load'] + [n for n, _ in self.steps]}
+
+    def run(self, i, seed):
+        """Augmented sample i, or None when its image cannot be loaded (counted under 'load')."""
+        rng = np.random.default_rng(seed)
+        # albumentations draws from the global generators
+        random.seed(seed)
+        np.random.seed(seed % 2 ** 32)
+        t0 = time.perf_counter()
+        st = self.stats['load']
+        try:
+            s = self.source.load(i)
+        except OSError as e:
+            st['errors'] += 1
+            st['first_error'] = st['first_error'] or f'{type(e).__name__}: {e}'
+            return None
+        finally:
+            st['time'] += time.perf_counter() - t0
+        st['boxes_out'] += len(s['boxes'])
+        for name, fn in self.steps:
+            st = self.stats[name]
+            st['boxes_in'] += len(s['boxes'])
+            t0 = time.perf_counter()
+            try:
+                out = fn(s, rng)
+            except Exception as e:
+                st['errors'] += 1
+                st['first_error'] = st['first_error'] or f'{type(e).__name__}: {e}'
+                out = s
+            st['time'] += time.perf_counter() - t0
+            st['boxes_out'] += len(out['boxes'])
+            st['invalid'] += invalid_boxes(out)
+            s = out
+        return s
+
+    def mosaic(self, s, rng):
+        if rng.random() > self.hyp['mosaic']:
+            return s
+        n = len(self.source)
+        return mosaic4([s] + [self.source.load(int(j)) for j in rng.integers(0, n, 3)], self.size, rng)
+
+    def perspective(self, s, rng):
+        return random_perspective(s, rng, self.hyp, self.size)
+
+    def mixup(self, s, rng):
+        if rng.random() > self.hyp['mixup']:
+            return s
+        # the second image goes through the same mosaic + perspective pre-transform
+        other = self.source.load(int(rng.integers(0, len(self.source))))
+        if self.hyp['mosaic'] > 0:
+            other = self.mosaic(other, rng)
+        other = self.perspective(other, rng)
+        r = rng.beta(32.0, 32.0)
+        img = (s['img'] * r + other['img'] * (1 - r)).astype(np.uint8)
+        return {'img': img, 'boxes': np.concatenate([s['boxes'], other['boxes']]),
+                'cls': np.concatenate([s['cls'], other['cls']])}
+
+    def hsv(self, s, rng):
+        import cv2
+        r = rng.uniform(-1, 1, 3) * [self.hyp['hsv_h'], self.hyp['hsv_s'], self.hyp['hsv_v']] + 1
+        hue, sat, val = cv2.split(cv2.cvtColor(s['img'], cv2.COLOR_BGR2HSV))
+        x = np.arange(0, 256, dtype=r.dtype)
+        lut_hue = ((x * r[0]) % 180).astype(np.uint8)
+        lut_sat = np.clip(x * r[1], 0, 255).astype(np.uint8)
+        lut_val = np.clip(x * r[2], 0, 255).astype(np.uint8)
+        im_hsv = cv2.merge((cv2.LUT(hue, lut_hue), cv2.LUT(sat, lut_sat), cv2.LUT(val, lut_val)))
+        return dict(s, img=cv2.cvtColor(im_hsv, cv2.COLOR_HSV2BGR))
+
+    @staticmethod
+    def flip(p, direction):
+        def run(s, rng):
+            if rng.random() > p:
+                return s
+            h, w = s['img'].shape[:2]
+            b = s['boxes'].copy()
+            if direction == 'lr':
+                img = np.ascontiguousarray(s['img'][:, ::-1])
+                b[:, [0, 2]] = w - s['boxes'][:, [2, 0]]
+            else:
+                img = np.ascontiguousarray(s['img'][::-1])
+                b[:, [1, 3]] = h - s['boxes'][:, [3, 1]]
+            return dict(s, img=img, boxes=b)
+        return run
+
+
+def mosaic4(samples, s, rng):
+    """2x2 mosaic on a 2s x 2s canvas around a random center (Ultralytics Mosaic._mosaic4)."""
+    yc, xc = (int(rng.uniform(s // 2, 3 * s // 2)) for _ in range(2))
+    canvas = np.full((2 * s, 2 * s, 3), PAD, np.uint8)
+    boxes, cls = [], []
+    for i, smp in enumerate(samples):
+        img = smp['img']
+        h, w = img.shape[:2]
+        if i == 0:
+            x1a, y1a, x2a, y2a = max(xc - w, 0), max(yc - h, 0), xc, yc
+            x1b, y1b, x2b, y2b = w - (x2a - x1a), h - (y2a - y1a), w, h
+        elif i == 1:
+            x1a, y1a, x2a, y2a = xc, max(yc - h, 0), min(xc + w, s * 2), yc
+            x1b, y1b, x2b, y2b = 0, h - (y2a - y1a), min(w, x2a - x1a), h
+        elif i == 2:
+            x1a, y1a, x2a, y2a = max(xc - w, 0), yc, xc, min(s * 2, yc + h)
+            x1b, y1b, x2b, y2b = w - (x2a - x1a), 0, w, min(y2a - y1a, h)
+        else:
+            x1a, y1a, x2a, y2a = xc, yc, min(xc + w, s * 2), min(s * 2, yc + h)
+            x1b, y1b, x2b, y2b = 0, 0, min(w, x2a - x1a), min(y2a - y1a, h)
+        canvas[y1a:y2a, x1a:x2a] = img[y1b:y2b, x1b:x2b]
+        boxes.append(smp['boxes'] + np.array([x1a - x1b, y1a - y1b] * 2, np.float32))
+        cls.append(smp['cls'])
+    boxes = clip_boxes(np.concatenate(boxes), 2 * s, 2 * s)
+    cls = np.concatenate(cls)
+    keep = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+    return {'img': canvas, 'boxes': boxes[keep], 'cls': cls[keep], 'border': -s // 2}
+
+
+def random_perspective(s, rng, hyp, size):
+    """Ultralytics RandomPerspective: letterbox unless coming from mosaic, then one affine/perspective warp."""
+    import cv2
+    border = s.get('border', 0)
+    img, boxes = s['img'], s['boxes']
+    if not border:
+        from export_int8 import letterbox
+        h0, w0 = img.shape[:2]
+        r = min(size / h0, size / w0)
+        top, left = (size - round(h0 * r)) // 2, (size - round(w0 * r)) // 2
+        img = letterbox(img, size, PAD)
+        boxes = boxes * r + np.array([left, top, left, top], np.float32)
+    height, width = img.shape[0] + border * 2, img.shape[1] + border * 2
+
+    C = np.eye(3, dtype=np.float32)
+    C[0, 2] = -img.shape[1] / 2
+    C[1, 2] = -img.shape[0] / 2
+    P = np.eye(3, dtype=np.float32)
+    P[2, 0] = rng.uniform(-hyp['perspective'], hyp['perspective'])
+    P[2, 1] = rng.uniform(-hyp['perspective'], hyp['perspective'])
+    R = np.eye(3, dtype=np.float32)
+    a = rng.uniform(-hyp['degrees'], hyp['degrees'])
+    scale = rng.uniform(1 - hyp['scale'], 1 + hyp['scale'])
+    R[:2] = cv2.getRotationMatrix2D(angle=a, center=(0, 0), scale=scale)
+    S = np.eye(3, dtype=np.float32)
+    S[0, 1] = np.tan(np.deg2rad(rng.uniform(-hyp['shear'], hyp['shear'])))
+    S[1, 0] = np.tan(np.deg2rad(rng.uniform(-hyp['shear'], hyp['shear'])))
+    T = np.eye(3, dtype=np.float32)
+    T[0, 2] = rng.uniform(0.5 - hyp['translate'], 0.5 + hyp['translate']) * width
+    T[1, 2] = rng.uniform(0.5 - hyp['translate'], 0.5 + hyp['translate']) * height
+    M = T @ S @ R @ P @ C
+    if border or (M != np.eye(3)).any():
+        if hyp['perspective']:
+            img = cv2.warpPerspective(img, M, dsize=(width, height), borderValue=(PAD,) * 3)
+        else:
+            img = cv2.warpAffine(img, M[:2], dsize=(width, height), borderValue=(PAD,) * 3)
+
+    n = len(boxes)
+    if not n:
+        return {'img': img, 'boxes': boxes, 'cls': s['cls']}
+    xy = np.ones((n * 4, 3), dtype=np.float32)
+    xy[:, :2] = boxes[:, [0, 1, 2, 3, 0, 3, 2, 1]].reshape(n * 4, 2)
+    xy = xy @ M.T
+    xy = (xy[:, :2] / xy[:, 2:3] if hyp['perspective'] else xy[:, :2]).reshape(n, 8)
+    new = np.stack([xy[:, 0::2].min(1), xy[:, 1::2].min(1), xy[:, 0::2].max(1), xy[:, 1::2].max(1)], 1)
+    new = clip_boxes(new, width, height)
+    # box_candidates: > 2px, > 10% of the (scaled) original area, aspect < 100
+    w1, h1 = (boxes[:, 2] - boxes[:, 0]) * scale, (boxes[:, 3] - boxes[:, 1]) * scale
+    w2, h2 = new[:, 2] - new[:, 0], new[:, 3] - new[:, 1]
+    ar = np.maximum(w2 / (h2 + 1e-16), h2 / (w2 + 1e-16))
+    keep = (w2 > 2) & (h2 > 2) & (w2 * h2 / (w1 * h1 + 1e-16) > 0.1) & (ar < 100)
+    return {'img': img, 'boxes': new[keep].astype(np.float32), 'cls': s['cls'][keep]}
+
+
+def palette(n):
+    import cv2
+    hsv = np.stack([np.arange(n) * 180 // max(n, 1), np.full(n, 220), np.full(n, 255)], 1).astype(np.uint8)
+    return [tuple(int(v) for v in c) for c in cv2.cvtColor(hsv[None], cv2.COLOR_HSV2BGR)[0]]
+
+
+def draw_sample(s, names, colors, tile):
+    import cv2
+    img = s['img'].copy()
+    h, w = img.shape[:2]
+    for b, c in zip(s['boxes'], s['cls']):
+        x1, y1, x2, y2 = (int(round(v)) for v in b)
+        broken = x2 <= x1 or y2 <= y1 or x1 < -1 or y1 < -1 or x2 > w + 1 or y2 > h + 1
+        color = (0, 0, 255) if broken else colors[int(c) % len(colors)]
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, 4 if broken else 2)
+        label = names[c] if 0 <= c < len(names) else str(int(c))
+        cv2.putText(img, ('! ' if broken else '') + label, (max(x1, 0), max(y1 - 4, 12)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5 * max(w, h) / tile, color, 1 + max(w, h) // tile, cv2.LINE_AA)
+    r = tile / max(h, w)
+    img = cv2.resize(img, (max(1, round(w * r)), max(1, round(h * r))), interpolation=cv2.INTER_AREA)
+    out = np.full((tile, tile, 3), PAD, np.uint8)
+    out[:img.shape[0], :img.shape[1]] = img
+    return out
+
+
+def contact_sheet(tiles, title, cols=4, gap=4, header=32):
+    import cv2
+    tile = tiles[0].shape[0]
+    rows = (len(tiles) + cols - 1) // cols
+    sheet = np.full((header + rows * (tile + gap) + gap, cols * (tile + gap) + gap, 3), 255, np.uint8)
+    cv2.putText(sheet, title, (gap, header - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2, cv2.LINE_AA)
+    for k, t in enumerate(tiles):
+        y = header + gap + (k // cols) * (tile + gap)
+        x = gap + (k % cols) * (tile + gap)
+        sheet[y:y + tile, x:x + tile] = t
+    return sheet
+
+
+def bench(pipe, n, sheet_n, seed, names, tile):
+    colors = palette(max(len(names), 16))
+    tiles = []
+    t0 = time.perf_counter()
+    done = 0
+    for i in range(n):
+        s = pipe.run(i, seed + i)
+        if s is None:  # unreadable image, counted in stats['load']
+            continue
+        done += 1
+        if len(tiles) < sheet_n:
+            tiles.append(draw_sample(s, names, colors, tile))
+    wall = time.perf_counter() - t0
+    steps = {}
+    total = sum(st['time'] for st in pipe.stats.values())
+    per = max(done, 1)
+    for name, st in pipe.stats.items():
+        steps[name] = dict(st, ms_per_img=1000 * st['time'] / per, share=st['time'] / total if total else 0.0)
+        del steps[name]['time']
+    return {'name': pipe.name, 'hyp': pipe.hyp, 'images': done, 'wall_s': wall,
+            'img_per_s': done / total if total else 0.0, 'ms_per_img': 1000 * total / per, 'steps': steps}, tiles
+
+
+def print_report(rep):
+    print(f"\n{rep['name']}: {rep['images']} images, imgsz {rep['hyp']['imgsz']}")
+    print(f"  {'step':22s} {'ms/img':>8s} {'share':>7s} {'boxes in -> out':>17s} {'invalid':>8s} {'errors':>7s}")
+    for name, st in rep['steps'].items():
+        print(f"  {name:22s} {st['ms_per_img']:8.2f} {st['share']:7.1%} {st['boxes_in']:8d} -> {st['boxes_out']:<6d}"
+              f" {st['invalid']:8d} {st['errors']:7d}")
+        if st['first_error']:
+            print(f"      first error: {st['first_error']}")
+    print(f"  total {rep['ms_per_img']:.2f} ms/img -> {rep['img_per_s']:.1f} img/s in one process "
+          f"(dataloader workers scale this roughly linearly)")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--config', default='runs/detect/resplit_train_gpu_patience3/args.yaml',
+                   help='YAML with Ultralytics hyperparameters and/or albumentations list, or builtin:train|offline|none')
+    p.add_argument('--compare', default=None, help='second config, run on the same images and seeds')
+    p.add_argument('--images', default='Dataset_resplit_aug/images/train')
+    p.add_argument('--labels', default=None, help='label dir (default: images dir with images -> labels)')
+    p.add_argument('--n', type=int, default=200, help='sampled images to run through each pipeline')
+    p.add_argument('--sheet', type=int, default=16, help='samples on the contact sheet')
+    p.add_argument('--tile', type=int, default=320, help='contact sheet tile size (px)')
+    p.add_argument('--imgsz', type=int, default=None, help='override the config imgsz')
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--out', default='runs/aug_preview')
+    args = p.parse_args()
+
+    import cv2
+
+    img_dir = Path(args.images)
+    lab_dir = Path(args.labels) if args.labels else img_dir.parent.parent / 'labels' / img_dir.name
+    paths = sorted(str(q) for q in img_dir.iterdir() if q.suffix.lower() in IMG_EXTS)
+    if not paths:
+        print('No images in', img_dir)
+        return 1
+    random.Random(args.seed).shuffle(paths)
+    paths = paths[:args.n]
+    names = load_names(classes=args.classes)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    reports, sheets = [], []
+    for spec in [args.config] + ([args.compare] if args.compare else []):
+        name, hyp, alb = load_config(spec)
+        if args.imgsz:
+            hyp['imgsz'] = args.imgsz
+        if any(r['name'] == name for r in reports):
+            name += '_b'
+        pipe = Pipeline(name, hyp, alb, Source(paths, lab_dir, int(hyp['imgsz'])))
+        rep, tiles = bench(pipe, len(paths), args.sheet, args.seed, names, args.tile)
+        rep['config'] = spec
+        print_report(rep)
+        sheet = contact_sheet(tiles, f'{name}  ({spec})') if tiles else None
+        if sheet is not None:
+            rep['sheet'] = str(out / f'{name}_sheet.jpg')
+            cv2.imwrite(rep['sheet'], sheet)
+            sheets.append(sheet)
+        reports.append(rep)
+
+    if len(reports) == 2:
+        a, b = reports
+        print(f"\n{b['name']} vs {a['name']}: {b['img_per_s']:.1f} vs {a['img_per_s']:.1f} img/s "
+              f"(x{b['img_per_s'] / a['img_per_s']:.2f}), invalid boxes "
+              f"{sum(s['invalid'] for s in b['steps'].values())} vs {sum(s['invalid'] for s in a['steps'].values())}")
+        if len(sheets) == 2:
+            h = max(s.shape[0] for s in sheets)
+            padded = [np.pad(s, ((0, h - s.shape[0]), (0, 0), (0, 0)), constant_values=255) for s in sheets]
+            gap = np.full((h, 12, 3), 0, np.uint8)
+            cv2.imwrite(str(out / 'compare_sheet.jpg'), np.hstack([padded[0], gap, padded[1]]))
+            print('Side-by-side sheet ->', out / 'compare_sheet.jpg')
+    (out / 'report.json').write_text(json.dumps(reports, indent=2, default=float), encoding='utf-8')
+    print('Report ->', out / 'report.json')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
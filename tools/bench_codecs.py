@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Benchmark image codec backends on a sample of dataset images.
+
+Reports per backend: full decode MB/s (compressed input), reduced decode MB/s
+(--max_size, DCT downscaling), encode MB/s (raw BGR pixels in) and mean output
+size at the given quality.
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+from image_codec import JPEG_EXTS, available_backends, get_codec
+from label_io import IMG_EXTS
+
+
+def decode_or_none(codec, data, max_size=None):
+    try:
+        return codec.decode_bytes(data, max_size)
+    except Exception:
+        return None
+
+
+def bench_backend(codec, blobs, max_size, quality, progressive, repeat):
+    """Throughput of one backend; None when it decodes none of the sample."""
+    in_bytes = sum(len(b) for b in blobs)
+    res = {'backend': codec.name}
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        imgs = [decode_or_none(codec, b) for b in blobs]
+    dt = time.perf_counter() - t0
+    imgs = [im for im in imgs if im is not None]
+    if not imgs:
+        return None
+    res['decode_MBps'] = in_bytes * repeat / dt / 1e6
+    res['decode_img_per_s'] = len(blobs) * repeat / dt
+
+    if max_size:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            small = [decode_or_none(codec, b, max_size) for b in blobs]
+        dt = time.perf_counter() - t0
+        res['reduced_decode_MBps'] = in_bytes * repeat / dt / 1e6
+        res['reduced_shape_example'] = next((list(im.shape) for im in small if im is not None), None)
+
+    raw_bytes = sum(im.nbytes for im in imgs)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        outs = [codec.encode_bytes(im, '.jpg', quality, progressive) for im in imgs]
+    dt = time.perf_counter() - t0
+    res['encode_MBps'] = raw_bytes * repeat / dt / 1e6
+    res['encode_img_per_s'] = len(imgs) * repeat / dt
+    res['mean_out_KB'] = sum(len(o) for o in outs) / len(outs) / 1024
+    res['mean_in_KB'] = in_bytes / len(blobs) / 1024
+    return res
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--images', default='Dataset_resplit_aug/images/train', help='image dir to sample from')
+    p.add_argument('-n', '--num', type=int, default=100, help='number of sampled images')
+    p.add_argument('--backends', default=None, help='comma list (default: all installed)')
+    p.add_argument('--max_size', type=int, default=640, help='target longest side for reduced decode (0 = skip)')
+    p.add_argument('--quality', type=int, default=90)
+    p.add_argument('--progressive', action='store_true')
+    p.add_argument('--repeat', type=int, default=1)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--json', default=None, help='also write results to this JSON file')
+    args = p.parse_args()
+
+    files = sorted(f for f in Path(args.images).iterdir() if f.suffix.lower() in IMG_EXTS)
+    if not files:
+        print('No images found in', args.images)
+        return 1
+    random.Random(args.seed).shuffle(files)
+    # decode benchmarks are JPEG-specific; keep the sample homogeneous
+    files = [f for f in files if f.suffix.lower() in JPEG_EXTS][:args.num]
+    blobs = [f.read_bytes() for f in files]
+    if not blobs:
+        print('No JPEGs found in', args.images, '(decode benchmarks are JPEG-only)')
+        return 1
+    print(f'Sampled {len(blobs)} JPEGs from {args.images} ({sum(map(len, blobs)) / 1e6:.1f} MB)')
+
+    backends = args.backends.split(',') if args.backends else available_backends()
+    results = []
+    for name in backends:
+        try:
+            codec = get_codec(name)
+        except Exception as e:
+            print(f'{name}: unavailable ({e})')
+            continue
+        res = bench_backend(codec, blobs, args.max_size, args.quality, args.progressive, args.repeat)
+        if res is None:
+            print(f'{name}: none of the {len(blobs)} sampled JPEGs decoded')
+            continue
+        results.append(res)
+    if not results:
+        print('No backend could decode the sample')
+        return 1
+
+    print(f"{'backend':10s} {'dec MB/s':>9s} {'img/s':>7s} {'red MB/s':>9s} {'enc MB/s':>9s} {'img/s':>7s} {'out KB':>7s} {'in KB':>7s}")
+    for r in results:
+        print(f"{r['backend']:10s} {r['decode_MBps']:9.1f} {r['decode_img_per_s']:7.1f} "
+              f"{r.get('reduced_decode_MBps', float('nan')):9.1f} {r['encode_MBps']:9.1f} "
+              f"{r['encode_img_per_s']:7.1f} {r['mean_out_KB']:7.1f} {r['mean_in_KB']:7.1f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({'args': vars(args), 'results': results}, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
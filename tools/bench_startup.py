@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Measure `fruityolo` startup time and which heavy modules each command imports.
+
+Every command is run as `python -X importtime -m fruityolo <cmd> --help` in a
+fresh interpreter; the median wall time over --repeat runs is reported
+together with any heavy dependency that got imported. Commands listed in
+--fast must stay under --budget_ms and import none of them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ('torch', 'cv2', 'albumentations', 'pandas', 'ultralytics', 'numpy', 'yaml', 'PIL', 'onnxruntime')
+FAST = ('', 'check-match', 'check-indices', 'clean-empty')
+
+
+def bare_python_ms():
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'])
+    return (time.perf_counter() - t0) * 1000
+
+
+def run_once(cmd):
+    args = [sys.executable, '-X', 'importtime', '-m', 'fruityolo'] + ([cmd, '--help'] if cmd else ['--help'])
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    t0 = time.perf_counter()
+    proc = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True)
+    dt = (time.perf_counter() - t0) * 1000
+    imported = set()
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            if name and not name.startswith('imported'):
+                imported.add(name.split('.')[0])
+    return dt, proc.returncode, imported
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--commands', default=None, help='comma list of commands (default: all; "" = bare --help)')
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--budget_ms', type=float, default=100.0)
+    p.add_argument('--fast', default=','.join(FAST), help='commands held to the budget')
+    p.add_argument('--json', default=None, help='also write results to this JSON file')
+    args = p.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    from fruityolo.cli import COMMANDS
+
+    commands = args.commands.split(',') if args.commands is not None else [''] + list(COMMANDS)
+    fast = set(args.fast.split(','))
+    # interpreter baseline so the budget can be read relative to bare python startup
+    base = statistics.median(bare_python_ms() for _ in range(args.repeat))
+    print(f'python -c pass: {base:.1f} ms')
+
+    results = []
+    failed = False
+    for cmd in commands:
+        runs = [run_once(cmd) for _ in range(args.repeat)]
+        ms = statistics.median(r[0] for r in runs)
+        heavy = sorted(m for m in runs[-1][2] if m in HEAVY)
+        rc = runs[-1][1]
+        over = cmd in fast and (ms > args.budget_ms or heavy)
+        failed |= bool(over)
+        results.append({'command': cmd or '--help', 'median_ms': round(ms, 1), 'returncode': rc, 'heavy_imports': heavy})
+        flag = '  OVER BUDGET' if over else ''
+        print(f"{cmd or '--help':18s} {ms:7.1f} ms  rc={rc}  heavy={','.join(heavy) or '-'}{flag}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'baseline_ms': base, 'results': results}, indent=2), encoding='utf-8')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the dataset tools on synthetic YOLO datasets.
+
+  python tools/bench_suite.py gen --n 1000 --out .bench/data_1000      # just build a dataset
+  python tools/bench_suite.py run --sizes 1k,10k,100k --json bench.json
+  python tools/bench_suite.py run --sizes 1k --compare bench_baseline.json
+  python tools/bench_suite.py compare bench.json bench_baseline.json
+
+Synthetic datasets (random JPEGs + 1-4 boxes per image over the project's 16
+classes, a few empty labels) are generated once per size and seed under
+--work and reused. Each tool runs as `python -m fruityolo <cmd>` in a fresh
+process; wall time (median of --repeat) and peak RSS of the child are
+recorded. Tools that modify their input run on a hardlinked copy.
+`compare` flags tools that got slower than the baseline by more than
+--tolerance (and --min_delta seconds) and exits non-zero.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from stream_io import MAXRSS_PER_MB
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# name -> (argv builder(data, scratch), modifies its input)
+BENCHES = {
+    'check-match': (lambda d, w: ['check-match', '--root', d], False),
+    'check-indices': (lambda d, w: ['check-indices'] + [f'{d}/labels/{s}' for s in ('train', 'val', 'test')], False),
+    'resplit': (lambda d, w: ['resplit', '--src_images', f'{d}/images', '--src_labels', f'{d}/labels',
+                              '--out', f'{w}/resplit', '--classes', f'{d}/classes.txt'], False),
+    'augment': (lambda d, w: ['augment', '--src', d, '--out', f'{w}/aug', '--classes', f'{d}/classes.txt'], False),
+    'fix-labels': (lambda d, w: ['fix-labels', '--root', d, '--orphan', f'{w}/orphans',
+                                 '--classes', f'{d}/classes.txt', '--journal', f'{w}/txn'], True),
+    'clean-empty': (lambda d, w: ['clean-empty', '--labels', f'{d}/labels/train', '--images', f'{d}/images/train',
+                                  '--journal', f'{w}/txn'], True),
+}
+
+
+def parse_sizes(text):
+    out = []
+    for tok in text.split(','):
+        tok = tok.strip().lower()
+        if tok:
+            out.append(int(float(tok[:-1]) * 1000) if tok.endswith('k') else int(tok))
+    return out
+
+
+def random_image(rng, size):
+    import numpy as np
+    img = np.empty((size, size, 3), np.uint8)
+    img[:] = rng.integers(40, 216, 3)
+    # a few flat blobs so JPEG sizes resemble real photos more than pure noise does
+    for _ in range(int(rng.integers(2, 6))):
+        x0, y0 = rng.integers(0, size - 8, 2)
+        w, h = rng.integers(8, size // 2, 2)
+        img[y0:y0 + h, x0:x0 + w] = rng.integers(0, 256, 3)
+    img += rng.integers(0, 24, img.shape, dtype=np.uint8)
+    return img
+
+
+def make_synthetic(out, n, seed=0, img_size=160, pool=64, empty_frac=0.02, quality=85):
+    """Write a YOLO dataset of n images (80/10/10 train/val/test); reused if already built with the same spec."""
+    import numpy as np
+    from image_codec import get_codec
+    from project_config import load_names, write_data_yaml
+
+    out = Path(out)
+    spec = {'n': n, 'seed': seed, 'img_size': img_size, 'pool': pool, 'empty_frac': empty_frac, 'quality': quality}
+    marker = out / 'synthetic.json'
+    if marker.exists() and json.loads(marker.read_text(encoding='utf-8')) == spec:
+        return out
+    if out.exists():
+        shutil.rmtree(out)
+
+    names = load_names() or [f'class_{i}' for i in range(16)]
+    nc = len(names)
+    rng = np.random.default_rng(seed)
+    codec = get_codec('auto')
+    # encoding is the slow part; reuse a pool of encoded images across files
+    blobs = [codec.encode_bytes(random_image(rng, img_size), '.jpg', quality) for _ in range(pool)]
+
+    rnd = random.Random(seed)
+    splits = ['train'] * 8 + ['val', 'test']
+    for s in ('train', 'val', 'test'):
+        (out / 'images' / s).mkdir(parents=True, exist_ok=True)
+        (out / 'labels' / s).mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    for i in range(n):
+        split = splits[i % 10]
+        stem = f'syn_{i:07d}'
+        with open(out / 'images' / split / f'{stem}.jpg', 'wb') as f:
+            f.write(blobs[rnd.randrange(pool)])
+        lines = []
+        if rnd.random() >= empty_frac:
+            for _ in range(rnd.randint(1, 4)):
+                w, h = rnd.uniform(0.05, 0.6), rnd.uniform(0.05, 0.6)
+                x, y = rnd.uniform(w / 2, 1 - w / 2), rnd.uniform(h / 2, 1 - h / 2)
+                lines.append(f'{rnd.randrange(nc)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}')
+        (out / 'labels' / split / f'{stem}.txt').write_text('\n'.join(lines) + ('\n' if lines else ''), encoding='utf-8')
+    (out / 'classes.txt').write_text('\n'.join(names) + '\n', encoding='utf-8')
+    write_data_yaml(out, names, header='synthetic benchmark dataset')
+    marker.write_text(json.dumps(spec), encoding='utf-8')
+    print(f'Generated {n} images in {out} ({time.perf_counter() - t0:.1f}s)')
+    return out
+
+
+def link_tree(src, dst):
+    if os.path.exists(dst):
+        shutil.rmtree(dst)
+    try:
+        shutil.copytree(src, dst, copy_function=os.link)
+    except OSError:
+        shutil.rmtree(dst, ignore_errors=True)
+        shutil.copytree(src, dst)
+
+
+def run_tool(argv, log_path):
+    """(wall_s, returncode, peak_rss_mb) of `python -m fruityolo <argv>` in a fresh process."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    with open(log_path, 'w', encoding='utf-8') as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, '-m', 'fruityolo'] + argv, stdout=log, stderr=subprocess.STDOUT, env=env)
+        if hasattr(os, 'wait4'):
+            _, status, ru = os.wait4(proc.pid, 0)
+            wall = time.perf_counter() - t0
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return wall, proc.returncode, ru.ru_maxrss / MAXRSS_PER_MB
+        proc.wait()
+        return time.perf_counter() - t0, proc.returncode, None
+
+
+def environment():
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'git_rev': rev or None, 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def cmd_gen(args):
+    make_synthetic(args.out, args.n, seed=args.seed, img_size=args.img_size)
+    return 0
+
+
+def cmd_run(args):
+    tools = args.tools.split(',') if args.tools else list(BENCHES)
+    unknown = set(tools) - set(BENCHES)
+    if unknown:
+        print('Unknown tools:', ', '.join(sorted(unknown)), '(choices:', ', '.join(BENCHES) + ')')
+        return 2
+    work = Path(args.work)
+    logs = work / 'logs'
+    logs.mkdir(parents=True, exist_ok=True)
+    results = []
+    for n in parse_sizes(args.sizes):
+        data = make_synthetic(work / f'data_{n}', n, seed=args.seed, img_size=args.img_size)
+        for tool in tools:
+            build, mutates = BENCHES[tool]
+            walls, rss, rc = [], [], 0
+            for r in range(args.repeat):
+                scratch = work / 'scratch'
+                shutil.rmtree(scratch, ignore_errors=True)
+                scratch.mkdir(parents=True)
+                target = data
+                if mutates:
+                    target = scratch / 'data'
+                    link_tree(data, target)
+                wall, rc, peak = run_tool(build(str(target), str(scratch)), logs / f'{tool}_{n}.log')
+                if rc != 0:
+                    break
+                walls.append(wall)
+                rss.append(peak)
+            rec = {'tool': tool, 'n_images': n, 'returncode': rc}
+            if walls:
+                med = statistics.median(walls)
+                rec.update(wall_s=round(med, 4), min_s=round(min(walls), 4), runs=len(walls),
+                           images_per_s=round(n / med, 1), peak_rss_mb=max(rss) if rss[0] is not None else None)
+            results.append(rec)
+            if rc == 0:
+                print(f"{tool:14s} n={n:<7d} {rec['wall_s']:8.2f}s  {rec['images_per_s']:10.1f} img/s  "
+                      f"rss={rec['peak_rss_mb'] or 0:.0f}MB")
+            else:
+                print(f'{tool:14s} n={n:<7d} FAILED rc={rc} (see {logs / f"{tool}_{n}.log"})')
+    shutil.rmtree(work / 'scratch', ignore_errors=True)
+
+    report = {'env': environment(), 'repeat': args.repeat, 'results': results}
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print('Wrote', args.json)
+    if args.compare:
+        return compare(report, json.loads(Path(args.compare).read_text(encoding='utf-8')), args.tolerance, args.min_delta)
+    return 0
+
+
+def compare(new, base, tolerance, min_delta):
+    """Print per-tool ratios against a baseline report; 1 if anything regressed."""
+    base_idx = {(r['tool'], r['n_images']): r for r in base['results'] if r.get('wall_s') is not None}
+    regressed = 0
+    print(f"baseline: {base.get('env', {}).get('git_rev')} ({base.get('env', {}).get('time')})")
+    for r in new['results']:
+        b = base_idx.get((r['tool'], r['n_images']))
+        if b is None or r.get('wall_s') is None:
+            status = 'FAILED' if r.get('returncode') else 'no baseline'
+            print(f"{r['tool']:14s} n={r['n_images']:<7d} {status}")
+            regressed += bool(r.get('returncode'))
+            continue
+        ratio = r['wall_s'] / max(b['wall_s'], 1e-9)
+        slow = ratio > 1 + tolerance and r['wall_s'] - b['wall_s'] > min_delta
+        regressed += slow
+        print(f"{r['tool']:14s} n={r['n_images']:<7d} {b['wall_s']:8.2f}s -> {r['wall_s']:8.2f}s  "
+              f"x{ratio:.2f}{'  SLOWER' if slow else ''}")
+    print(f'{regressed} regression(s) at tolerance {tolerance:.0%}')
+    return 1 if regressed else 0
+
+
+def cmd_compare(args):
+    new = json.loads(Path(args.new).read_text(encoding='utf-8'))
+    base = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    return compare(new, base, args.tolerance, args.min_delta)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest='cmd', required=True)
+    s = sub.add_parser('gen', help='generate a synthetic dataset')
+    s.add_argument('--n', type=int, default=1000)
+    s.add_argument('--out', default='.bench/data_1000')
+    s.add_argument('--seed', type=int, default=0)
+    s.add_argument('--img_size', type=int, default=160)
+    s = sub.add_parser('run', help='time the tools on synthetic datasets')
+    s.add_argument('--sizes', default='1k,10k,100k', help='comma list of dataset sizes (k suffix allowed)')
+    s.add_argument('--tools', default=None, help=f'comma list (default: {",".join(BENCHES)})')
+    s.add_argument('--repeat', type=int, default=3)
+    s.add_argument('--work', default='.bench', help='synthetic datasets, scratch outputs and logs')
+    s.add_argument('--seed', type=int, default=0)
+    s.add_argument('--img_size', type=int, default=160)
+    s.add_argument('--json', default='.bench/bench.json', help='results file')
+    s.add_argument('--compare', default=None, help='baseline JSON to compare against')
+    c = sub.add_parser('compare', help='compare two result files')
+    c.add_argument('new')
+    c.add_argument('baseline')
+    for parser in (s, c):
+        parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown')
+        parser.add_argument('--min_delta', type=float, default=0.05, help='ignore slowdowns smaller than this (s)')
+    args = p.parse_args()
+    return {'gen': cmd_gen, 'run': cmd_run, 'compare': cmd_compare}[args.cmd](args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Vectorized box operations (IoU, NMS, weighted boxes fusion) on xyxy numpy arrays."""
+import numpy as np
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy arrays -> (N, M)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-12)
+
+
+def nms(boxes, scores, iou_thr):
+    """Greedy NMS; returns kept indices in descending score order."""
+    order = np.argsort(-scores, kind='stable')
+    if len(order) == 0:
+        return order
+    iou = box_iou(boxes[order], boxes[order])
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_thr
+    return order[np.asarray(keep, dtype=np.int64)]
+
+
+def batched_nms(boxes, scores, classes, iou_thr):
+    """Class-aware NMS by offsetting boxes per class (one NMS call per image)."""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offset = classes.astype(boxes.dtype)[:, None] * (boxes.max() + 1)
+    return nms(boxes + offset, scores, iou_thr)
+
+
+def weighted_boxes_fusion(boxes, scores, classes, sources, weights, iou_thr=0.55, skip_thr=0.0):
+    """Weighted boxes fusion of several prediction sets (models / TTA passes) on one image.
+
+    boxes (N, 4) xyxy, scores (N,), classes (N,), sources (N,) index into
+    `weights` (one weight per prediction set). Per class, boxes are clustered
+    greedily in descending weighted score around the best unassigned box
+    (IoU > iou_thr, one IoU matrix per class as in `nms`). A cluster's box is the
+    score*weight weighted mean of its members; its score is the weighted mean
+    score times the share of the total weight whose sets voted for it, so a box
+    found by one set out of five is down-weighted. Returns (boxes, scores, classes).
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    keep = scores >= skip_thr
+    boxes, scores, classes, sources = boxes[keep], scores[keep], classes[keep], sources[keep]
+    out_b, out_s, out_c = [], [], []
+    for c in np.unique(classes):
+        m = classes == c
+        b, w = boxes[m].astype(np.float64), weights[sources[m]]
+        ws = scores[m] * w
+        order = np.argsort(-ws, kind='stable')
+        b, w, ws, src = b[order], w[order], ws[order], sources[m][order]
+        iou = box_iou(b, b)
+        cluster = np.full(len(b), -1, dtype=np.int64)
+        k = 0
+        for i in range(len(b)):
+            if cluster[i] >= 0:
+                continue
+            members = (cluster < 0) & (iou[i] > iou_thr)
+            members[i] = True
+            cluster[members] = k
+            k += 1
+        sum_ws = np.bincount(cluster, ws, k)
+        fused = np.stack([np.bincount(cluster, ws * b[:, j], k) for j in range(4)], 1) / sum_ws[:, None]
+        voted = np.zeros((k, len(weights)), dtype=bool)
+        voted[cluster, src] = True  # a set voting twice in one cluster counts once
+        mean_score = sum_ws / np.bincount(cluster, w, k)
+        out_b.append(fused)
+        out_s.append(mean_score * np.minimum(voted @ weights, weights.sum()) / weights.sum())
+        out_c.append(np.full(k, c))
+    if not out_b:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, classes.dtype)
+    s = np.concatenate(out_s)
+    order = np.argsort(-s, kind='stable')
+    return np.concatenate(out_b)[order].astype(np.float32), s[order].astype(np.float32), np.concatenate(out_c)[order]
@@ -1,42 +1,49 @@
 #!/usr/bin/env python3
 """Check strict correspondence between images and YOLO label files.
 Outputs per-split counts, mismatches and sample problematic entries.
+Image and label stems are streamed from os.scandir through an external sort
+and merge-joined, so memory stays flat however many files a split holds.
 """
 import argparse
 from pathlib import Path
 import re
 
+import telemetry
+from stream_io import external_sort, merge_join, report_peak, scan_files, scan_stems
+
 
 def check_split(root: Path, split: str):
     img_dir = root / 'images' / split
     lab_dir = root / 'labels' / split
     exts = ('.jpg', '.jpeg', '.png')
-    img_stems = set()
-    lab_stems = set()
-    if img_dir.exists():
-        for p in img_dir.iterdir():
-            if p.suffix.lower() in exts and p.is_file():
-                img_stems.add(p.stem)
-    if lab_dir.exists():
-        for p in lab_dir.iterdir():
-            if p.suffix.lower() == '.txt' and p.is_file():
-                lab_stems.add(p.stem)
-
-    labs_without_img = sorted(list(lab_stems - img_stems))
-    imgs_without_lab = sorted(list(img_stems - lab_stems))
+    n_images = 0
+    labs_without_img = []
+    imgs_without_lab = []
+    n_labs_without_img = n_imgs_without_lab = 0
+    # both streams come out sorted, so the first 20 samples match the old sorted(set - set)[:20]
+    for stem, has_img, has_lab in merge_join(external_sort(scan_stems(img_dir, exts)),
+                                             external_sort(scan_stems(lab_dir, ('.txt',)))):
+        n_images += has_img
+        if has_lab and not has_img:
+            n_labs_without_img += 1
+            if len(labs_without_img) < 20:
+                labs_without_img.append(stem)
+        elif has_img and not has_lab:
+            n_imgs_without_lab += 1
+            if len(imgs_without_lab) < 20:
+                imgs_without_lab.append(stem)
 
     # validate label contents
     malformed = []
     nonint = []
     total_label_files = 0
     if lab_dir.exists():
-        for p in lab_dir.iterdir():
-            if p.suffix.lower() != '.txt' or not p.is_file():
-                continue
+        for e in scan_files(lab_dir, ('.txt',)):
+            p = Path(e.path)
             total_label_files += 1
             try:
                 lines = p.read_text(encoding='utf-8').splitlines()
-            except Exception:
+            except (OSError, UnicodeDecodeError):
                 malformed.append(f"UNREADABLE: {p}")
                 continue
             for i, line in enumerate(lines):
@@ -58,14 +65,14 @@ def check_split(root: Path, split: str):
 
     summary = {
         'split': split,
-        'images': len(img_stems),
+        'images': n_images,
         'labels': total_label_files,
-        'labs_without_img': len(labs_without_img),
-        'imgs_without_lab': len(imgs_without_lab),
+        'labs_without_img': n_labs_without_img,
+        'imgs_without_lab': n_imgs_without_lab,
         'malformed_label_lines': len(malformed),
         'nonint_class_tokens': len(nonint),
-        'sample_labs_without_img': labs_without_img[:20],
-        'sample_imgs_without_lab': imgs_without_lab[:20],
+        'sample_labs_without_img': labs_without_img,
+        'sample_imgs_without_lab': imgs_without_lab,
         'sample_malformed': malformed[:20],
         'sample_nonint': nonint[:20],
     }
@@ -79,7 +86,9 @@ def main():
     root = Path(args.root)
 
     for split in ('train', 'val', 'test'):
-        res = check_split(root, split)
+        with telemetry.span('check_split', split=split):
+            res = check_split(root, split)
+        telemetry.count('images', res['images'])
         print('----', res['split'], '----')
         print(f"images: {res['images']}  labels: {res['labels']}")
         print(f"labs_without_img: {res['labs_without_img']}  imgs_without_lab: {res['imgs_without_lab']}")
@@ -101,6 +110,7 @@ def main():
             for s in res['sample_nonint']:
                 print(' ', s)
         print()
+    report_peak()
 
 
 if __name__ == '__main__':
@@ -1,10 +1,10 @@
+import argparse
 import os
 from pathlib import Path
 from collections import Counter
 
 ROOT = Path(__file__).resolve().parents[1]
-label_dirs = [ROOT / 'labels' / 'train', ROOT / 'labels' / 'val', ROOT / 'Dataset_Original' / 'labels' / 'train', ROOT / 'Dataset_Original' / 'labels' / 'val']
-label_dirs = [d for d in label_dirs if d.exists()]
+DEFAULT_DIRS = [ROOT / 'labels' / 'train', ROOT / 'labels' / 'val', ROOT / 'Dataset_Original' / 'labels' / 'train', ROOT / 'Dataset_Original' / 'labels' / 'val']
 
 def scan_dir(d):
     counts = Counter()
@@ -35,14 +35,24 @@ def scan_dir(d):
             pass
     return {'files': len(files), 'counts': counts, 'min': min_idx, 'max': max_idx, 'sample_bad': sample_bad}
 
-for d in label_dirs:
-    res = scan_dir(d)
-    print('DIR:', d)
-    print('  label files:', res['files'])
-    print('  index min/max:', res['min'], '/', res['max'])
-    # show top indices
-    most = res['counts'].most_common(20)
-    print('  top indices:', most[:10])
-    if res['sample_bad']:
-        print('  sample bad entries (index>50):', res['sample_bad'][:5])
-    print()
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('dirs', nargs='*', help='label dirs to scan (default: labels/{train,val} and Dataset_Original/labels/{train,val})')
+    args = p.parse_args()
+    label_dirs = [Path(d) for d in args.dirs] if args.dirs else DEFAULT_DIRS
+    label_dirs = [d for d in label_dirs if d.exists()]
+
+    for d in label_dirs:
+        res = scan_dir(d)
+        print('DIR:', d)
+        print('  label files:', res['files'])
+        print('  index min/max:', res['min'], '/', res['max'])
+        # show top indices
+        most = res['counts'].most_common(20)
+        print('  top indices:', most[:10])
+        if res['sample_bad']:
+            print('  sample bad entries (index>50):', res['sample_bad'][:5])
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 import os
 import argparse
 
+from label_txn import DEFAULT_JOURNAL, Transaction, warn_incomplete
+
 def is_empty_label(path):
     try:
         with open(path, 'r', encoding='utf-8') as f:
@@ -15,6 +17,7 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--labels', required=True)
     parser.add_argument('--images', required=True)
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL, help='transaction journal dir (see label_txn.py rollback)')
     args = parser.parse_args()
 
     labels_dir = args.labels
@@ -24,41 +27,34 @@ def main():
     if not os.path.isdir(images_dir):
         print('Images dir not found:', images_dir); return 1
 
+    warn_incomplete(args.journal)
     txts = [f for f in os.listdir(labels_dir) if f.lower().endswith('.txt')]
     removed = []
-    for t in txts:
-        p = os.path.join(labels_dir, t)
-        if is_empty_label(p):
-            # remove label and corresponding image(s)
-            try:
-                os.remove(p)
-            except Exception as e:
-                print('Failed remove label', p, e)
-            base = os.path.splitext(t)[0]
-            # possible image extensions
-            for ext in ('.jpg','.jpeg','.png'):
-                img = os.path.join(images_dir, base + ext)
-                if os.path.exists(img):
-                    try:
-                        os.remove(img)
-                    except Exception as e:
-                        print('Failed remove image', img, e)
-            removed.append(t)
+    # removals are staged and applied together at the end; removed files stay in the journal backup
+    with Transaction('clean-empty', args.journal) as txn:
+        for t in txts:
+            p = os.path.join(labels_dir, t)
+            if is_empty_label(p):
+                # remove label and corresponding image(s)
+                txn.remove(p)
+                base = os.path.splitext(t)[0]
+                # possible image extensions
+                for ext in ('.jpg','.jpeg','.png'):
+                    txn.remove(os.path.join(images_dir, base + ext))
+                removed.append(t)
 
-    # also remove images without any label file
-    imgs = [f for f in os.listdir(images_dir) if f.lower().endswith(('.jpg','.png','.jpeg'))]
-    for im in imgs:
-        base = os.path.splitext(im)[0]
-        lbl = os.path.join(labels_dir, base + '.txt')
-        if not os.path.exists(lbl):
-            # remove image
-            try:
-                os.remove(os.path.join(images_dir, im))
+        # also remove images without any label file
+        imgs = [f for f in os.listdir(images_dir) if f.lower().endswith(('.jpg','.png','.jpeg'))]
+        for im in imgs:
+            base = os.path.splitext(im)[0]
+            lbl = os.path.join(labels_dir, base + '.txt')
+            if not os.path.exists(lbl):
+                txn.remove(os.path.join(images_dir, im))
                 removed.append(base + ' (no label)')
-            except Exception as e:
-                print('Failed remove image without label', im, e)
 
     print('Removed', len(removed), 'items. Examples:', removed[:20])
+    if len(txn):
+        print(f'transaction: {txn.id} (undo: python tools/label_txn.py rollback {txn.id})')
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Compose a training mix from several dataset roots without copying images.
+
+Writes Ultralytics-compatible `train.txt`/`val.txt`/`test.txt` image lists and
+a generated `data.yaml` into --out. Images are referenced in place; only
+sources that need their labels changed (class remap or box filtering) get a
+small shadow tree under `<out>/sources/<name>/` holding symlinked images and
+rewritten labels, because Ultralytics derives label paths from image paths.
+
+Recipe (YAML):
+
+  names: classes.txt            # classes.txt / data.yaml path or list (default: project names)
+  seed: 0
+  sources:
+    - name: resplit_aug
+      root: Dataset_resplit_aug
+      splits: {train: train, val: val, test: test}   # out split -> source split
+    - name: fr3
+      root: fresh-and-rotten-fruits-3
+      splits: {train: train}
+      mapping: tools/external_to_target_mapping.json  # source name -> target name
+      src_classes: fresh-and-rotten-fruits-3/classes.txt
+      weight: 0.5                # sampling weight: <1 subsamples, >1 repeats
+      include_classes: [Apple_rotten, Banana_rotten]  # keep images containing any of these
+      exclude_classes: []        # drop boxes of these classes
+      exclude_pattern: '_aug\\d+$'  # regex on image stem
+      hard_examples: runs/mining/weights.txt  # per-image weights (mine_hard_examples.py), train only
+
+Relative paths (names, root, mapping, src_classes, hard_examples) are looked up
+in the current directory first, then next to the recipe.
+"""
+import argparse
+import json
+import os
+import random
+import re
+from pathlib import Path
+
+import numpy as np
+
+from label_io import IMG_EXTS
+from mine_hard_examples import read_weights
+from project_config import load_names, read_classes
+from remap_external_labels import build_lookup, load_source_names, remap_label_text
+
+
+def load_recipe(path):
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def resolve_path(spec, base):
+    # relative paths are taken from the cwd, falling back to the recipe's directory
+    p = Path(spec)
+    if not p.is_absolute() and not p.exists():
+        p = base / p
+    return p
+
+
+def resolve_names(spec, base):
+    if isinstance(spec, list):
+        return spec
+    if not spec:
+        return load_names()
+    p = resolve_path(spec, base)
+    if p.suffix in ('.yaml', '.yml'):
+        return load_names(data_yaml=p)
+    return read_classes(p)
+
+
+def link_image(src, dst):
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.symlink(os.path.abspath(src), dst)
+    except OSError:
+        # no symlink privilege (Windows): hardlink still avoids a copy
+        os.link(src, dst)
+
+
+def sample_weighted(items, weight, rng, item_weights=None):
+    # integer part repeats every item, fractional part is a seeded subsample
+    if item_weights:
+        # per-image weights: each item's own integer repeats plus a seeded coin flip for the fraction
+        out = []
+        for it in items:
+            w = weight * item_weights.get(os.path.splitext(os.path.basename(it))[0], 1.0)
+            reps = int(w)
+            out += [it] * (reps + (rng.random() < w - reps))
+        return out
+    reps = int(weight)
+    out = items * reps
+    frac = weight - reps
+    if frac > 0:
+        out += rng.sample(items, int(round(len(items) * frac)))
+    return out
+
+
+def iter_images(img_dir):
+    with os.scandir(img_dir) as it:
+        for e in it:
+            if e.name.lower().endswith(IMG_EXTS) and e.is_file():
+                yield e.path
+
+
+def compose_source(src, names, out, rng, base):
+    name = src.get('name') or Path(src['root']).name
+    root = resolve_path(src['root'], base)
+    weight = float(src.get('weight', 1.0))
+    include = set(src.get('include_classes') or [])
+    exclude = set(src.get('exclude_classes') or [])
+    pattern = re.compile(src['exclude_pattern']) if src.get('exclude_pattern') else None
+    item_weights = read_weights(resolve_path(src['hard_examples'], base)) if src.get('hard_examples') else None
+    t2i = {n: i for i, n in enumerate(names)}
+
+    lut = None
+    if src.get('mapping') or src.get('src_classes'):
+        mapping = {}
+        if src.get('mapping'):
+            with open(resolve_path(src['mapping'], base), 'r', encoding='utf-8') as f:
+                mapping = json.load(f)
+        src_classes = str(resolve_path(src['src_classes'], base)) if src.get('src_classes') else None
+        src_names = load_source_names(str(root), src_classes) or list(mapping.keys())
+        lut = build_lookup(src_names, names, mapping)
+    elif exclude:
+        lut = np.arange(len(names), dtype=np.int64)
+    if lut is not None:
+        for c in exclude:
+            lut[lut == t2i[c]] = -1
+        token_to_src = {}
+        for i in range(len(lut)):
+            token_to_src[str(i)] = i
+            token_to_src[f'{i}.0'] = i
+    include_idx = {t2i[c] for c in include}
+    rewrite = lut is not None
+
+    result = {}
+    stats = {}
+    for out_split, src_split in (src.get('splits') or {'train': 'train', 'val': 'val', 'test': 'test'}).items():
+        img_dir = root / 'images' / src_split
+        lab_dir = root / 'labels' / src_split
+        if not img_dir.exists():
+            continue
+        if rewrite:
+            shadow_img = out / 'sources' / name / 'images' / src_split
+            shadow_lab = out / 'sources' / name / 'labels' / src_split
+            shadow_img.mkdir(parents=True, exist_ok=True)
+            shadow_lab.mkdir(parents=True, exist_ok=True)
+        kept = []
+        n_seen = 0
+        for img in iter_images(img_dir):
+            n_seen += 1
+            stem = os.path.splitext(os.path.basename(img))[0]
+            if pattern and pattern.search(stem):
+                continue
+            lab = lab_dir / (stem + '.txt')
+            if not rewrite and not include_idx:
+                kept.append(os.path.abspath(img))
+                continue
+            text = lab.read_text(encoding='utf-8') if lab.exists() else ''
+            if rewrite:
+                lines, n_kept, _, _ = remap_label_text(text, lut, token_to_src)
+                if text.strip() and not n_kept:
+                    continue  # every box was unmapped or excluded
+            else:
+                lines = text.splitlines()
+            if include_idx and not any(int(float(ln.split()[0])) in include_idx for ln in lines if ln.strip()):
+                continue
+            if rewrite:
+                dst = shadow_img / os.path.basename(img)
+                link_image(img, dst)
+                (shadow_lab / (stem + '.txt')).write_text('\n'.join(lines), encoding='utf-8')
+                kept.append(str(dst.absolute()))
+            else:
+                kept.append(os.path.abspath(img))
+        # weights only resample training data; eval splits stay as they are
+        sampled = sample_weighted(kept, weight, rng, item_weights) if out_split == 'train' else kept
+        result[out_split] = sampled
+        stats[out_split] = {'seen': n_seen, 'kept': len(kept), 'listed': len(sampled)}
+    return name, result, stats
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('recipe', help='compose recipe YAML')
+    p.add_argument('--out', default='runs/manifests/mix', help='manifest output dir')
+    args = p.parse_args()
+
+    recipe = load_recipe(args.recipe)
+    base = Path(args.recipe).resolve().parent
+    names = resolve_names(recipe.get('names'), base)
+    if not names:
+        print('Could not resolve target class names')
+        return 1
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(recipe.get('seed', 0))
+
+    splits = {}
+    manifest = {'recipe': str(Path(args.recipe).resolve()), 'sources': {}}
+    for src in recipe.get('sources', []):
+        name, result, stats = compose_source(src, names, out, rng, base)
+        manifest['sources'][name] = stats
+        for split, items in result.items():
+            splits.setdefault(split, []).extend(items)
+        for split, s in stats.items():
+            print(f"{name:20s} {split:5s} seen={s['seen']} kept={s['kept']} listed={s['listed']}")
+
+    import yaml
+    data = {'path': str(out.resolve())}
+    for split in ('train', 'val', 'test'):
+        if split in splits:
+            lst = out / f'{split}.txt'
+            lst.write_text('\n'.join(Path(x).as_posix() for x in splits[split]) + '\n', encoding='utf-8')
+            data[split] = lst.name
+    data['nc'] = len(names)
+    data['names'] = names
+    with (out / 'data.yaml').open('w', encoding='utf-8') as f:
+        yaml.safe_dump(data, f, sort_keys=False, default_flow_style=None, allow_unicode=True)
+    (out / 'manifest.json').write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+
+    print('Wrote manifest to', out, {k: len(v) for k, v in splits.items()})
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
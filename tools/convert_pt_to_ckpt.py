@@ -1,76 +1,82 @@
 #!/usr/bin/env python3
 """
-将 YOLOv8 的 .pt 模型文件转换为 .ckpt 格式
-支持保留完整训练状态或仅保存模型权重
+Convert a YOLOv8 .pt model file to .ckpt format,
+keeping the full training state or only the model weights.
 """
 
-import torch
 import argparse
 from pathlib import Path
 
+import telemetry
+
 
 def convert_pt_to_ckpt(pt_file, output_file=None, weights_only=False):
     """
-    转换 .pt 文件为 .ckpt 格式
+    Convert a .pt file to .ckpt format.
     
     Args:
-        pt_file: 输入的 .pt 文件路径
-        output_file: 输出的 .ckpt 文件路径（可选）
-        weights_only: 是否仅保存模型权重（不包含优化器状态等）
+        pt_file: input .pt file
+        output_file: output .ckpt file (optional)
+        weights_only: save only the model weights (no optimizer state etc.)
     """
+    import torch
+
     pt_path = Path(pt_file)
     
     if not pt_path.exists():
-        raise FileNotFoundError(f"找不到文件: {pt_file}")
+        raise FileNotFoundError(f"File not found: {pt_file}")
     
-    # 生成输出文件名
+    # output file name
     if output_file is None:
         output_file = pt_path.with_suffix('.ckpt')
     else:
         output_file = Path(output_file)
     
-    print(f"正在加载模型: {pt_path}")
-    # 由于使用 ultralytics 自定义模型，需要设置 weights_only=False 以允许反序列化
-    checkpoint = torch.load(pt_path, map_location='cpu', weights_only=False)
+    print(f"Loading model: {pt_path}")
+    # ultralytics pickles custom model classes, so weights_only=False is needed to unpickle them
+    with telemetry.span('load'):
+        checkpoint = torch.load(pt_path, map_location='cpu', weights_only=False)
     
-    # 显示原始checkpoint内容
-    print(f"\n原始checkpoint包含的键:")
+    # show the original checkpoint contents
+    print(f"\nOriginal checkpoint keys:")
     if isinstance(checkpoint, dict):
         for key in checkpoint.keys():
             print(f"  - {key}")
     
-    # 准备要保存的数据
+    # data to save
     if weights_only:
-        # 仅保存模型权重
+        # model weights only
         if isinstance(checkpoint, dict):
             if 'model' in checkpoint:
                 save_dict = {'state_dict': checkpoint['model'].state_dict()}
             elif 'state_dict' in checkpoint:
                 save_dict = checkpoint
             else:
-                # 假设整个checkpoint就是state_dict
+                # assume the whole checkpoint is a state_dict
                 save_dict = {'state_dict': checkpoint}
         else:
-            # checkpoint本身可能就是模型对象
+            # the checkpoint may be the model object itself
             save_dict = {'state_dict': checkpoint.state_dict() if hasattr(checkpoint, 'state_dict') else checkpoint}
         
-        print(f"\n保存模式: 仅权重")
+        print(f"\nSave mode: weights only")
     else:
-        # 保存完整checkpoint（包含优化器、epoch等信息）
+        # full checkpoint (optimizer, epoch, etc.)
         save_dict = checkpoint
-        print(f"\n保存模式: 完整checkpoint")
+        print(f"\nSave mode: full checkpoint")
     
-    # 保存为.ckpt格式
-    print(f"正在保存到: {output_file}")
-    torch.save(save_dict, output_file)
+    # save as .ckpt
+    print(f"Saving to: {output_file}")
+    with telemetry.span('write'):
+        torch.save(save_dict, output_file)
+    telemetry.count('bytes_written', output_file.stat().st_size)
     
-    # 验证保存的文件
-    print(f"\n验证转换结果...")
+    # verify the saved file
+    print(f"\nVerifying...")
     loaded = torch.load(output_file, map_location='cpu', weights_only=False)
-    print(f"✓ 成功保存，文件大小: {output_file.stat().st_size / 1024 / 1024:.2f} MB")
+    print(f"✓ Saved, file size: {output_file.stat().st_size / 1024 / 1024:.2f} MB")
     
     if isinstance(loaded, dict):
-        print(f"✓ 保存的checkpoint包含的键:")
+        print(f"✓ Saved checkpoint keys:")
         for key in loaded.keys():
             print(f"    - {key}")
     
@@ -78,12 +84,12 @@ def convert_pt_to_ckpt(pt_file, output_file=None, weights_only=False):
 
 
 def main():
-    parser = argparse.ArgumentParser(description='将YOLOv8的.pt文件转换为.ckpt格式')
-    parser.add_argument('input', type=str, help='输入的.pt文件路径')
+    parser = argparse.ArgumentParser(description='Convert a YOLOv8 .pt file to .ckpt format')
+    parser.add_argument('input', type=str, help='input .pt file')
     parser.add_argument('-o', '--output', type=str, default=None, 
-                        help='输出的.ckpt文件路径（默认：与输入文件同名但扩展名为.ckpt）')
+                        help='output .ckpt file (default: input path with a .ckpt extension)')
     parser.add_argument('-w', '--weights-only', action='store_true',
-                        help='仅保存模型权重，不包含优化器状态等训练信息')
+                        help='save only the model weights, without optimizer state and other training info')
     
     args = parser.parse_args()
     
@@ -93,9 +99,9 @@ def main():
             args.output, 
             args.weights_only
         )
-        print(f"\n✅ 转换成功! 输出文件: {output_path}")
+        print(f"\n✅ Conversion done: {output_path}")
     except Exception as e:
-        print(f"\n❌ 转换失败: {e}")
+        print(f"\n❌ Conversion failed: {e}")
         import traceback
         traceback.print_exc()
         return 1
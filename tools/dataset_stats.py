@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Box-size, aspect-ratio and density statistics per split, with train vs test comparison.
+
+  python tools/dataset_stats.py --root Dataset_resplit_aug
+  python tools/dataset_stats.py --root Dataset_resplit_aug --pixels --out runs/detect/diagnostics/stats
+
+Label files are parsed in parallel chunks; every chunk produces a `SplitStats`
+accumulator (fixed-bin histograms + counters) and the chunks are merged, so
+memory does not grow with the dataset. With --pack the parsed boxes of each
+split are also stored as one .npz (boxes + per-image counts) that later runs
+load instead of re-reading the txt files while the label dir is unchanged.
+Writes stats_<split>.json, compare.json and report.html to --out.
+"""
+import argparse
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from label_io import IMG_EXTS
+from project_config import load_names, read_classes
+
+SIZE_BINS = np.linspace(0.0, 1.0, 51)            # sqrt(w*h), normalized
+ASPECT_BINS = np.linspace(-4.0, 4.0, 33)         # log2(w/h)
+PIXEL_BINS = np.array([0, 8, 16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512, 768, 1024, 1e9])
+MAX_PER_IMAGE = 64                               # boxes-per-image histogram clips here
+GRID = 16                                        # box-center density grid
+
+
+class SplitStats:
+    """Mergeable accumulator: add() chunks of boxes, merge() partial results."""
+
+    def __init__(self, nc):
+        self.nc = nc
+        self.images = 0
+        self.empty = 0
+        self.malformed = 0
+        self.bad_class = 0
+        self.class_count = np.zeros(nc, np.int64)
+        self.class_images = np.zeros(nc, np.int64)
+        self.size_hist = np.zeros((nc, len(SIZE_BINS) - 1), np.int64)
+        self.aspect_hist = np.zeros(len(ASPECT_BINS) - 1, np.int64)
+        self.pixel_hist = np.zeros(len(PIXEL_BINS) - 1, np.int64)
+        self.per_image_hist = np.zeros(MAX_PER_IMAGE + 1, np.int64)
+        self.center = np.zeros((GRID, GRID), np.int64)
+
+    def add(self, boxes, counts, wh=None):
+        """boxes: (N, 5) cls x y w h for all images of the chunk; counts: boxes per image; wh: (images, 2) px."""
+        counts = np.asarray(counts, np.int64)
+        self.images += len(counts)
+        self.empty += int((counts == 0).sum())
+        self.per_image_hist += np.bincount(np.minimum(counts, MAX_PER_IMAGE), minlength=MAX_PER_IMAGE + 1)
+        if len(boxes) == 0:
+            return
+        cls = boxes[:, 0].astype(np.int64)
+        ok = (cls >= 0) & (cls < self.nc) & (boxes[:, 3] > 0) & (boxes[:, 4] > 0)
+        self.bad_class += int((~ok).sum())
+        img_idx = np.repeat(np.arange(len(counts)), counts)[ok]
+        boxes, cls = boxes[ok], cls[ok]
+        w, h = boxes[:, 3], boxes[:, 4]
+        self.class_count += np.bincount(cls, minlength=self.nc)
+        # images containing each class: unique (image, class) pairs
+        pairs = np.unique(img_idx * self.nc + cls)
+        self.class_images += np.bincount(pairs % self.nc, minlength=self.nc)
+        size_bin = np.clip(np.digitize(np.sqrt(w * h), SIZE_BINS) - 1, 0, len(SIZE_BINS) - 2)
+        np.add.at(self.size_hist, (cls, size_bin), 1)
+        self.aspect_hist += np.histogram(np.clip(np.log2(w / h), -4, 4), ASPECT_BINS)[0]
+        gx = np.clip((boxes[:, 1] * GRID).astype(np.int64), 0, GRID - 1)
+        gy = np.clip((boxes[:, 2] * GRID).astype(np.int64), 0, GRID - 1)
+        np.add.at(self.center, (gy, gx), 1)
+        if wh is not None:
+            px = np.sqrt(w * wh[img_idx, 0] * h * wh[img_idx, 1])
+            self.pixel_hist += np.histogram(px, PIXEL_BINS)[0]
+
+    def merge(self, other):
+        for k in ('images', 'empty', 'malformed', 'bad_class'):
+            setattr(self, k, getattr(self, k) + getattr(other, k))
+        for k in ('class_count', 'class_images', 'size_hist', 'aspect_hist', 'pixel_hist', 'per_image_hist', 'center'):
+            getattr(self, k).__iadd__(getattr(other, k))
+        return self
+
+    def summary(self, names):
+        boxes = int(self.class_count.sum())
+        size = self.size_hist.sum(0)
+        per_img = self.per_image_hist
+        return {
+            'images': self.images,
+            'boxes': boxes,
+            'empty_labels': self.empty,
+            'malformed_lines': self.malformed,
+            'invalid_boxes': self.bad_class,
+            'boxes_per_image_mean': float((per_img * np.arange(len(per_img))).sum() / max(self.images, 1)),
+            'box_size_quantiles': hist_quantiles(size, SIZE_BINS, (0.05, 0.25, 0.5, 0.75, 0.95)),
+            'classes': {n: {'boxes': int(self.class_count[i]), 'images': int(self.class_images[i]),
+                            'median_size': hist_quantiles(self.size_hist[i], SIZE_BINS, (0.5,))['0.5']}
+                        for i, n in enumerate(names)},
+            'hist': {
+                'size_bins': SIZE_BINS.tolist(), 'size': size.tolist(),
+                'aspect_bins': ASPECT_BINS.tolist(), 'aspect': self.aspect_hist.tolist(),
+                'pixel_bins': PIXEL_BINS.tolist(), 'pixel': self.pixel_hist.tolist(),
+                'boxes_per_image': per_img.tolist(),
+                'center': self.center.tolist(),
+                'class_size': self.size_hist.tolist(),
+            },
+        }
+
+
+def hist_quantiles(counts, edges, qs):
+    counts = np.asarray(counts, np.float64)
+    total = counts.sum()
+    if total == 0:
+        return {str(q): None for q in qs}
+    cdf = np.cumsum(counts) / total
+    out = {}
+    for q in qs:
+        i = int(np.searchsorted(cdf, q))
+        lo = cdf[i - 1] if i else 0.0
+        frac = (q - lo) / max(cdf[i] - lo, 1e-12)
+        out[str(q)] = round(float(edges[i] + frac * (edges[i + 1] - edges[i])), 4)
+    return out
+
+
+def parse_labels(path):
+    """(boxes (N,5), malformed lines) for one label file."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return np.zeros((0, 5), np.float32), 0
+    rows = [line.split() for line in data.splitlines()]
+    # fast path only when every line has exactly 5 tokens; a token total divisible by 5 is not enough
+    # (a 6-column line followed by a 4-column one would shift values across boxes)
+    if all(len(t) == 5 for t in rows):
+        try:
+            return np.array(rows, np.float32).reshape(-1, 5), 0
+        except ValueError:
+            pass
+    # slow path: line by line, counting lines that are short or not numeric
+    good, bad = [], 0
+    for t in rows:
+        if not t:
+            continue
+        try:
+            if len(t) < 5:
+                raise ValueError
+            good.append([float(v) for v in t[:5]])
+        except ValueError:
+            bad += 1
+    return np.array(good, np.float32).reshape(-1, 5), bad
+
+
+def image_wh(path):
+    from image_codec import jpeg_size
+    if path is None:
+        return (0, 0)
+    with open(path, 'rb') as f:
+        head = f.read(1 << 16)
+    size = jpeg_size(head)
+    if size is None:
+        # not a JPEG (or a huge EXIF block): fall back to a full decode
+        from image_codec import get_codec, imread
+        img = imread(get_codec('auto'), path)
+        return (0, 0) if img is None else (img.shape[1], img.shape[0])
+    return size
+
+
+def stats_chunk(task):
+    """Worker: parse one chunk of (label_path, image_path) into a SplitStats (+ packed arrays)."""
+    items, nc, pixels, pack = task
+    st = SplitStats(nc)
+    boxes, counts = [], []
+    for lab, _ in items:
+        b, bad = parse_labels(lab) if lab else (np.zeros((0, 5), np.float32), 0)
+        st.malformed += bad
+        boxes.append(b)
+        counts.append(len(b))
+    boxes = np.concatenate(boxes) if boxes else np.zeros((0, 5), np.float32)
+    wh = np.array([image_wh(img) for _, img in items], np.float64).reshape(-1, 2) if pixels else None
+    st.add(boxes, counts, wh)
+    return st, (boxes, np.asarray(counts, np.int32), wh) if pack else None
+
+
+def list_split(root, split):
+    """[(label_path or None, image_path or None)] for every image and every label of the split."""
+    img_dir = root / 'images' / split
+    lab_dir = root / 'labels' / split
+    images = {}
+    if img_dir.is_dir():
+        with os.scandir(img_dir) as it:
+            for e in it:
+                stem, ext = os.path.splitext(e.name)
+                if ext.lower() in IMG_EXTS:
+                    images[stem] = e.path
+    labels = {}
+    if lab_dir.is_dir():
+        with os.scandir(lab_dir) as it:
+            for e in it:
+                if e.name.endswith('.txt'):
+                    labels[e.name[:-4]] = e.path
+    stems = sorted(set(images) | set(labels))
+    return [(labels.get(s), images.get(s)) for s in stems], len(set(images) - set(labels)), len(set(labels) - set(images))
+
+
+def dir_signature(items):
+    """Cheap change key for the packed index: file count and newest mtime of the labels."""
+    mt = [os.stat(lab).st_mtime_ns for lab, _ in items if lab]
+    return [len(mt), max(mt) if mt else 0]
+
+
+def split_stats(root, split, nc, workers, pixels, pack_dir, chunk=2000):
+    items, missing_labels, orphan_labels = list_split(root, split)
+    st = SplitStats(nc)
+    pack_path = Path(pack_dir) / f'{split}.npz' if pack_dir else None
+    sig = dir_signature(items) + [bool(pixels)] if pack_path else None
+    if pack_path and pack_path.exists():
+        z = np.load(pack_path)
+        if z['signature'].tolist() == sig:
+            st.add(z['boxes'], z['counts'], z['wh'] if pixels else None)
+            st.malformed = int(z['malformed'])
+            return st, missing_labels, orphan_labels, 'packed'
+    tasks = [(items[i:i + chunk], nc, pixels, bool(pack_path)) for i in range(0, len(items), chunk)]
+    packed = []
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(stats_chunk, tasks))
+    else:
+        results = [stats_chunk(t) for t in tasks]
+    for part, arrays in results:
+        st.merge(part)
+        if arrays:
+            packed.append(arrays)
+    if pack_path:
+        pack_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(pack_path, signature=np.array(sig, np.int64), malformed=st.malformed,
+                 boxes=np.concatenate([a[0] for a in packed]) if packed else np.zeros((0, 5), np.float32),
+                 counts=np.concatenate([a[1] for a in packed]) if packed else np.zeros(0, np.int32),
+                 wh=np.concatenate([a[2] for a in packed]) if pixels and packed else np.zeros((0, 2)))
+    return st, missing_labels, orphan_labels, 'parsed'
+
+
+def distribution_shift(p, q):
+    """Jensen-Shannon divergence (bits) and total variation between two histograms."""
+    p = np.asarray(p, np.float64).ravel()
+    q = np.asarray(q, np.float64).ravel()
+    if p.sum() == 0 or q.sum() == 0:
+        return {'js': None, 'tv': None}
+    p, q = p / p.sum(), q / q.sum()
+    m = (p + q) / 2
+
+    def kl(a, b):
+        nz = a > 0
+        return float((a[nz] * np.log2(a[nz] / b[nz])).sum())
+    return {'js': round(0.5 * kl(p, m) + 0.5 * kl(q, m), 4), 'tv': round(0.5 * float(np.abs(p - q).sum()), 4)}
+
+
+def compare_splits(a, b, names):
+    out = {key: distribution_shift(a['hist'][key], b['hist'][key])
+           for key in ('size', 'aspect', 'boxes_per_image', 'center', 'pixel')}
+    ca = np.array([a['classes'][n]['boxes'] for n in names], np.float64)
+    cb = np.array([b['classes'][n]['boxes'] for n in names], np.float64)
+    out['class_share'] = distribution_shift(ca, cb)
+    share_a = ca / max(ca.sum(), 1)
+    share_b = cb / max(cb.sum(), 1)
+    out['per_class'] = {n: {'share_a': round(float(share_a[i]), 4), 'share_b': round(float(share_b[i]), 4),
+                            'size_shift': distribution_shift(a['hist']['class_size'][i], b['hist']['class_size'][i])}
+                        for i, n in enumerate(names)}
+    return out
+
+
+def svg_bars(counts, labels=None, width=360, height=90):
+    counts = np.asarray(counts, np.float64)
+    top = counts.max() if counts.size and counts.max() > 0 else 1
+    bw = width / max(len(counts), 1)
+    bars = ''.join(f'<rect x="{i * bw:.1f}" y="{height - c / top * height:.1f}" width="{max(bw - 1, 1):.1f}" '
+                   f'height="{c / top * height:.1f}"><title>{html.escape(str(labels[i]) if labels else str(i))}: '
+                   f'{int(c)}</title></rect>' for i, c in enumerate(counts))
+    return f'<svg width="{width}" height="{height}" style="fill:#4a7">{bars}</svg>'
+
+
+def write_html(path, reports, comparison, names, title=''):
+    rows = []
+    for split, r in reports.items():
+        h = r['hist']
+        rows.append(f"<h2>{split}</h2><p>{r['images']} images, {r['boxes']} boxes, {r['empty_labels']} empty, "
+                    f"{r['boxes_per_image_mean']:.2f} boxes/image, size quantiles {r['box_size_quantiles']}</p>"
+                    f"<table><tr><td>box size sqrt(wh)<br>{svg_bars(h['size'], h['size_bins'])}</td>"
+                    f"<td>aspect log2(w/h)<br>{svg_bars(h['aspect'], h['aspect_bins'])}</td>"
+                    f"<td>boxes / image<br>{svg_bars(h['boxes_per_image'])}</td>"
+                    f"<td>per class<br>{svg_bars([r['classes'][n]['boxes'] for n in names], names)}</td></tr></table>")
+        if sum(h['pixel']):
+            rows.append(f"<p>box size (px)<br>{svg_bars(h['pixel'], h['pixel_bins'])}</p>")
+    if comparison:
+        cmp_rows = ''.join(f'<tr><td>{k}</td><td>{v["js"]}</td><td>{v["tv"]}</td></tr>'
+                           for k, v in comparison.items() if k != 'per_class')
+        rows.append(f'<h2>{html.escape(title)}</h2>'
+                    f'<table border="1"><tr><th>histogram</th><th>JS (bits)</th><th>TV</th></tr>{cmp_rows}</table>')
+    Path(path).write_text('<html><head><meta charset="utf-8"><title>Dataset statistics</title></head><body>'
+                          + ''.join(rows) + '</body></html>', encoding='utf-8')
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--root', default='Dataset_resplit_aug', help='dataset root with images/ and labels/')
+    p.add_argument('--splits', default='train,val,test')
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--out', default='runs/detect/diagnostics/stats', help='report directory')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--pixels', action='store_true', help='read JPEG headers for box sizes in pixels')
+    p.add_argument('--pack', action='store_true', help='cache parsed boxes per split in <out>/packed')
+    p.add_argument('--compare', default='train,test', help='two splits to compare ("" = off)')
+    args = p.parse_args()
+
+    names = read_classes(args.classes) if args.classes else load_names()
+    if not names:
+        print('No class names found (pass --classes)')
+        return 1
+    root = Path(args.root)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    reports = {}
+    for split in [s for s in args.splits.split(',') if s]:
+        t0 = time.perf_counter()
+        st, missing, orphans, source = split_stats(root, split, len(names), args.workers, args.pixels,
+                                                   out / 'packed' if args.pack else None)
+        if st.images == 0:
+            continue
+        rep = st.summary(names)
+        rep.update(split=split, images_without_label=missing, labels_without_image=orphans)
+        reports[split] = rep
+        (out / f'stats_{split}.json').write_text(json.dumps(rep), encoding='utf-8')
+        q = rep['box_size_quantiles']
+        print(f"{split:6s} {rep['images']:7d} images {rep['boxes']:8d} boxes  {rep['boxes_per_image_mean']:.2f}/img  "
+              f"size p5/p50/p95 {q['0.05']}/{q['0.5']}/{q['0.95']}  empty {rep['empty_labels']}  "
+              f"malformed {rep['malformed_lines']}  ({source}, {time.perf_counter() - t0:.2f}s)")
+
+    comparison = None
+    pair = [s for s in args.compare.split(',') if s]
+    if len(pair) == 2 and all(s in reports for s in pair):
+        comparison = compare_splits(reports[pair[0]], reports[pair[1]], names)
+        (out / 'compare.json').write_text(json.dumps(comparison, indent=2), encoding='utf-8')
+        print(f'{pair[0]} vs {pair[1]} (Jensen-Shannon bits / total variation):')
+        for k in ('size', 'aspect', 'boxes_per_image', 'center', 'class_share'):
+            v = comparison[k]
+            print(f'  {k:16s} {v["js"]} / {v["tv"]}')
+        worst = sorted(((v['size_shift']['js'] or 0, n) for n, v in comparison['per_class'].items()), reverse=True)[:3]
+        print('  largest per-class size shift:', ', '.join(f'{n} ({js:.3f})' for js, n in worst))
+    write_html(out / 'report.html', reports, comparison, names, ' vs '.join(pair))
+    print('Report written to', out)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Detection metrics (per-class AP at IoU 0.50:0.95) computed from numpy predictions.
+
+COCO-style score-greedy matching: predictions claim same-class GT boxes in
+descending score order, each taking its highest-IoU unclaimed GT, one GT per
+prediction and IoU threshold; AP is the area under the interpolated precision
+envelope at 101 recall points (COCO / Ultralytics interpolation). Ultralytics
+val matches greedily by IoU instead, so numbers can differ slightly from
+`YOLO.val` on crowded images; comparisons within these tools are consistent.
+Used where predictions are produced outside `YOLO.val` (ensembles, fused TTA,
+gates).
+
+  stats = DetectionStats(nc)
+  for each image: stats.add(pred_xyxy, pred_scores, pred_cls, gt_xyxy, gt_cls)
+  ap = stats.ap()      # (nc, 10), NaN for classes without GT
+  stats.map50(), stats.map()
+"""
+import numpy as np
+
+from box_ops import box_iou
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+_trapz = getattr(np, 'trapezoid', None) or np.trapz  # renamed in numpy 2.0
+
+
+def match_predictions(pred_boxes, pred_scores, pred_cls, gt_boxes, gt_cls, iouv=IOU_THRESHOLDS):
+    """(M, len(iouv)) bool TP matrix, rows in the order of the given predictions."""
+    tp = np.zeros((len(pred_boxes), len(iouv)), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return tp
+    iou = box_iou(pred_boxes, gt_boxes)
+    iou[pred_cls[:, None] != gt_cls[None, :]] = 0.0
+    order = np.argsort(-pred_scores, kind='stable')
+    for t, thr in enumerate(iouv):
+        taken = np.zeros(len(gt_boxes), dtype=bool)
+        for i in order:
+            cand = np.where(taken, -1.0, iou[i])
+            j = int(cand.argmax())
+            if cand[j] >= thr:
+                taken[j] = True
+                tp[i, t] = True
+    return tp
+
+
+def average_precision(tp, scores, n_gt):
+    """AP per IoU threshold for one class: tp (M, T) bool, scores (M,), n_gt GT boxes -> (T,)."""
+    if n_gt == 0:
+        return np.full(tp.shape[1], np.nan)
+    if len(tp) == 0:
+        return np.zeros(tp.shape[1])
+    order = np.argsort(-scores, kind='stable')
+    ctp = np.cumsum(tp[order], 0)
+    cfp = np.cumsum(~tp[order], 0)
+    recall = ctp / n_gt
+    precision = ctp / (ctp + cfp)
+    x = np.linspace(0, 1, 101)
+    ap = np.empty(tp.shape[1])
+    for t in range(tp.shape[1]):
+        mrec = np.concatenate([[0.0], recall[:, t], [1.0]])
+        mpre = np.concatenate([[1.0], precision[:, t], [0.0]])
+        mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+        ap[t] = _trapz(np.interp(x, mrec, mpre), x)
+    return ap
+
+
+class DetectionStats:
+    """Accumulates per-prediction TP rows image by image; AP is computed once at the end."""
+
+    def __init__(self, nc, iouv=IOU_THRESHOLDS):
+        self.nc = nc
+        self.iouv = iouv
+        self.tp, self.scores, self.cls = [], [], []
+        self.n_gt = np.zeros(nc, dtype=np.int64)
+
+    def add(self, pred_boxes, pred_scores, pred_cls, gt_boxes, gt_cls):
+        pred_cls = np.asarray(pred_cls).astype(np.int64)
+        gt_cls = np.asarray(gt_cls).astype(np.int64)
+        self.tp.append(match_predictions(pred_boxes, pred_scores, pred_cls, gt_boxes, gt_cls, self.iouv))
+        self.scores.append(np.asarray(pred_scores, dtype=np.float64))
+        self.cls.append(pred_cls)
+        np.add.at(self.n_gt, gt_cls[(gt_cls >= 0) & (gt_cls < self.nc)], 1)
+
+    def ap(self):
+        """(nc, T) AP per class and IoU threshold; NaN rows for classes without GT."""
+        tp = np.concatenate(self.tp) if self.tp else np.zeros((0, len(self.iouv)), bool)
+        scores = np.concatenate(self.scores) if self.scores else np.zeros(0)
+        cls = np.concatenate(self.cls) if self.cls else np.zeros(0, np.int64)
+        return np.stack([average_precision(tp[cls == c], scores[cls == c], self.n_gt[c]) for c in range(self.nc)])
+
+    def map50(self, ap=None):
+        ap = self.ap() if ap is None else ap
+        return float(np.nanmean(ap[:, 0])) if np.isfinite(ap[:, 0]).any() else 0.0
+
+    def map(self, ap=None):
+        ap = self.ap() if ap is None else ap
+        return float(np.nanmean(ap.mean(1))) if np.isfinite(ap[:, 0]).any() else 0.0
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Distill the trained yolov8s teacher into a yolov8n student.
+
+  # 1. run the teacher over the training images once, cache soft predictions
+  python tools/distill.py cache --teacher runs/detect/resplit_train_gpu_patience3/weights/best.pt \
+      --data Dataset_resplit_aug/data.yaml --out runs/distill/teacher_train.npz
+  # 2. train the student against GT + cached teacher predictions
+  python tools/distill.py train --cache runs/distill/teacher_train.npz --student yolov8n.pt \
+      --data Dataset_resplit_aug/data.yaml --alpha 0.5 epochs=100 device=0
+  # 3. CPU latency/accuracy table on the test split
+  python tools/distill.py table teacher=runs/detect/resplit_train_gpu_patience3/weights/best.pt \
+      student=runs/detect/distill_n/weights/best.pt
+
+Cache format (one compressed .npz): per image the top-k teacher detections
+after class-agnostic NMS at a low confidence, as float16 normalized xywh boxes
+plus the full class-probability vector quantized to uint8 (~2 KB/image).
+
+The student loss is the regular v8DetectionLoss mixed with a distillation term:
+teacher boxes are assigned to student anchors with the same task-aligned
+assigner, the classification branch is trained with BCE against the teacher's
+class probabilities and the box branch with CIoU against the teacher boxes.
+Cached boxes are in original-image coordinates, so training turns off the
+geometric augmentations (mosaic, affine, flips) that would move the objects;
+colour augmentation stays on.
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from box_ops import nms
+from label_io import IMG_EXTS
+from project_config import read_data_yaml
+
+# augmentations that move boxes: the cached teacher targets would no longer line up
+NO_GEOMETRY = dict(mosaic=0.0, mixup=0.0, copy_paste=0.0, degrees=0.0, translate=0.0, scale=0.0, shear=0.0,
+                   perspective=0.0, fliplr=0.0, flipud=0.0, rect=False)
+
+
+def split_images(data_yaml, split):
+    """Image paths of a split from a data.yaml (dirs or .txt lists, relative to `path`)."""
+    d = read_data_yaml(data_yaml)
+    base = Path(d.get('path') or Path(data_yaml).parent)
+    if not base.is_absolute() and not base.exists():
+        base = Path(data_yaml).parent / base
+    entries = d.get(split) or []
+    out = []
+    for e in entries if isinstance(entries, list) else [entries]:
+        p = Path(e) if Path(e).is_absolute() else base / e
+        if p.is_dir():
+            out.extend(sorted(str(f) for f in p.rglob('*') if f.suffix.lower() in IMG_EXTS))
+        elif p.suffix == '.txt' and p.exists():
+            for line in p.read_text(encoding='utf-8').splitlines():
+                line = line.strip()
+                if line:
+                    out.append(line if os.path.isabs(line) else str(p.parent / line))
+    return out
+
+
+def teacher_topk(pred, size, shape0, topk, min_score, iou):
+    """Raw head output (4+nc, A) for one letterboxed image -> normalized xywh (k,4), probs (k,nc)."""
+    box, probs = pred[:4].T, pred[4:].T
+    score = probs.max(1)
+    cand = np.flatnonzero(score > min_score)
+    cand = cand[np.argsort(-score[cand])[:max(3 * topk, 300)]]
+    xyxy = np.concatenate([box[cand, :2] - box[cand, 2:] / 2, box[cand, :2] + box[cand, 2:] / 2], 1)
+    keep = cand[nms(xyxy, score[cand], iou)[:topk]]
+    # undo letterbox (same geometry as export_int8.letterbox)
+    h0, w0 = shape0
+    r = min(size / h0, size / w0)
+    nh, nw = round(h0 * r), round(w0 * r)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    b = box[keep].copy()
+    b[:, 0] = (b[:, 0] - left) / nw
+    b[:, 1] = (b[:, 1] - top) / nh
+    b[:, 2] /= nw
+    b[:, 3] /= nh
+    return b, probs[keep]
+
+
+def cmd_cache(args):
+    import torch
+    from ultralytics import YOLO
+    from export_int8 import to_input
+    from image_codec import get_codec, imread
+
+    paths = split_images(args.data, args.split)
+    if not paths:
+        print('No images for split', args.split, 'in', args.data)
+        return 1
+    device = torch.device('cuda:0' if args.device not in ('cpu', '') and torch.cuda.is_available() else 'cpu')
+    model = YOLO(args.teacher).model.to(device).eval()
+    codec = get_codec('auto')
+    stems, boxes, probs, counts = [], [], [], []
+    t0 = time.perf_counter()
+    with torch.inference_mode():
+        for i in range(0, len(paths), args.batch):
+            chunk = [(p, imread(codec, p)) for p in paths[i:i + args.batch]]
+            chunk = [(p, img) for p, img in chunk if img is not None]
+            if not chunk:
+                continue
+            x = torch.from_numpy(np.concatenate([to_input(img, args.imgsz) for _, img in chunk])).to(device)
+            pred = model(x)
+            pred = (pred[0] if isinstance(pred, (list, tuple)) else pred).float().cpu().numpy()
+            for (p, img), pi in zip(chunk, pred):
+                b, pr = teacher_topk(pi, args.imgsz, img.shape[:2], args.topk, args.min_score, args.iou)
+                stems.append(Path(p).stem)
+                boxes.append(b.astype(np.float16))
+                probs.append(np.round(pr * 255).astype(np.uint8))
+                counts.append(len(b))
+            if (i // args.batch) % 50 == 0:
+                print(f'{i + len(chunk)}/{len(paths)} images')
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(out, stems=np.array(stems), counts=np.array(counts, np.int32),
+                        boxes=np.concatenate(boxes) if boxes else np.zeros((0, 4), np.float16),
+                        probs=np.concatenate(probs) if probs else np.zeros((0, 0), np.uint8),
+                        meta=json.dumps({'teacher': str(args.teacher), 'imgsz': args.imgsz, 'topk': args.topk,
+                                         'min_score': args.min_score, 'iou': args.iou}))
+    print(f'Cached {sum(counts)} teacher boxes for {len(stems)} images in {time.perf_counter() - t0:.0f}s '
+          f'-> {out} ({out.stat().st_size / 1e6:.1f} MB)')
+    return 0
+
+
+def load_cache(path):
+    """stem -> (normalized xywh float32 (k,4), probs float32 (k,nc))."""
+    z = np.load(path)
+    offsets = np.concatenate([[0], np.cumsum(z['counts'])])
+    boxes = z['boxes'].astype(np.float32)
+    probs = z['probs'].astype(np.float32) / 255.0
+    return {str(s): (boxes[offsets[i]:offsets[i + 1]], probs[offsets[i]:offsets[i + 1]])
+            for i, s in enumerate(z['stems'])}
+
+
+def make_distill_loss(model, cache, alpha):
+    """v8DetectionLoss + teacher distillation term, as a criterion instance for `model`."""
+    import torch
+    from ultralytics.utils.loss import v8DetectionLoss
+    from ultralytics.utils.metrics import bbox_iou
+    from ultralytics.utils.tal import make_anchors
+
+    class DistillLoss(v8DetectionLoss):
+        def teacher_targets(self, batch, imgsz):
+            """Cached teacher boxes mapped into the (letterboxed) batch images: xyxy px, probs, mask."""
+            H, W = float(imgsz[0]), float(imgsz[1])
+            items = []
+            for i, f in enumerate(batch['im_file']):
+                b, p = cache.get(Path(f).stem, (np.zeros((0, 4), np.float32), None))
+                h0, w0 = batch['ori_shape'][i]
+                if 'resized_shape' in batch:
+                    h, w = batch['resized_shape'][i]
+                else:
+                    r = min(H / h0, W / w0)
+                    h, w = h0 * r, w0 * r
+                left, top = (W - w) / 2, (H - h) / 2
+                xyxy = np.stack([(b[:, 0] - b[:, 2] / 2) * w + left, (b[:, 1] - b[:, 3] / 2) * h + top,
+                                 (b[:, 0] + b[:, 2] / 2) * w + left, (b[:, 1] + b[:, 3] / 2) * h + top], 1)
+                items.append((xyxy, p))
+            m = max(1, max(len(x) for x, _ in items))
+            bs = len(items)
+            boxes = torch.zeros(bs, m, 4, device=self.device)
+            probs = torch.zeros(bs, m, self.nc, device=self.device)
+            mask = torch.zeros(bs, m, 1, dtype=torch.bool, device=self.device)
+            for i, (x, p) in enumerate(items):
+                if len(x):
+                    boxes[i, :len(x)] = torch.from_numpy(x).to(self.device)
+                    probs[i, :len(x)] = torch.from_numpy(p).to(self.device)
+                    mask[i, :len(x)] = True
+            return boxes, probs, mask
+
+        def distill(self, preds, batch):
+            feats = preds[1] if isinstance(preds, tuple) else preds
+            bs = feats[0].shape[0]
+            pred_distri, pred_scores = torch.cat([xi.view(bs, self.no, -1) for xi in feats], 2).split(
+                (self.reg_max * 4, self.nc), 1)
+            pred_scores = pred_scores.permute(0, 2, 1).contiguous()
+            pred_distri = pred_distri.permute(0, 2, 1).contiguous()
+            dtype = pred_scores.dtype
+            imgsz = torch.tensor(feats[0].shape[2:], device=self.device, dtype=dtype) * self.stride[0]
+            anchor_points, stride_tensor = make_anchors(feats, self.stride, 0.5)
+            pred_bboxes = self.bbox_decode(anchor_points, pred_distri)
+
+            t_boxes, t_probs, t_mask = self.teacher_targets(batch, imgsz)
+            zero = pred_scores.sum() * 0
+            if not t_mask.any():
+                return zero, zero
+            t_labels = t_probs.argmax(-1, keepdim=True)
+            _, target_bboxes, _, fg_mask, gt_idx = self.assigner(
+                pred_scores.detach().sigmoid(), (pred_bboxes.detach() * stride_tensor).type(t_boxes.dtype),
+                anchor_points * stride_tensor, t_labels, t_boxes, t_mask)
+            # each positive anchor learns the full class distribution of its teacher box
+            soft = torch.gather(t_probs, 1, gt_idx.unsqueeze(-1).expand(-1, -1, self.nc)) * fg_mask.unsqueeze(-1)
+            kd_cls = self.bce(pred_scores, soft.to(dtype)).sum() / max(soft.sum(), 1)
+            if not fg_mask.any():
+                return zero, kd_cls
+            weight = soft.amax(-1)[fg_mask]
+            iou = bbox_iou(pred_bboxes[fg_mask], target_bboxes[fg_mask] / stride_tensor[fg_mask], xywh=False, CIoU=True)
+            kd_box = ((1.0 - iou.squeeze(-1)) * weight).sum() / max(weight.sum(), 1)
+            return kd_box, kd_cls
+
+        def __call__(self, preds, batch):
+            total, items = super().__call__(preds, batch)
+            kd_box, kd_cls = self.distill(preds, batch)
+            kd = torch.zeros_like(items)
+            kd[0] = kd_box * self.hyp.box
+            kd[1] = kd_cls * self.hyp.cls
+            bs = len(batch['im_file'])
+            # mixed into the box/cls components so the trainer's loss columns stay the same
+            if total.ndim == 0:
+                total = (1 - alpha) * total + alpha * kd.sum() * bs
+            else:
+                total = (1 - alpha) * total + alpha * kd * bs
+            return total, (1 - alpha) * items + alpha * kd.detach()
+
+    return DistillLoss(model)
+
+
+def cmd_train(args):
+    from ultralytics import YOLO
+    from train_profiler import parse_overrides
+
+    cache = load_cache(args.cache)
+    print(f'Loaded teacher predictions for {len(cache)} images')
+    model = YOLO(args.student)
+
+    def attach(trainer):
+        m = trainer.model.module if hasattr(trainer.model, 'module') else trainer.model
+        # set after setup so only the training model gets it; the EMA/val model keeps the plain loss
+        m.criterion = make_distill_loss(m, cache, args.alpha)
+
+    model.add_callback('on_train_start', attach)
+    overrides = dict(NO_GEOMETRY)
+    overrides.update(parse_overrides(args.overrides))
+    moved = [k for k in NO_GEOMETRY if overrides[k] != NO_GEOMETRY[k]]
+    if moved:
+        print('WARNING: geometric augmentation re-enabled, teacher targets will be misaligned:', ', '.join(moved))
+    model.train(data=args.data, imgsz=args.imgsz, name=args.name, **overrides)
+    return 0
+
+
+def count_params(weights):
+    from ultralytics import YOLO
+    return sum(p.numel() for p in YOLO(weights).model.parameters())
+
+
+def cmd_table(args):
+    from ultralytics import YOLO
+    rows = []
+    for spec in args.models:
+        name, _, weights = spec.partition('=')
+        m = YOLO(weights).val(data=args.data, split=args.split, imgsz=args.imgsz, batch=1, device='cpu',
+                              plots=False, verbose=False)
+        rows.append({'model': name, 'weights': weights, 'params_m': count_params(weights) / 1e6,
+                     'map50': float(m.box.map50), 'map50_95': float(m.box.map),
+                     'cpu_ms': m.speed['inference'], 'total_ms': sum(m.speed.values())})
+    print(f'| model | params (M) | mAP50 | mAP50-95 | CPU inference (ms) | CPU total (ms) |')
+    print('|---|---:|---:|---:|---:|---:|')
+    for r in rows:
+        print(f"| {r['model']} | {r['params_m']:.2f} | {r['map50']:.4f} | {r['map50_95']:.4f} | "
+              f"{r['cpu_ms']:.1f} | {r['total_ms']:.1f} |")
+    if len(rows) >= 2:
+        t, s = rows[0], rows[1]
+        print(f"{s['model']} vs {t['model']}: mAP50-95 {s['map50_95'] - t['map50_95']:+.4f}, "
+              f"x{t['cpu_ms'] / max(s['cpu_ms'], 1e-9):.2f} faster")
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(rows, indent=2), encoding='utf-8')
+    return 0
+
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest='cmd', required=True)
+    s = sub.add_parser('cache', help='run the teacher once and cache soft predictions')
+    s.add_argument('--teacher', default='runs/detect/resplit_train_gpu_patience3/weights/best.pt')
+    s.add_argument('--data', default='Dataset_resplit_aug/data.yaml')
+    s.add_argument('--split', default='train')
+    s.add_argument('--out', default='runs/distill/teacher_train.npz')
+    s.add_argument('--imgsz', type=int, default=640)
+    s.add_argument('--batch', type=int, default=16)
+    s.add_argument('--device', default='0')
+    s.add_argument('--topk', type=int, default=100, help='teacher boxes kept per image')
+    s.add_argument('--min_score', type=float, default=0.01, help='drop candidates below this max class prob')
+    s.add_argument('--iou', type=float, default=0.7, help='class-agnostic NMS IoU before top-k')
+    s = sub.add_parser('train', help='train the student with the distillation loss')
+    s.add_argument('--cache', default='runs/distill/teacher_train.npz')
+    s.add_argument('--student', default='yolov8n.pt')
+    s.add_argument('--data', default='Dataset_resplit_aug/data.yaml')
+    s.add_argument('--imgsz', type=int, default=640)
+    s.add_argument('--alpha', type=float, default=0.5, help='weight of the distillation term (0 = plain training)')
+    s.add_argument('--name', default='distill_n')
+    s.add_argument('overrides', nargs='*', help='extra trainer args as key=value (e.g. epochs=100 device=0)')
+    s = sub.add_parser('table', help='CPU latency/accuracy table')
+    s.add_argument('models', nargs='+', help='name=weights, teacher first')
+    s.add_argument('--data', default='Dataset_resplit_aug/data.yaml')
+    s.add_argument('--split', default='test')
+    s.add_argument('--imgsz', type=int, default=640)
+    s.add_argument('--json', default='runs/distill/table.json')
+    args = p.parse_args()
+    return {'cache': cmd_cache, 'train': cmd_train, 'table': cmd_table}[args.cmd](args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
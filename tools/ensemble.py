@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""Ensemble / test-time-augmentation inference with weighted boxes fusion.
+
+  # two checkpoints + horizontal flip, scored against a single model on the test split
+  python tools/ensemble.py --models runs/detect/resplit_train_gpu_patience3/weights/best.pt \
+      runs/detect/other_run/weights/best.pt --flip --data Dataset_resplit_aug/data.yaml --split test
+  # one model, flip + two extra scales, fused predictions for a folder of new images
+  python tools/ensemble.py --models best.pt --flip --scales 0.83,1,1.17 --source incoming/ --save_txt
+
+Every image is decoded once; per batch and input size the letterboxed tensor
+is built once and flipped on the device, and all models run on that same
+batch. Each (model, variant) pass is decoded from the raw head output with
+class-aware NMS, mapped back to the original image, its classes mapped to the
+project classes by name (so checkpoints with a different class order fuse
+correctly; classes the project lacks are dropped), and the passes are fused
+per image with box_ops.weighted_boxes_fusion (weights via --weights).
+
+With --data the report gives mAP50 / mAP50-95 of every single pass, of the
+fused ensemble and per class, against the baseline (first model, scale 1, no
+flip), and the cost multiplier: total time (decode + preprocess + forward +
+postprocess + fusion) over the time the baseline pass alone needs.
+--save_txt writes fused predictions as `cls x y w h conf` txt files (the
+layout of `yolo predict save_txt=True save_conf=True`), so they can feed
+mine_hard_examples.py, audit_labels.py or sweep_thresholds.py.
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from box_ops import batched_nms, weighted_boxes_fusion
+from det_metrics import DetectionStats
+from distill import split_images
+from label_io import IMG_EXTS, read_label_array, xywh_to_xyxy
+from project_config import load_names
+from sweep_thresholds import apply_thresholds, load_thresholds
+
+
+def round32(x):
+    return max(32, int(round(x / 32)) * 32)
+
+
+def model_label(weights):
+    # runs/detect/<run>/weights/best.pt -> <run>/best
+    p = Path(weights)
+    return f'{p.parent.parent.name}/{p.stem}' if p.parent.name == 'weights' else p.name
+
+
+def decode_pass(pred, size, shape0, flip, conf, iou, max_det, with_probs=False):
+    """Raw head output (4+nc, A) of one letterboxed image -> normalized xyxy, scores, classes.
+
+    with_probs=True appends the (k, nc) class-probability rows of the kept boxes.
+    """
+    box, probs = pred[:4].T, pred[4:].T
+    cls = probs.argmax(1)
+    score = probs[np.arange(len(cls)), cls]
+    cand = np.flatnonzero(score > conf)
+    cand = cand[np.argsort(-score[cand])[:30000]]
+    b = box[cand].astype(np.float32)
+    if flip:
+        b[:, 0] = size - b[:, 0]
+    xyxy = xywh_to_xyxy(b)
+    keep = batched_nms(xyxy, score[cand], cls[cand], iou)[:max_det]
+    # undo letterbox (same geometry as export_int8.letterbox)
+    h0, w0 = shape0
+    r = min(size / h0, size / w0)
+    nh, nw = round(h0 * r), round(w0 * r)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out = xyxy[keep]
+    out[:, [0, 2]] = ((out[:, [0, 2]] - left) / nw).clip(0, 1)
+    out[:, [1, 3]] = ((out[:, [1, 3]] - top) / nh).clip(0, 1)
+    res = out, score[cand][keep].astype(np.float32), cls[cand][keep]
+    return res + (probs[cand][keep],) if with_probs else res
+
+
+def read_gt(img_path):
+    # label path by the images/ -> labels/ convention
+    p = Path(img_path)
+    parts = list(p.parts)
+    if 'images' in parts:
+        i = len(parts) - 1 - parts[::-1].index('images')
+        parts[i] = 'labels'
+    gt = read_label_array(Path(*parts).with_suffix('.txt'), 5)
+    return xywh_to_xyxy(gt[:, 1:5]), gt[:, 0].astype(np.int64)
+
+
+def write_txt(path, boxes, scores, classes):
+    with open(path, 'w', encoding='utf-8') as f:
+        for (x1, y1, x2, y2), s, c in zip(boxes, scores, classes):
+            f.write(f'{int(c)} {(x1 + x2) / 2:.6f} {(y1 + y2) / 2:.6f} {x2 - x1:.6f} {y2 - y1:.6f} {s:.5f}\n')
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--models', nargs='+', required=True, help='weights; the first one is the baseline')
+    p.add_argument('--weights', default=None, help='comma-separated fusion weight per model (default: equal)')
+    p.add_argument('--flip', action='store_true', help='add a horizontally flipped pass per scale')
+    p.add_argument('--scales', default='1', help='comma-separated input scales relative to --imgsz')
+    p.add_argument('--data', default='Dataset_resplit_aug/data.yaml')
+    p.add_argument('--split', default='test')
+    p.add_argument('--source', default=None, help='image folder to predict instead of a labelled split')
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--batch', type=int, default=8)
+    p.add_argument('--device', default='cpu')
+    p.add_argument('--conf', type=float, default=0.001, help='per-pass score threshold (low for mAP)')
+    p.add_argument('--iou', type=float, default=0.7, help='per-pass NMS IoU')
+    p.add_argument('--fuse_iou', type=float, default=0.55, help='WBF cluster IoU')
+    p.add_argument('--max_det', type=int, default=300)
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--out', default='runs/ensemble')
+    p.add_argument('--save_txt', action='store_true', help='write fused predictions to <out>/labels')
+    p.add_argument('--thresholds', default=None,
+                   help='per-class conf/NMS-IoU YAML from sweep_thresholds.py applied to the saved predictions')
+    args = p.parse_args()
+
+    import torch
+    from ultralytics import YOLO
+    from export_int8 import to_input
+    from image_codec import get_codec, imread
+
+    scales = [float(s) for s in args.scales.split(',')]
+    if 1.0 not in scales:
+        scales.insert(0, 1.0)  # the baseline pass
+    weights = [float(w) for w in args.weights.split(',')] if args.weights else [1.0] * len(args.models)
+    if len(weights) != len(args.models):
+        print(f'--weights has {len(weights)} values for {len(args.models)} models')
+        return 1
+    if args.source:
+        paths = sorted(str(f) for f in Path(args.source).iterdir() if f.suffix.lower() in IMG_EXTS)
+    else:
+        paths = split_images(args.data, args.split)
+    if not paths:
+        print('No images found')
+        return 1
+    names = load_names(data_yaml=None if args.source else args.data, classes=args.classes)
+    thr = load_thresholds(args.thresholds, names) if args.thresholds else None
+
+    if args.device == 'cpu' or not torch.cuda.is_available():
+        device = torch.device('cpu')
+    else:
+        device = torch.device(f'cuda:{args.device}' if args.device.isdigit() else args.device)
+    yolos = [YOLO(w) for w in args.models]
+    models = [y.model.to(device).float().eval() for y in yolos]
+    # model class id -> project class id by name (-1: not a project class, dropped before fusion)
+    to_project = [np.array([names.index(n) if n in names else -1 for _, n in sorted(y.names.items())])
+                  for y in yolos]
+    for w, y in zip(args.models, yolos):
+        missing = [n for n in y.names.values() if n not in names]
+        if missing:
+            print(f'Warning: {model_label(w)} classes not in the project classes are dropped: {", ".join(missing)}')
+    base_size = round32(args.imgsz)
+    sizes = sorted({round32(args.imgsz * s) for s in scales}, key=lambda s: s != base_size)
+    # one pass = (model, size, flip), the fusion weight comes from the model
+    passes = [(m, size, flip) for size in sizes for flip in ((False, True) if args.flip else (False,))
+              for m in range(len(models))]
+    pass_names = [f"{model_label(args.models[m])}@{size}{'+flip' if flip else ''}" for m, size, flip in passes]
+    pass_w = [weights[m] for m, _, _ in passes]
+
+    out = Path(args.out)
+    if args.save_txt:
+        (out / 'labels').mkdir(parents=True, exist_ok=True)
+    evaluate = not args.source
+    stats = [DetectionStats(len(names)) for _ in passes] if evaluate else []
+    fused_stats = DetectionStats(len(names)) if evaluate else None
+    t = defaultdict(float)  # decode / preprocess@size / forward@pass / post@pass / fuse
+    codec = get_codec('auto')
+    n_img = 0
+    with torch.inference_mode():
+        for i in range(0, len(paths), args.batch):
+            t0 = time.perf_counter()
+            chunk = [(p, imread(codec, p)) for p in paths[i:i + args.batch]]
+            chunk = [(p, img) for p, img in chunk if img is not None]
+            t['decode'] += time.perf_counter() - t0
+            if not chunk:
+                continue
+            dets = [[] for _ in chunk]  # per image: (boxes, scores, classes, pass index)
+            for size in sizes:
+                t0 = time.perf_counter()
+                x = torch.from_numpy(np.concatenate([to_input(img, size) for _, img in chunk])).to(device)
+                t[f'pre{size}'] += time.perf_counter() - t0
+                for k, (m, psize, flip) in enumerate(passes):
+                    if psize != size:
+                        continue
+                    t0 = time.perf_counter()
+                    pred = models[m](x.flip(3) if flip else x)
+                    pred = (pred[0] if isinstance(pred, (list, tuple)) else pred).float().cpu().numpy()
+                    t[f'fwd{k}'] += time.perf_counter() - t0
+                    t0 = time.perf_counter()
+                    for j, ((_, img), pj) in enumerate(zip(chunk, pred)):
+                        b, s, c = decode_pass(pj, size, img.shape[:2], flip, args.conf, args.iou, args.max_det)
+                        c = to_project[m][c]
+                        ok = c >= 0
+                        dets[j].append((b[ok], s[ok], c[ok], k))
+                    t[f'post{k}'] += time.perf_counter() - t0
+            for j, (path, _) in enumerate(chunk):
+                t0 = time.perf_counter()
+                b = np.concatenate([d[0] for d in dets[j]])
+                s = np.concatenate([d[1] for d in dets[j]])
+                c = np.concatenate([d[2] for d in dets[j]])
+                src = np.concatenate([np.full(len(d[0]), d[3]) for d in dets[j]])
+                fb, fs, fc = weighted_boxes_fusion(b, s, c, src, pass_w, args.fuse_iou, args.conf)
+                fb, fs, fc = fb[:args.max_det], fs[:args.max_det], fc[:args.max_det]
+                t['fuse'] += time.perf_counter() - t0
+                if args.save_txt:
+                    # mAP below is computed on the full low-conf list; the saved file is what deployment would see
+                    k = apply_thresholds(fb, fs, fc, *thr) if thr else slice(None)
+                    write_txt(out / 'labels' / (Path(path).stem + '.txt'), fb[k], fs[k], fc[k])
+                if evaluate:
+                    gb, gc = read_gt(path)
+                    for d in dets[j]:
+                        stats[d[3]].add(d[0], d[1], d[2], gb, gc)
+                    fused_stats.add(fb, fs, fc, gb, gc)
+            n_img += len(chunk)
+            if (i // args.batch) % 20 == 0:
+                print(f'{n_img}/{len(paths)} images')
+
+    if n_img == 0:
+        print(f'None of the {len(paths)} images could be decoded')
+        return 1
+    total = sum(t.values())
+    base = t['decode'] + t[f'pre{base_size}'] + t['fwd0'] + t['post0']
+    report = {'models': args.models, 'weights': weights, 'scales': scales, 'flip': args.flip, 'images': n_img,
+              'passes': pass_names, 'ms_per_image': {k: v * 1000 / n_img for k, v in t.items()},
+              'baseline_ms': base * 1000 / n_img, 'ensemble_ms': total * 1000 / n_img,
+              'cost_multiplier': total / max(base, 1e-9)}
+    print(f'\n{len(passes)} passes over {n_img} images: {report["ensemble_ms"]:.1f} ms/image vs '
+          f'{report["baseline_ms"]:.1f} ms/image for the baseline pass (x{report["cost_multiplier"]:.2f})')
+    print(f"  decode {report['ms_per_image']['decode']:.1f} ms, fusion {report['ms_per_image']['fuse']:.2f} ms per image")
+    if evaluate:
+        rows = []
+        for k, name in enumerate(pass_names):
+            ap = stats[k].ap()
+            rows.append((name, stats[k].map50(ap), stats[k].map(ap), ap))
+        ap_f = fused_stats.ap()
+        rows.append(('ensemble (WBF)', fused_stats.map50(ap_f), fused_stats.map(ap_f), ap_f))
+        print(f"\n{'pass':40s} {'mAP50':>7s} {'mAP50-95':>9s} {'ms/img':>8s}")
+        for k, (name, m50, m, _) in enumerate(rows):
+            ms = '' if k == len(passes) else f"{(t[f'fwd{k}'] + t[f'post{k}']) * 1000 / n_img:8.1f}"
+            print(f'{name:40s} {m50:7.4f} {m:9.4f} {ms}')
+        b_ap = rows[0][3]
+        print(f'\nensemble vs baseline: mAP50 {rows[-1][1] - rows[0][1]:+.4f}, mAP50-95 {rows[-1][2] - rows[0][2]:+.4f} '
+              f'at x{report["cost_multiplier"]:.2f} cost')
+        print(f"\n{'class':16s} {'base AP50-95':>12s} {'ensemble':>9s} {'gain':>8s}")
+        for c, name in enumerate(names):
+            if np.isnan(b_ap[c, 0]):
+                continue
+            print(f'{name:16s} {b_ap[c].mean():12.4f} {ap_f[c].mean():9.4f} {ap_f[c].mean() - b_ap[c].mean():+8.4f}')
+        report['accuracy'] = [{'pass': name, 'map50': m50, 'map50_95': m,
+                               'per_class_ap50_95': {names[c]: float(a[c].mean()) for c in range(len(names))
+                                                     if not np.isnan(a[c, 0])}} for name, m50, m, a in rows]
+        report['gain'] = {'map50': rows[-1][1] - rows[0][1], 'map50_95': rows[-1][2] - rows[0][2]}
+    out.mkdir(parents=True, exist_ok=True)
+    (out / 'report.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"Wrote {out / 'report.json'}" + (f" and fused predictions to {out / 'labels'}" if args.save_txt else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Export a trained checkpoint to ONNX and quantize it to INT8 for CPU inference.
+
+  python tools/export_int8.py --weights runs/detect/resplit_train_gpu_patience3/weights/best.pt
+
+Steps:
+  1. export FP32 ONNX with Ultralytics (static shape, imgsz x imgsz),
+  2. static INT8 quantization with onnxruntime (QDQ, per-channel weights),
+     calibrated on --calib_n letterboxed images from --calib_images (val split);
+     the detection head (last model.N block: DFL/concat/decode) stays FP32 by default,
+  3. evaluate FP32 and INT8 ONNX on the test split (mAP50, mAP50-95) and time
+     both with onnxruntime on CPU,
+  4. copy the INT8 model to --out only if the mAP50-95 drop is within
+     --max_drop (and mAP50 within --max_drop50); otherwise exit 1.
+A JSON report with both metrics, the deltas and the speedup goes next to --out.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from image_codec import get_codec, imread
+from label_io import IMG_EXTS
+
+
+def letterbox(img, size, pad=114):
+    """Resize keeping aspect ratio and pad to size x size (Ultralytics LetterBox, centered)."""
+    import cv2
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nh, nw = round(h * r), round(w * r)
+    if (nh, nw) != (h, w):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out = np.full((size, size, 3), pad, np.uint8)
+    out[top:top + nh, left:left + nw] = img
+    return out
+
+
+def to_input(img_bgr, size):
+    x = letterbox(img_bgr, size)[..., ::-1].transpose(2, 0, 1)  # BGR HWC -> RGB CHW
+    return np.ascontiguousarray(x, dtype=np.float32)[None] / 255.0
+
+
+class CalibrationReader:
+    """onnxruntime CalibrationDataReader over a sample of images (duck-typed: get_next/rewind)."""
+
+    def __init__(self, paths, input_name, size):
+        self.paths = paths
+        self.input_name = input_name
+        self.size = size
+        self.codec = get_codec('auto')
+        self.it = iter(self.paths)
+
+    def get_next(self):
+        for p in self.it:
+            img = imread(self.codec, p)
+            if img is not None:
+                return {self.input_name: to_input(img, self.size)}
+        return None
+
+    def rewind(self):
+        self.it = iter(self.paths)
+
+
+def sample_images(img_dir, n, seed=0):
+    paths = sorted(str(p) for p in Path(img_dir).iterdir() if p.suffix.lower() in IMG_EXTS)
+    random.Random(seed).shuffle(paths)
+    return paths[:n]
+
+
+def head_nodes(onnx_path):
+    """Names of the nodes in the last `/model.N/` block (the Detect head)."""
+    import onnx
+    model = onnx.load(onnx_path)
+    blocks = {}
+    for node in model.graph.node:
+        m = re.match(r'/model\.(\d+)/', node.name)
+        if m:
+            blocks.setdefault(int(m.group(1)), []).append(node.name)
+    return blocks[max(blocks)] if blocks else []
+
+
+def quantize(fp32_path, int8_path, calib_paths, size, per_channel=True, method='minmax', keep_head_fp32=True):
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prep = str(Path(int8_path).with_suffix('.prep.onnx'))
+    quant_pre_process(fp32_path, prep)
+    input_name = ort.InferenceSession(prep, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    exclude = head_nodes(prep) if keep_head_fp32 else []
+    methods = {'minmax': CalibrationMethod.MinMax, 'entropy': CalibrationMethod.Entropy,
+               'percentile': CalibrationMethod.Percentile}
+    t0 = time.perf_counter()
+    quantize_static(prep, int8_path, CalibrationReader(calib_paths, input_name, size),
+                    quant_format=QuantFormat.QDQ, per_channel=per_channel,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    calibrate_method=methods[method], nodes_to_exclude=exclude)
+    os.remove(prep)
+    print(f'Quantized with {len(calib_paths)} calibration images in {time.perf_counter() - t0:.1f}s '
+          f'({len(exclude)} head nodes kept FP32)')
+
+
+def latency_ms(onnx_path, size, threads, warmup=5, runs=50):
+    """(p50, p90) ms of single-image CPU inference with onnxruntime."""
+    import onnxruntime as ort
+    so = ort.SessionOptions()
+    if threads:
+        so.intra_op_num_threads = threads
+    sess = ort.InferenceSession(onnx_path, so, providers=['CPUExecutionProvider'])
+    name = sess.get_inputs()[0].name
+    x = np.random.default_rng(0).random((1, 3, size, size), dtype=np.float32)
+    for _ in range(warmup):
+        sess.run(None, {name: x})
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        sess.run(None, {name: x})
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(0.9 * (len(times) - 1))]
+
+
+def evaluate(onnx_path, data, size, split):
+    from ultralytics import YOLO
+    m = YOLO(onnx_path, task='detect').val(data=data, split=split, imgsz=size, batch=1, device='cpu',
+                                            plots=False, verbose=False)
+    return {'map50': float(m.box.map50), 'map50_95': float(m.box.map), 'val_speed_ms': m.speed}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--weights', default='runs/detect/resplit_train_gpu_patience3/weights/best.pt')
+    p.add_argument('--data', default='Dataset_resplit_aug/data.yaml')
+    p.add_argument('--calib_images', default='Dataset_resplit_aug/images/val')
+    p.add_argument('--calib_n', type=int, default=200, help='calibration images sampled from --calib_images')
+    p.add_argument('--calib_method', choices=('minmax', 'entropy', 'percentile'), default='minmax')
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--opset', type=int, default=17)
+    p.add_argument('--no_per_channel', action='store_true', help='per-tensor weight scales')
+    p.add_argument('--quantize_head', action='store_true', help='also quantize the Detect head')
+    p.add_argument('--split', default='test', help='evaluation split')
+    p.add_argument('--threads', type=int, default=0, help='onnxruntime intra-op threads for timing (0 = default)')
+    p.add_argument('--max_drop', type=float, default=0.01, help='max allowed mAP50-95 drop (absolute)')
+    p.add_argument('--max_drop50', type=float, default=0.01, help='max allowed mAP50 drop (absolute)')
+    p.add_argument('--out', default=None, help='published INT8 model (default: <weights dir>/best_int8.onnx)')
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+
+    from ultralytics import YOLO
+
+    weights = Path(args.weights)
+    out = Path(args.out) if args.out else weights.with_name(weights.stem + '_int8.onnx')
+    work = out.parent / (out.stem + '_work')
+    work.mkdir(parents=True, exist_ok=True)
+
+    fp32 = YOLO(str(weights)).export(format='onnx', imgsz=args.imgsz, opset=args.opset, dynamic=False,
+                                     simplify=True, half=False)
+    fp32 = str(shutil.copy(fp32, work / 'fp32.onnx'))
+    int8 = str(work / 'int8.onnx')
+    calib = sample_images(args.calib_images, args.calib_n, args.seed)
+    if not calib:
+        print('No calibration images in', args.calib_images)
+        return 1
+    quantize(fp32, int8, calib, args.imgsz, per_channel=not args.no_per_channel, method=args.calib_method,
+             keep_head_fp32=not args.quantize_head)
+
+    report = {'weights': str(weights), 'imgsz': args.imgsz, 'calib_n': len(calib), 'calib_method': args.calib_method,
+              'split': args.split}
+    for name, path in (('fp32', fp32), ('int8', int8)):
+        rep = evaluate(path, args.data, args.imgsz, args.split)
+        rep['p50_ms'], rep['p90_ms'] = latency_ms(path, args.imgsz, args.threads)
+        rep['size_mb'] = os.path.getsize(path) / 1e6
+        report[name] = rep
+        print(f"{name}: mAP50 {rep['map50']:.4f}  mAP50-95 {rep['map50_95']:.4f}  "
+              f"p50 {rep['p50_ms']:.1f} ms  p90 {rep['p90_ms']:.1f} ms  {rep['size_mb']:.1f} MB")
+
+    f, q = report['fp32'], report['int8']
+    report['delta_map50'] = q['map50'] - f['map50']
+    report['delta_map50_95'] = q['map50_95'] - f['map50_95']
+    report['speedup'] = f['p50_ms'] / q['p50_ms']
+    ok = -report['delta_map50_95'] <= args.max_drop and -report['delta_map50'] <= args.max_drop50
+    report['published'] = str(out) if ok else None
+    print(f"delta mAP50 {report['delta_map50']:+.4f}  mAP50-95 {report['delta_map50_95']:+.4f}  "
+          f"speedup x{report['speedup']:.2f}")
+
+    (out.parent / (out.stem + '_report.json')).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    if not ok:
+        print(f'NOT published: accuracy drop exceeds tolerance (mAP50-95 {args.max_drop}, mAP50 {args.max_drop50}); '
+              f'candidate kept at {int8}')
+        return 1
+    shutil.copy(int8, out)
+    print('Published', out)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -5,9 +5,11 @@
 - move label files without matching images to diagnostics/orphan_labels
 """
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import shutil
-import sys
+
+from label_txn import DEFAULT_JOURNAL, Transaction, warn_incomplete
+from project_config import read_classes, resolve
 
 
 def find_image_for_label(img_dir: Path, stem: str):
@@ -28,102 +30,106 @@ def find_image_for_label(img_dir: Path, stem: str):
     return None
 
 
-def fix_labels(root: Path, orphan_dir: Path, classes_file: Path):
+def fix_one(lab_path: Path, imgs_root: Path, nc: int):
+    """Normalize one label file. Returns (new_text or None if unchanged, fixed_lines, malformed, is_orphan)."""
+    fixed_lines = 0
+    malformed = 0
+    # labels structure: labels/<split>/<file>.txt
+    img_dir = imgs_root / lab_path.parent.name
+
+    text = lab_path.read_text(encoding='utf-8')
+    lines = [L.rstrip('\n') for L in text.splitlines()]
+    new_lines = []
+    for i, line in enumerate(lines):
+        if not line or not line.strip():
+            continue
+        parts = line.strip().split()
+        if len(parts) < 5:
+            malformed += 1
+            continue
+        cls_token = parts[0]
+        try:
+            # allow floats like 0.0
+            if '.' in cls_token:
+                cls_int = int(float(cls_token))
+            else:
+                cls_int = int(cls_token)
+        except ValueError:
+            malformed += 1
+            continue
+        # check range if classes loaded
+        if nc > 0 and (cls_int < 0 or cls_int >= nc):
+            # keep but flag as malformed
+            malformed += 1
+        # rest numbers to float
+        try:
+            rest = [f"{float(x):.6f}" for x in parts[1:5]]
+        except ValueError:
+            malformed += 1
+            continue
+        new_lines.append(' '.join([str(cls_int)] + rest))
+        if cls_token != str(cls_int):
+            fixed_lines += 1
+
+    # write corrected lines (also when some lines were bad, to reduce downstream errors)
+    new_text = '\n'.join(new_lines) + '\n' if new_lines else None
+    if new_text == text:
+        new_text = None
+
+    # check matching image
+    stem = lab_path.stem
+    orphan = find_image_for_label(img_dir, stem) is None
+    if orphan:
+        # try checking all image folders in imgs_root (sometimes labels in test refer to images in other folder)
+        for d in imgs_root.iterdir():
+            if d.is_dir() and find_image_for_label(d, stem) is not None:
+                orphan = False
+                break
+    return new_text, fixed_lines, malformed, orphan
+
+
+def fix_labels(root: Path, orphan_dir: Path, classes_file: Path, txn, workers=8):
     imgs_root = root / 'images'
     labels_root = root / 'labels'
     orphan_dir.mkdir(parents=True, exist_ok=True)
 
-    classes = []
-    if classes_file.exists():
-        classes = [l.strip() for l in classes_file.read_text(encoding='utf-8').splitlines() if l.strip()]
+    classes = read_classes(classes_file)
     nc = len(classes)
 
     total_files = 0
     fixed_lines = 0
+    rewritten = 0
     moved_orphans = 0
     malformed = 0
     orphan_list = []
 
-    for lab_path in labels_root.rglob('*.txt'):
-        total_files += 1
-        rel = lab_path.relative_to(labels_root.parent)
-        # determine corresponding image dir based on labels subdir
-        # labels structure: labels/<split>/<file>.txt
-        try:
-            split = lab_path.parent.name
-            img_dir = imgs_root / split
-        except Exception:
-            img_dir = imgs_root
-
-        lines = [L.rstrip('\n') for L in lab_path.read_text(encoding='utf-8').splitlines()]
-        new_lines = []
-        bad = False
-        for i, line in enumerate(lines):
-            if not line or not line.strip():
-                continue
-            parts = line.strip().split()
-            if len(parts) < 5:
-                malformed += 1
-                bad = True
-                continue
-            cls_token = parts[0]
-            try:
-                # allow floats like 0.0
-                if '.' in cls_token:
-                    cls_int = int(float(cls_token))
-                else:
-                    cls_int = int(cls_token)
-            except Exception:
-                malformed += 1
-                bad = True
-                continue
-            # check range if classes loaded
-            if nc > 0 and (cls_int < 0 or cls_int >= nc):
-                # keep but flag as malformed
-                malformed += 1
-                bad = True
-            # rest numbers to float
-            try:
-                rest = [f"{float(x):.6f}" for x in parts[1:5]]
-            except Exception:
-                malformed += 1
-                bad = True
-                continue
-            new_lines.append(' '.join([str(cls_int)] + rest))
-            if cls_token != str(cls_int):
-                fixed_lines += 1
-
-        # write fixed labels if any
-        if new_lines and not bad:
-            lab_path.write_text('\n'.join(new_lines) + '\n', encoding='utf-8')
-        elif new_lines and bad:
-            # still write corrected lines to reduce downstream errors
-            lab_path.write_text('\n'.join(new_lines) + '\n', encoding='utf-8')
-
-        # check matching image
-        stem = lab_path.stem
-        img = find_image_for_label(img_dir, stem)
-        if img is None:
-            # try checking all image folders in imgs_root (sometimes labels in test refer to images in other folder)
-            found = None
-            for d in imgs_root.iterdir():
-                if not d.is_dir():
-                    continue
-                f = find_image_for_label(d, stem)
-                if f is not None:
-                    found = f
-                    break
-            if found is None:
-                # move orphan label
+    lab_paths = sorted(labels_root.rglob('*.txt'))
+    # files are independent: normalize in threads, stage every change in the transaction
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        results = ex.map(lambda p: fix_one(p, imgs_root, nc), lab_paths)
+        for lab_path, (new_text, n_fixed, n_bad, orphan) in zip(lab_paths, results):
+            total_files += 1
+            fixed_lines += n_fixed
+            malformed += n_bad
+            if orphan:
+                # move orphan label (with its normalized content)
                 target = orphan_dir / lab_path.name
-                shutil.move(str(lab_path), str(target))
+                if new_text is not None:
+                    txn.write_text(target, new_text)
+                    txn.remove(lab_path)
+                else:
+                    txn.move(lab_path, target)
                 moved_orphans += 1
                 orphan_list.append(str(lab_path))
+            elif new_text is not None:
+                txn.write_text(lab_path, new_text)
+                rewritten += 1
 
     # summary
     summary = [
         f"classes_count: {nc}",
         f"total_label_files: {total_files}",
+        f"rewritten_label_files: {rewritten}",
         f"fixed_label_lines(class token changes): {fixed_lines}",
         f"malformed_label_lines: {malformed}",
         f"moved_orphan_labels: {moved_orphans}",
@@ -136,13 +142,20 @@ def main():
     p.add_argument('--root', default='Dataset_resplit_aug', help='dataset root')
     p.add_argument('--orphan', default='runs/detect/diagnostics/orphan_labels', help='where to move orphan labels')
     p.add_argument('--classes', default='classes.txt', help='classes file')
+    p.add_argument('--workers', type=int, default=8, help='threads reading/normalizing label files')
+    p.add_argument('--journal', default=DEFAULT_JOURNAL, help='transaction journal dir (see label_txn.py rollback)')
     args = p.parse_args()
 
     root = Path(args.root)
     orphan_dir = Path(args.orphan)
-    classes_file = Path(args.classes)
-
-    summary, orphan_list = fix_labels(root, orphan_dir, classes_file)
+    classes_file = resolve(args.classes)
+
+    warn_incomplete(args.journal)
+    # all rewrites/moves are applied atomically at the end of the block, or not at all
+    with Transaction('fix-labels', args.journal) as txn:
+        summary, orphan_list = fix_labels(root, orphan_dir, classes_file, txn, args.workers)
+    if len(txn):
+        summary.append(f'transaction: {txn.id} (undo: python tools/label_txn.py rollback {txn.id})')
     out = []
     out.append('Label auto-fix summary')
     out.extend(summary)
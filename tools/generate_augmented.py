@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 """Generate augmented images for training set using Albumentations and update YOLO labels.
 Output augmented images/labels into Dataset_resplit_aug/ (keeps original files and adds aug_ suffix files).
+Progress is journaled under <out>/.progress/augment: an interrupted run (Ctrl-C,
+crash) resumes where it stopped when rerun with the same arguments, and images
+that fail to decode, have malformed labels or fail to augment are listed in
+errors.jsonl there instead of being skipped silently.
 """
 import os
 from pathlib import Path
@@ -8,6 +12,14 @@ import argparse
 import random
 import shutil
 
+import numpy as np
+
+from image_codec import BACKENDS, get_codec, imread, imwrite
+from progress_journal import ConfigMismatch, ProgressJournal
+from project_config import load_names, write_data_yaml
+from stream_io import copy_if_changed
+import telemetry
+
 def ensure_dirs(p):
     p.mkdir(parents=True, exist_ok=True)
 
@@ -23,19 +35,24 @@ def copy_originals(src_root, dst_root):
             if f.is_file():
                 shutil.copy2(f, d/f.name)
 
-def parse_yolo_label(path):
-    # returns list of (class, x_center, y_center, w, h) floats
+def parse_yolo_label(path, bad=None):
+    # returns list of (class, x_center, y_center, w, h) floats; malformed lines are
+    # skipped and appended to `bad` as (line_no, text) when a list is given
     res = []
-    try:
-        with open(path,'r',encoding='utf-8') as f:
-            for l in f:
-                toks = l.strip().split()
-                if not toks: continue
+    with open(path,'r',encoding='utf-8') as f:
+        for n, l in enumerate(f, 1):
+            toks = l.strip().split()
+            if not toks: continue
+            try:
+                if len(toks) < 5:
+                    raise ValueError
                 cls = int(float(toks[0]))
                 coords = list(map(float, toks[1:5]))
-                res.append((cls, *coords))
-    except Exception:
-        pass
+            except ValueError:
+                if bad is not None:
+                    bad.append((n, l.strip()))
+                continue
+            res.append((cls, *coords))
     return res
 
 def write_yolo_label(path, items):
@@ -68,94 +85,116 @@ def bbox_to_yolo(coords, img_w, img_h):
     y_c = y_min + bh/2
     return (x_c/img_w, y_c/img_h, bw/img_w, bh/img_h)
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--src', default='Dataset_resplit', help='source resplit dataset root')
-    parser.add_argument('--out', default='Dataset_resplit_aug', help='output augmented dataset root')
-    parser.add_argument('--factor', type=int, default=1, help='augmentation factor per image')
-    args = parser.parse_args()
+def class_count_matrix(img_paths, lab_dir, nc):
+    # (n_images, nc) matrix of per-image instance counts
+    M = np.zeros((len(img_paths), nc), dtype=np.int64)
+    for i, img_path in enumerate(img_paths):
+        lab_path = lab_dir/(img_path.stem + '.txt')
+        if not lab_path.exists():
+            continue
+        for it in parse_yolo_label(lab_path):
+            if 0 <= it[0] < nc:
+                M[i, it[0]] += 1
+    return M
 
-    try:
-        import cv2
-        import albumentations as A
-    except Exception as e:
-        print('Required packages missing: opencv-python, albumentations')
-        raise
+def plan_balanced(M, budget=None, max_per_image=8):
+    """Per-image augmentation counts that lift the rarest classes first.
 
-    src = Path(args.src)
-    out = Path(args.out)
-    # copy originals
-    for d in ['images/train','images/val','images/test','labels/train','labels/val','labels/test']:
-        srcd = src/d
-        outd = out/d
-        if srcd.exists():
-            outd.mkdir(parents=True, exist_ok=True)
-            if 'images' in d or 'labels' in d:
-                # copy originals for non-train as well
-                for f in srcd.iterdir():
-                    if f.is_file():
-                        shutil.copy2(f, outd/f.name)
+    Each step augments one more copy of the image that is purest in the
+    currently rarest class (ties -> fewest copies so far), until `budget`
+    images are planned or every present class reaches the largest class's
+    original count.
+    """
+    cur = M.sum(0).astype(np.float64)
+    present = cur > 0
+    goal = cur.max()
+    copies = np.zeros(len(M), dtype=np.int64)
+    exhausted = ~present
+    total = M.sum(1).clip(min=1)
+    budget = budget if budget is not None else len(M) * max_per_image
+    planned = 0
+    while planned < budget:
+        open_cls = np.where(~exhausted & (cur < goal))[0]
+        if len(open_cls) == 0:
+            break
+        c = open_cls[np.argmin(cur[open_cls])]
+        cand = np.where((M[:, c] > 0) & (copies < max_per_image))[0]
+        if len(cand) == 0:
+            exhausted[c] = True
+            continue
+        purity = M[cand, c] / total[cand]
+        i = cand[np.lexsort((copies[cand], -purity))[0]]
+        copies[i] += 1
+        cur += M[i]
+        planned += 1
+    return copies, cur
 
-    aug = A.Compose([
+def build_transforms(A, cv2):
+    # the offline transform list; aug_preview.py times and previews it as `builtin:offline`
+    return [
         A.HorizontalFlip(p=0.5),
         A.RandomBrightnessContrast(p=0.5),
         A.ShiftScaleRotate(shift_limit=0.0625, scale_limit=0.1, rotate_limit=15, p=0.7, border_mode=cv2.BORDER_CONSTANT),
         A.MotionBlur(blur_limit=3, p=0.2),
         A.GaussNoise(p=0.2),
-    ], bbox_params=A.BboxParams(format='pascal_voc', label_fields=['category_ids']))
+    ]
 
-    img_dir = src/'images'/'train'
-    lab_dir = src/'labels'/'train'
-    out_img_dir = out/'images'/'train'
-    out_lab_dir = out/'labels'/'train'
+def augment_image(img_path, lab_path, n_copies, aug, codec, args, out_img_dir, out_lab_dir, pj):
+    """Write `n_copies` augmented copies of one image; returns False after recording a failure in `pj`."""
+    key = img_path.name
+    img = imread(codec, img_path, args.max_size)
+    if img is None:
+        pj.fail(key, 'decode', detail='unreadable image')
+        return False
+    h,w = img.shape[:2]
+    bad = []
+    try:
+        labels = parse_yolo_label(lab_path, bad) if lab_path.exists() else []
+    except (OSError, UnicodeDecodeError) as e:
+        pj.fail(key, 'label', e)
+        return False
+    if bad:
+        # augmenting with boxes missing would bake the label error into every copy
+        pj.fail(key, 'label', detail={'malformed_lines': len(bad), 'first': bad[:3]})
+        return False
+    # convert labels to pascal_voc absolute boxes
+    bboxes = []
+    cat_ids = []
+    for it in labels:
+        cls = it[0]
+        x,y,ww,hh = it[1],it[2],it[3],it[4]
+        x_c = x*w
+        y_c = y*h
+        bw = ww*w
+        bh = hh*h
+        x_min = max(0, x_c - bw/2)
+        y_min = max(0, y_c - bh/2)
+        x_max = min(w, x_c + bw/2)
+        y_max = min(h, y_c + bh/2)
+        bboxes.append([x_min,y_min,x_max,y_max])
+        cat_ids.append(int(cls))
 
-    for img_path in img_dir.iterdir():
-        if not img_path.is_file(): continue
-        lab_path = lab_dir/(img_path.stem + '.txt')
-        # read image
-        img = cv2.imread(str(img_path))
-        if img is None: continue
-        h,w = img.shape[:2]
-        labels = parse_yolo_label(lab_path) if lab_path.exists() else []
-        # convert labels to pascal_voc absolute boxes
-        bboxes = []
-        cat_ids = []
-        for it in labels:
-            cls = it[0]
-            x,y,ww,hh = it[1],it[2],it[3],it[4]
-            x_c = x*w
-            y_c = y*h
-            bw = ww*w
-            bh = hh*h
-            x_min = max(0, x_c - bw/2)
-            y_min = max(0, y_c - bh/2)
-            x_max = min(w, x_c + bw/2)
-            y_max = min(h, y_c + bh/2)
-            bboxes.append([x_min,y_min,x_max,y_max])
-            cat_ids.append(int(cls))
-
-        # keep original already copied; produce augmented copies
-        for i in range(args.factor):
-            out_name = f"{img_path.stem}_aug{i}.jpg"
+    # keep original already copied; produce augmented copies
+    for i in range(n_copies):
+        out_name = f"{img_path.stem}_aug{i}.jpg"
+        try:
+            with telemetry.span('augment'):
+                augmented = aug(image=img, bboxes=bboxes, category_ids=cat_ids) if bboxes else aug(image=img)
             if bboxes:
-                try:
-                    augmented = aug(image=img, bboxes=bboxes, category_ids=cat_ids)
-                    aug_img = augmented['image']
-                    aug_bboxes = augmented['bboxes']
-                    aug_cat = augmented['category_ids']
-                except Exception:
-                    aug_img = img
-                    aug_bboxes = bboxes
-                    aug_cat = cat_ids
+                aug_bboxes = augmented['bboxes']
+                aug_cat = augmented['category_ids']
             else:
-                # no bboxes
-                augmented = aug(image=img)
-                aug_img = augmented['image']
                 aug_bboxes = []
                 aug_cat = []
+            aug_img = augmented['image']
+        except Exception as e:
+            # no fallback to writing the unaugmented image as a copy: report it
+            pj.fail(key, 'augment', e)
+            return False
 
-            out_fp = out_img_dir/out_name
-            cv2.imwrite(str(out_fp), aug_img)
+        out_fp = out_img_dir/out_name
+        try:
+            imwrite(codec, out_fp, aug_img, args.quality, args.progressive)
             # write label
             out_label = out_lab_dir/(out_fp.stem + '.txt')
             with open(out_label,'w',encoding='utf-8') as fh:
@@ -167,25 +206,123 @@ def main():
                     bw = (x_max - x_min)/w
                     bh = (y_max - y_min)/h
                     fh.write(f"{cid} {xc:.6f} {yc:.6f} {bw:.6f} {bh:.6f}\n")
+        except OSError as e:
+            pj.fail(key, 'write', e)
+            return False
+    telemetry.count('augmented_copies', n_copies)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', default='Dataset_resplit', help='source resplit dataset root')
+    parser.add_argument('--out', default='Dataset_resplit_aug', help='output augmented dataset root')
+    parser.add_argument('--factor', type=int, default=1, help='augmentation factor per image')
+    parser.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    parser.add_argument('--balanced', action='store_true',
+                        help='derive per-image augmentation counts from class instance counts instead of --factor')
+    parser.add_argument('--budget', type=int, default=None,
+                        help='max augmented images in --balanced mode (default: until classes are even)')
+    parser.add_argument('--max_per_image', type=int, default=8, help='cap on augmented copies of one image (--balanced)')
+    parser.add_argument('--weights', default=None,
+                        help='per-image weight list from mine_hard_examples.py; multiplies the copies of listed images')
+    parser.add_argument('--codec', choices=('auto',) + BACKENDS, default='auto', help='image decode/encode backend')
+    parser.add_argument('--quality', type=int, default=90, help='JPEG quality of augmented images')
+    parser.add_argument('--progressive', action='store_true', help='write progressive JPEGs')
+    parser.add_argument('--max_size', type=int, default=None,
+                        help='decode with DCT downscaling so the longest side is >= this (e.g. 640 for imgsz=640)')
+    parser.add_argument('--restart', action='store_true', help='discard the progress journal of an interrupted run')
+    args = parser.parse_args()
+
+    try:
+        import cv2
+        import albumentations as A
+    except Exception as e:
+        print('Required packages missing: opencv-python, albumentations')
+        raise
+
+    codec = get_codec(args.codec)
+    print('Image codec:', codec.name)
+    src = Path(args.src)
+    out = Path(args.out)
+    try:
+        pj = ProgressJournal(out/'.progress'/'augment', {k: v for k, v in vars(args).items() if k != 'restart'},
+                             restart=args.restart)
+    except ConfigMismatch as e:
+        print(e)
+        return 1
+    if pj.resumed:
+        print(f'Resuming: {pj.resumed} images already augmented')
+
+    aug = A.Compose(build_transforms(A, cv2),
+                    bbox_params=A.BboxParams(format='pascal_voc', label_fields=['category_ids']))
+
+    img_dir = src/'images'/'train'
+    lab_dir = src/'labels'/'train'
+    out_img_dir = out/'images'/'train'
+    out_lab_dir = out/'labels'/'train'
+
+    img_paths = [p for p in img_dir.iterdir() if p.is_file()]
+    n_aug = {p: args.factor for p in img_paths}
+    names = load_names(classes=args.classes)
+    if args.balanced:
+        M = class_count_matrix(img_paths, lab_dir, len(names) or 16)
+        copies, after = plan_balanced(M, args.budget, args.max_per_image)
+        n_aug = dict(zip(img_paths, copies.tolist()))
+        before = M.sum(0)
+        print(f'Balanced plan: {int(copies.sum())} augmented images for {len(img_paths)} originals '
+              f'(uniform --factor {args.factor} would make {len(img_paths) * args.factor})')
+        for c in range(M.shape[1]):
+            label = names[c] if c < len(names) else str(c)
+            print(f'  {label:16s} {int(before[c]):6d} -> {int(after[c]):6d}')
+    if args.weights:
+        from mine_hard_examples import read_weights
+        weights = read_weights(args.weights)
+        extra = 0
+        for p in img_paths:
+            w = weights.get(p.stem)
+            if w is not None:
+                # hard images get at least one copy even when the plan gave them none
+                n = max(1, int(round(max(n_aug[p], 1) * w)))
+                extra += n - n_aug[p]
+                n_aug[p] = n
+        print(f'Hard-example weights: {sum(p.stem in weights for p in img_paths)} images matched, '
+              f'{extra:+d} augmented copies')
+
+    todo = [p for p in img_paths if n_aug[p]]
+    with pj:
+        # copy originals (non-train as well); unchanged copies from an earlier run are skipped
+        for d in ['images/train','images/val','images/test','labels/train','labels/val','labels/test']:
+            srcd = src/d
+            outd = out/d
+            if srcd.exists() and not pj.stopped:
+                outd.mkdir(parents=True, exist_ok=True)
+                for f in srcd.iterdir():
+                    if pj.stopped:
+                        break
+                    if f.is_file():
+                        copy_if_changed(f, outd/f.name)
+
+        for img_path in todo:
+            if pj.stopped:
+                break
+            if pj.is_done(img_path.name):
+                continue
+            lab_path = lab_dir/(img_path.stem + '.txt')
+            if augment_image(img_path, lab_path, n_aug[img_path], aug, codec, args, out_img_dir, out_lab_dir, pj):
+                pj.mark(img_path.name)
+
+    rc = pj.report(len(todo))
+    if pj.stopped:
+        return rc
+    pj.finish()
 
-    # copy classes.txt
-    if Path('classes.txt').exists():
-        shutil.copy2('classes.txt', out/'classes.txt')
-
-    # write data.yaml
-    names = []
-    if Path('classes.txt').exists():
-        with open('classes.txt','r',encoding='utf-8') as f:
-            names = [l.strip() for l in f if l.strip()]
-    data_yaml = out/'data.yaml'
-    with open(data_yaml,'w',encoding='utf-8') as f:
-        f.write(f"train: {str(Path('images/train').as_posix())}\n")
-        f.write(f"val: {str(Path('images/val').as_posix())}\n")
-        f.write(f"test: {str(Path('images/test').as_posix())}\n\n")
-        f.write(f"nc: {len(names)}\n")
-        f.write('names: ' + str(names) + '\n')
+    # write classes.txt and data.yaml
+    if names:
+        (out/'classes.txt').write_text('\n'.join(names) + '\n', encoding='utf-8')
+    write_data_yaml(out, names, header='Augmented dataset configuration (re-split + data augmentation)')
 
     print('Augmentation complete ->', out)
+    return rc
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
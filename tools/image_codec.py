@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Pluggable JPEG/PNG codec layer for the augmentation and caching stages.
+
+Backends (picked by name; 'auto' is cv2, then the others when cv2 is missing):
+  turbojpeg  PyTurboJPEG (libjpeg-turbo), JPEG only, other formats go through cv2
+  pil        Pillow / Pillow-SIMD (drop-in replacement, same import name)
+  cv2        OpenCV, the default and what Ultralytics decodes with
+
+All backends exchange BGR uint8 arrays, matching cv2 and the albumentations
+pipeline, and apply the EXIF orientation like cv2.imread does, so pixels line
+up with labels made on what Ultralytics loads. Pick another backend only after
+`bench_codecs.py` shows it is faster on your images.
+
+`imread(codec, path, max_size=...)` (or `codec.decode_bytes(data, max_size)`)
+uses DCT-domain downscaling (1/2, 1/4, 1/8) so that the longest side stays
+>= max_size, which skips most of the IDCT work when the target is much
+smaller than the source.
+"""
+import os
+import struct
+
+import telemetry
+
+JPEG_EXTS = ('.jpg', '.jpeg')
+BACKENDS = ('turbojpeg', 'pil', 'cv2')
+AUTO_ORDER = ('cv2', 'turbojpeg', 'pil')
+
+
+def jpeg_size(data):
+    """Return (width, height) from a JPEG SOF header without decoding, or None."""
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        seg_len = struct.unpack('>H', data[i + 2:i + 4])[0]
+        # SOF0..SOF15 except DHT(C4), JPG(C8), DAC(CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            h, w = struct.unpack('>HH', data[i + 5:i + 9])
+            return w, h
+        i += 2 + seg_len
+    return None
+
+
+def jpeg_orientation(data):
+    """EXIF orientation tag (1-8) of a JPEG, 1 when absent or unreadable."""
+    if data[:2] != b'\xff\xd8':
+        return 1
+    i = 2
+    n = len(data)
+    while i + 4 <= n and data[i] == 0xFF:
+        marker = data[i + 1]
+        if marker == 0xDA:  # start of scan: no EXIF after this
+            break
+        seg_len = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker == 0xE1 and data[i + 4:i + 10] == b'Exif\x00\x00':
+            tiff = data[i + 10:i + 2 + seg_len]
+            end = '<' if tiff[:2] == b'II' else '>'
+            try:
+                ifd = struct.unpack(end + 'I', tiff[4:8])[0]
+                for k in range(struct.unpack(end + 'H', tiff[ifd:ifd + 2])[0]):
+                    e = ifd + 2 + 12 * k
+                    if struct.unpack(end + 'H', tiff[e:e + 2])[0] == 0x0112:
+                        o = struct.unpack(end + 'H', tiff[e + 8:e + 10])[0]
+                        return o if 1 <= o <= 8 else 1
+            except struct.error:
+                pass
+            return 1
+        i += 2 + seg_len
+    return 1
+
+
+def apply_orientation(img, orientation):
+    """Turn a decoded HxWxC array upright for an EXIF orientation, as cv2.imread does."""
+    if orientation == 2:
+        return img[:, ::-1]
+    if orientation == 3:
+        return img[::-1, ::-1]
+    if orientation == 4:
+        return img[::-1]
+    if orientation == 5:
+        return img.swapaxes(0, 1)
+    if orientation == 6:
+        return img.swapaxes(0, 1)[:, ::-1]
+    if orientation == 7:
+        return img.swapaxes(0, 1)[::-1, ::-1]
+    if orientation == 8:
+        return img.swapaxes(0, 1)[::-1]
+    return img
+
+
+def reduction_factor(w, h, max_size):
+    # largest power-of-two scale-down that keeps the longest side >= max_size
+    if not max_size:
+        return 1
+    k = 1
+    while k < 8 and max(w, h) // (k * 2) >= max_size:
+        k *= 2
+    return k
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class Cv2Codec:
+    name = 'cv2'
+
+    def __init__(self):
+        import cv2
+        import numpy as np
+        self.cv2 = cv2
+        self.np = np
+
+    def decode_bytes(self, data, max_size=None, is_jpeg=True):
+        cv2 = self.cv2
+        flag = cv2.IMREAD_COLOR
+        size = jpeg_size(data) if is_jpeg and max_size else None
+        if size:
+            flag = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                    4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[reduction_factor(*size, max_size)]
+        return cv2.imdecode(self.np.frombuffer(data, dtype=self.np.uint8), flag)
+
+    def encode_bytes(self, img, ext='.jpg', quality=95, progressive=False):
+        cv2 = self.cv2
+        params = []
+        if ext.lower() in JPEG_EXTS:
+            params = [cv2.IMWRITE_JPEG_QUALITY, int(quality), cv2.IMWRITE_JPEG_PROGRESSIVE, int(progressive)]
+        ok, buf = cv2.imencode(ext, img, params)
+        if not ok:
+            raise ValueError(f'cv2 failed to encode {ext}')
+        return buf.tobytes()
+
+
+class PilCodec:
+    name = 'pil'
+
+    def __init__(self):
+        import numpy as np
+        from PIL import Image, ImageOps
+        self.Image = Image
+        self.ImageOps = ImageOps
+        self.np = np
+
+    def decode_bytes(self, data, max_size=None, is_jpeg=True):
+        import io
+        im = self.Image.open(io.BytesIO(data))
+        if max_size and im.format == 'JPEG':
+            k = reduction_factor(im.width, im.height, max_size)
+            if k > 1:
+                # draft() picks the JPEG DCT scale; size is a lower bound
+                im.draft('RGB', (im.width // k, im.height // k))
+        im = self.ImageOps.exif_transpose(im)
+        arr = self.np.asarray(im.convert('RGB'))
+        return self.np.ascontiguousarray(arr[..., ::-1])
+
+    def encode_bytes(self, img, ext='.jpg', quality=95, progressive=False):
+        import io
+        buf = io.BytesIO()
+        im = self.Image.fromarray(self.np.ascontiguousarray(img[..., ::-1]))
+        if ext.lower() in JPEG_EXTS:
+            im.save(buf, format='JPEG', quality=int(quality), progressive=progressive, optimize=progressive)
+        else:
+            im.save(buf, format=ext.lstrip('.').upper().replace('JPG', 'JPEG'))
+        return buf.getvalue()
+
+
+class TurboJpegCodec:
+    name = 'turbojpeg'
+
+    def __init__(self):
+        import numpy as np
+        from turbojpeg import TurboJPEG, TJFLAG_PROGRESSIVE
+        self.np = np
+        self.tj = TurboJPEG()
+        self.progressive_flag = TJFLAG_PROGRESSIVE
+        # non-JPEG inputs/outputs (png) are delegated
+        self.fallback = Cv2Codec()
+
+    def decode_bytes(self, data, max_size=None, is_jpeg=True):
+        if not is_jpeg or data[:2] != b'\xff\xd8':
+            return self.fallback.decode_bytes(data, max_size, is_jpeg=False)
+        scale = (1, 1)
+        if max_size:
+            w, h, _, _ = self.tj.decode_header(data)
+            scale = (1, reduction_factor(w, h, max_size))
+        img = apply_orientation(self.tj.decode(data, scaling_factor=scale), jpeg_orientation(data))
+        return self.np.ascontiguousarray(img)
+
+    def encode_bytes(self, img, ext='.jpg', quality=95, progressive=False):
+        if ext.lower() not in JPEG_EXTS:
+            return self.fallback.encode_bytes(img, ext, quality, progressive)
+        return self.tj.encode(img, quality=int(quality), flags=self.progressive_flag if progressive else 0)
+
+
+_CLASSES = {'cv2': Cv2Codec, 'pil': PilCodec, 'turbojpeg': TurboJpegCodec}
+
+
+def available_backends():
+    out = []
+    for name in BACKENDS:
+        try:
+            _CLASSES[name]()
+        except Exception:
+            continue
+        out.append(name)
+    return out
+
+
+def get_codec(name='auto'):
+    if name != 'auto':
+        return _CLASSES[name]()
+    for n in AUTO_ORDER:
+        try:
+            return _CLASSES[n]()
+        except Exception:
+            continue
+    raise ImportError('No image codec available: install opencv-python, Pillow or PyTurboJPEG')
+
+
+def imread(codec, path, max_size=None):
+    """Decode an image file to BGR; returns None on unreadable input like cv2.imread."""
+    try:
+        with telemetry.span('decode'):
+            data = _read(path)
+            telemetry.count('bytes_read', len(data))
+            return codec.decode_bytes(data, max_size, is_jpeg=str(path).lower().endswith(JPEG_EXTS))
+    except Exception:
+        telemetry.count('decode_errors')
+        return None
+
+
+def imwrite(codec, path, img, quality=95, progressive=False):
+    with telemetry.span('write'):
+        data = codec.encode_bytes(img, os.path.splitext(str(path))[1] or '.jpg', quality, progressive)
+        with open(path, 'wb') as f:
+            f.write(data)
+    telemetry.count('bytes_written', len(data))
+    return len(data)
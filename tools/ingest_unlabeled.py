@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Active-learning ingestion: rank new unlabeled images by model uncertainty and pre-fill draft labels.
+
+  python tools/ingest_unlabeled.py incoming/ --model runs/detect/resplit_train_gpu_patience3/weights/best.pt
+  python tools/ingest_unlabeled.py incoming/ --scales 0.83,1,1.17 --top 300 --out runs/ingest/2026-10
+
+1. Dedup: every new image gets a 64-bit difference hash (dHash of a 9x8 gray
+   thumbnail, decoded at reduced size). Images within --dup_dist bits of an
+   image of the existing dataset (train/val/test of --data) or of an earlier
+   new image are dropped before inference and listed in duplicates.csv. Dataset
+   hashes are cached in --hash_cache and only recomputed for changed files.
+2. Inference: the remaining images run through the model in batches, once per
+   TTA pass (scales x flip, shared decode as in ensemble.py); the passes are
+   fused with weighted boxes fusion.
+3. Uncertainty per image, each in [0, 1]:
+     margin    1 - smallest gap between the healthy and rotten score of the
+               same fruit over the confident boxes (fresh/rotten ambiguity)
+     entropy   largest normalized entropy of a confident box's class scores
+     disagree  1 - mean F1 of each TTA pass against the fused boxes (same
+               class, IoU >= 0.5); 0 with a single pass
+   and their --mix weighted mean is the ranking score.
+
+Output in --out: queue.csv (ranked, all unique images), labels/ with the fused
+boxes above --draft_conf (or the per-class conf/NMS-IoU of a sweep_thresholds.py
+YAML given with --thresholds) as YOLO txt in the project class order (classes
+mapped by name, see project_config.load_names), and batch/ with the top --top
+images plus their draft labels and classes.txt, ready for LabelImg or an
+import into the labeling tool.
+"""
+import argparse
+import csv
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from box_ops import box_iou, weighted_boxes_fusion
+from distill import split_images
+from ensemble import decode_pass, round32
+from label_io import IMG_EXTS
+from mine_hard_examples import fruit_of
+from project_config import load_names
+from stream_io import bounded_map, scan_files
+from sweep_thresholds import apply_thresholds, load_thresholds
+
+POP16 = np.array([bin(i).count('1') for i in range(1 << 16)], dtype=np.uint8)
+SIGNALS = ('margin', 'entropy', 'disagree')
+
+_codec = None
+
+
+def dhash_file(path):
+    """(path, 64-bit difference hash or None if unreadable); runs in worker processes."""
+    global _codec
+    import cv2
+    from image_codec import get_codec, imread
+    if _codec is None:
+        _codec = get_codec('auto')
+    img = imread(_codec, path, max_size=64)
+    if img is None:
+        return path, None
+    small = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+    return path, int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(hashes, h):
+    """Bit distance of h to every uint64 in `hashes`."""
+    x = hashes ^ np.uint64(h)
+    return POP16[x.view(np.uint16).reshape(-1, 4)].sum(1)
+
+
+def dataset_hashes(paths, cache_path, workers):
+    """uint64 hashes and paths of the dataset images; reuses cached hashes of unchanged files."""
+    cache = {}
+    if cache_path.exists():
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                h, size, mtime, p = line.rstrip('\n').split('\t', 3)
+                cache[p] = (int(size), int(mtime), int(h, 16))
+    out, todo = {}, []
+    for p in paths:
+        st = os.stat(p)
+        c = cache.get(p)
+        if c and c[0] == st.st_size and c[1] == st.st_mtime_ns:
+            out[p] = c
+        else:
+            todo.append(p)
+    if todo:
+        print(f'Hashing {len(todo)} dataset images ({len(out)} cached)')
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for p, h in bounded_map(ex, dhash_file, todo, chunksize=128):
+                if h is not None:
+                    st = os.stat(p)
+                    out[p] = (st.st_size, st.st_mtime_ns, h)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for p, (size, mtime, h) in out.items():
+            f.write(f'{h:016x}\t{size}\t{mtime}\t{p}\n')
+    os.replace(tmp, cache_path)
+    keys = list(out)
+    return np.array([out[p][2] for p in keys], dtype=np.uint64), keys
+
+
+def partner_classes(names):
+    # class index -> index of the same fruit in the other state (Apple_healthy <-> Apple_rotten)
+    by_fruit = {}
+    for i, n in enumerate(names):
+        by_fruit.setdefault(fruit_of(n), []).append(i)
+    return {i: next(j for j in idx if j != i) for idx in by_fruit.values() if len(idx) == 2 for i in idx}
+
+
+def pass_f1(pb, pc, fb, fc, match_iou=0.5):
+    if len(pb) == 0 and len(fb) == 0:
+        return 1.0
+    if len(pb) == 0 or len(fb) == 0:
+        return 0.0
+    iou = box_iou(pb, fb)
+    iou[pc[:, None] != fc[None, :]] = 0.0
+    taken = np.zeros(len(fb), dtype=bool)
+    tp = 0
+    for i in range(len(pb)):
+        cand = np.where(taken, -1.0, iou[i])
+        j = int(cand.argmax())
+        if cand[j] >= match_iou:
+            taken[j] = True
+            tp += 1
+    return 2 * tp / (len(pb) + len(fb))
+
+
+def uncertainty(passes, fused, det_conf, partner):
+    """margin / entropy / disagree in [0, 1] for one image; passes[0] is the unflipped base scale."""
+    b, s, c, p = passes[0]
+    conf = s >= det_conf
+    margin = entropy = 0.0
+    if conf.any():
+        pc, cc = p[conf], c[conf]
+        gaps = [abs(float(row[k] - row[partner[k]])) for row, k in zip(pc, cc) if k in partner]
+        margin = 1.0 - min(gaps) if gaps else 0.0
+        q = pc / np.maximum(pc.sum(1, keepdims=True), 1e-12)
+        h = -(q * np.log(np.maximum(q, 1e-12))).sum(1) / math.log(p.shape[1])
+        entropy = float(h.max())
+    disagree = 0.0
+    if len(passes) > 1:
+        fb, fs, fc = fused
+        fm = fs >= det_conf
+        f1 = [pass_f1(pb[ps >= det_conf], pc_[ps >= det_conf], fb[fm], fc[fm]) for pb, ps, pc_, _ in passes]
+        disagree = 1.0 - float(np.mean(f1))
+    return {'margin': margin, 'entropy': entropy, 'disagree': disagree}
+
+
+def write_draft(path, boxes, classes, to_project):
+    n = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for (x1, y1, x2, y2), c in zip(boxes, classes):
+            k = to_project.get(int(c))
+            if k is None:
+                continue
+            f.write(f'{k} {(x1 + x2) / 2:.6f} {(y1 + y2) / 2:.6f} {x2 - x1:.6f} {y2 - y1:.6f}\n')
+            n += 1
+    return n
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('source', help='folder of new, unlabeled images')
+    p.add_argument('--model', default='runs/detect/resplit_train_gpu_patience3/weights/best.pt')
+    p.add_argument('--data', default='Dataset_resplit_aug/data.yaml', help='existing dataset to dedup against')
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--out', default='runs/ingest')
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--batch', type=int, default=8)
+    p.add_argument('--device', default='cpu')
+    p.add_argument('--scales', default='1', help='comma-separated TTA scales relative to --imgsz')
+    p.add_argument('--no_flip', action='store_true', help='no flipped TTA pass')
+    p.add_argument('--conf', type=float, default=0.05, help='per-pass score threshold')
+    p.add_argument('--det_conf', type=float, default=0.25, help='boxes counted by the uncertainty signals')
+    p.add_argument('--draft_conf', type=float, default=0.25, help='fused boxes written as draft labels')
+    p.add_argument('--thresholds', default=None, help='per-class conf/NMS-IoU YAML (sweep_thresholds.py) '
+                                                       'for the draft labels, instead of --draft_conf')
+    p.add_argument('--mix', default='1,1,1', help='weights of margin,entropy,disagree in the score')
+    p.add_argument('--dup_dist', type=int, default=6, help='max dHash bit distance of a near-duplicate (0-64)')
+    p.add_argument('--hash_cache', default='runs/ingest/dataset_dhash.tsv')
+    p.add_argument('--top', type=int, default=500, help='images copied with drafts into <out>/batch')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = p.parse_args()
+
+    new = sorted(e.path for e in scan_files(args.source, IMG_EXTS))
+    if not new:
+        print('No images in', args.source)
+        return 1
+    out = Path(args.out)
+    (out / 'labels').mkdir(parents=True, exist_ok=True)
+    names = load_names(data_yaml=args.data, classes=args.classes)
+    mix = dict(zip(SIGNALS, (float(x) for x in args.mix.split(','))))
+
+    # 1. dedup against the dataset and within the new batch
+    t0 = time.perf_counter()
+    existing = [q for split in ('train', 'val', 'test') for q in split_images(args.data, split)] \
+        if Path(args.data).exists() else []
+    ref, ref_paths = dataset_hashes(existing, Path(args.hash_cache), args.workers)
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        new_hashes = list(bounded_map(ex, dhash_file, new, chunksize=64))
+    unique, dups = [], []
+    kept = np.zeros(len(new), dtype=np.uint64)  # hashes of unique[:len(unique)]
+    for path, h in new_hashes:
+        if h is None:
+            dups.append((path, 'unreadable', ''))
+            continue
+        d_ref = hamming(ref, h) if len(ref) else np.zeros(0)
+        if len(d_ref) and d_ref.min() <= args.dup_dist:
+            dups.append((path, int(d_ref.min()), ref_paths[int(d_ref.argmin())]))
+            continue
+        d_new = hamming(kept[:len(unique)], h) if unique else np.zeros(0)
+        if len(d_new) and d_new.min() <= args.dup_dist:
+            dups.append((path, int(d_new.min()), unique[int(d_new.argmin())]))
+            continue
+        kept[len(unique)] = np.uint64(h)
+        unique.append(path)
+    print(f'{len(new)} new images: {len(unique)} unique, {len(dups)} near-duplicates/unreadable '
+          f'(checked against {len(ref)} dataset images in {time.perf_counter() - t0:.1f}s)')
+    with open(out / 'duplicates.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['image', 'distance', 'duplicate_of'])
+        w.writerows(dups)
+    if not unique:
+        return 0
+
+    # 2. batched TTA inference + fusion
+    import torch
+    from ultralytics import YOLO
+    from export_int8 import to_input
+    from image_codec import get_codec, imread
+
+    yolo = YOLO(args.model)
+    model_names = yolo.names
+    to_project = {i: names.index(n) for i, n in model_names.items() if n in names}
+    missing = [n for n in model_names.values() if n not in names]
+    if missing:
+        print(f'Warning: model classes not in the project classes, left out of drafts: {", ".join(missing)}')
+    thr = load_thresholds(args.thresholds, names) if args.thresholds else None
+    model_to_project = np.array([to_project.get(i, -1) for i in range(len(model_names))])
+    partner = partner_classes([model_names[i] for i in range(len(model_names))])
+    device = torch.device('cpu' if args.device == 'cpu' or not torch.cuda.is_available()
+                          else f'cuda:{args.device}' if args.device.isdigit() else args.device)
+    model = yolo.model.to(device).float().eval()
+    base_size = round32(args.imgsz)
+    sizes = sorted({round32(args.imgsz * float(s)) for s in args.scales.split(',')} | {base_size},
+                   key=lambda s: s != base_size)
+    variants = [(size, flip) for size in sizes for flip in ((False,) if args.no_flip else (False, True))]
+
+    codec = get_codec('auto')
+    rows = []
+    t0 = time.perf_counter()
+    with torch.inference_mode():
+        for i in range(0, len(unique), args.batch):
+            chunk = [(q, imread(codec, q)) for q in unique[i:i + args.batch]]
+            chunk = [(q, img) for q, img in chunk if img is not None]
+            if not chunk:
+                continue
+            dets = [[] for _ in chunk]
+            for size in sizes:
+                x = torch.from_numpy(np.concatenate([to_input(img, size) for _, img in chunk])).to(device)
+                for vsize, flip in variants:
+                    if vsize != size:
+                        continue
+                    pred = model(x.flip(3) if flip else x)
+                    pred = (pred[0] if isinstance(pred, (list, tuple)) else pred).float().cpu().numpy()
+                    for j, ((_, img), pj) in enumerate(zip(chunk, pred)):
+                        dets[j].append(decode_pass(pj, size, img.shape[:2], flip, args.conf, 0.7, 300, with_probs=True))
+            for (q, _), passes in zip(chunk, dets):
+                b = np.concatenate([d[0] for d in passes])
+                src = np.concatenate([np.full(len(d[0]), k) for k, d in enumerate(passes)])
+                fused = weighted_boxes_fusion(b, np.concatenate([d[1] for d in passes]),
+                                              np.concatenate([d[2] for d in passes]), src,
+                                              [1.0] * len(passes), 0.55, args.conf)
+                u = uncertainty(passes, fused, args.det_conf, partner)
+                fb, fs, fc = fused
+                if thr:
+                    pc = model_to_project[fc]
+                    valid = np.flatnonzero(pc >= 0)
+                    keep = valid[apply_thresholds(fb[valid], fs[valid], pc[valid], *thr)]
+                else:
+                    keep = fs >= args.draft_conf
+                n_draft = write_draft(out / 'labels' / (Path(q).stem + '.txt'), fb[keep], fc[keep], to_project)
+                score = sum(mix[k] * u[k] for k in SIGNALS) / max(sum(mix.values()), 1e-12)
+                rows.append({'image': q, 'score': round(score, 4), **{k: round(v, 4) for k, v in u.items()},
+                             'max_conf': round(float(fs.max()) if len(fs) else 0.0, 4), 'draft_boxes': n_draft})
+            print(f'{min(i + args.batch, len(unique))}/{len(unique)} images')
+    print(f'Scored {len(rows)} images with {len(variants)} passes in {time.perf_counter() - t0:.0f}s')
+
+    if not rows:
+        print(f'None of the {len(unique)} unique images could be decoded; nothing to rank')
+        return 1
+
+    # 3. ranked queue + labeling batch
+    rows.sort(key=lambda r: -r['score'])
+    with open(out / 'queue.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=['rank'] + list(rows[0]))
+        w.writeheader()
+        for rank, r in enumerate(rows, 1):
+            w.writerow({'rank': rank, **r})
+    batch = out / 'batch'
+    for d in ('images', 'labels'):
+        (batch / d).mkdir(parents=True, exist_ok=True)
+    for r in rows[:args.top]:
+        stem = Path(r['image']).stem
+        shutil.copy2(r['image'], batch / 'images' / Path(r['image']).name)
+        shutil.copy2(out / 'labels' / (stem + '.txt'), batch / 'labels' / (stem + '.txt'))
+    (batch / 'labels' / 'classes.txt').write_text('\n'.join(names) + '\n', encoding='utf-8')
+    print(f'\nTop {min(5, len(rows))} of {len(rows)}:')
+    for r in rows[:5]:
+        print(f"  {r['score']:.3f}  margin {r['margin']:.2f} entropy {r['entropy']:.2f} "
+              f"disagree {r['disagree']:.2f}  {Path(r['image']).name}")
+    print(f"Wrote {out / 'queue.csv'}, drafts in {out / 'labels'}, top {min(args.top, len(rows))} in {batch}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""Inspect and diff .pt/.ckpt checkpoints without torch and without unpickling the model.
+
+  python tools/inspect_ckpt.py show runs/detect/resplit_train_gpu_patience3/weights/best.pt
+  python tools/inspect_ckpt.py show best.pt --tensors --filter 'model\\.22\\.'
+  python tools/inspect_ckpt.py diff weights/best.pt weights/last.pt --depth 3
+  python tools/inspect_ckpt.py diff runA/weights/best.pt runB/weights/best.pt --json diff.json
+
+torch.save writes a zip archive: `data.pkl` holds the object tree and every
+tensor storage is a separate uncompressed `data/<key>` entry. data.pkl is read
+with an unpickler that turns every class it references (DetectionModel, Conv2d,
+the optimizer, Path, ...) into an inert stand-in and every tensor into a
+reference (storage key, dtype, offset, shape, stride), so nothing from
+ultralytics or torch is imported or executed. Tensor bytes are then viewed in
+place through mmap, one tensor at a time: checksums and L2 deltas read each
+storage once and memory does not grow with the checkpoint size.
+
+Names follow state_dict naming under the checkpoint key, e.g.
+`model.model.22.cv3.0.2.weight`; Ultralytics keeps the weights under `ema`
+while training and moves them to `model` in the final best.pt/last.pt.
+"""
+import argparse
+import codecs
+import hashlib
+import io
+import json
+import math
+import mmap
+import pickle
+import re
+import struct
+import zipfile
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from stream_io import report_peak
+
+# torch storage class -> numpy dtype (bfloat16 has none: kept as raw uint16 and widened on read)
+STORAGE_DTYPES = {
+    'HalfStorage': 'float16', 'FloatStorage': 'float32', 'DoubleStorage': 'float64',
+    'BFloat16Storage': 'bfloat16', 'LongStorage': 'int64', 'IntStorage': 'int32',
+    'ShortStorage': 'int16', 'CharStorage': 'int8', 'ByteStorage': 'uint8', 'BoolStorage': 'bool',
+}
+TRAIN_ARG_KEYS = ('model', 'data', 'epochs', 'batch', 'imgsz', 'optimizer', 'lr0', 'device', 'name')
+CHUNK = 1 << 20      # elements per step when reducing a tensor
+RELEASE_BYTES = 16 << 20  # drop mapped pages after this many bytes have been read
+
+
+class Stub:
+    """Stand-in for any class referenced by the pickle; keeps constructor args and state."""
+    qualname = '?'
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+
+    def __setstate__(self, state):
+        self.state = state
+
+    def __repr__(self):
+        return f'<{self.qualname}>'
+
+
+class StorageRef:
+    def __init__(self, key, dtype, numel):
+        self.key, self.dtype, self.numel = key, dtype, numel
+
+
+class TensorRef:
+    def __init__(self, storage, offset, shape, stride):
+        self.storage, self.offset, self.shape, self.stride = storage, offset, tuple(shape), tuple(stride)
+
+    @property
+    def dtype(self):
+        return self.storage.dtype
+
+    @property
+    def numel(self):
+        return math.prod(self.shape)
+
+    @property
+    def nbytes(self):
+        return self.numel * (2 if self.dtype == 'bfloat16' else np.dtype(self.dtype).itemsize)
+
+
+def _rebuild_tensor(storage, offset, size, stride, *rest):
+    return TensorRef(storage, offset, size, stride)
+
+
+def _rebuild_parameter(data, *rest):
+    return data
+
+
+class _StorageType(str):
+    pass
+
+
+class LazyUnpickler(pickle.Unpickler):
+    # only tensor rebuilders and plain containers resolve to real objects; everything else is a Stub
+    SAFE = {
+        ('collections', 'OrderedDict'): OrderedDict,
+        ('builtins', 'set'): set, ('builtins', 'frozenset'): frozenset,
+        ('builtins', 'slice'): slice, ('builtins', 'complex'): complex,
+        ('_codecs', 'encode'): codecs.encode,  # bytes under protocol 2 (numpy scalars)
+        ('torch._utils', '_rebuild_tensor_v2'): _rebuild_tensor,
+        ('torch._utils', '_rebuild_tensor'): _rebuild_tensor,
+        ('torch._utils', '_rebuild_parameter'): _rebuild_parameter,
+        ('torch._utils', '_rebuild_parameter_with_state'): _rebuild_parameter,
+        ('torch', 'Size'): tuple,
+    }
+
+    def __init__(self, f):
+        super().__init__(f)
+        self.stubs = {}
+
+    def find_class(self, module, name):
+        if (module, name) in self.SAFE:
+            return self.SAFE[module, name]
+        if module == 'torch' and name in STORAGE_DTYPES:
+            return _StorageType(STORAGE_DTYPES[name])
+        if module in ('numpy', 'numpy.core.multiarray', 'numpy._core.multiarray') and name in ('dtype', 'scalar'):
+            return super().find_class(module, name)
+        key = f'{module}.{name}'
+        if key not in self.stubs:
+            self.stubs[key] = type(name, (Stub,), {'qualname': key})
+        return self.stubs[key]
+
+    def persistent_load(self, pid):
+        # ('storage', storage type, key, location, numel)
+        if not (isinstance(pid, tuple) and pid and pid[0] == 'storage'):
+            raise pickle.UnpicklingError(f'unsupported persistent id {pid!r}')
+        _, stype, key, _, numel = pid
+        return StorageRef(str(key), stype if isinstance(stype, _StorageType) else 'uint8', numel)
+
+
+class Checkpoint:
+    """A torch zip checkpoint opened for lazy reading: `obj` is the stubbed object tree."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if not zipfile.is_zipfile(self.path):
+            raise ValueError(f'{self.path} is not a torch zip archive (legacy pre-1.6 format); '
+                             're-save it with a recent torch first')
+        self._f = open(self.path, 'rb')
+        self.zf = zipfile.ZipFile(self._f)
+        pkl = next((n for n in self.zf.namelist() if n.endswith('data.pkl')), None)
+        if pkl is None:
+            raise ValueError(f'{self.path} has no data.pkl; not a torch.save archive')
+        self.prefix = pkl[:-len('data.pkl')]
+        order = self.prefix + 'byteorder'
+        self.endian = '>' if order in self.zf.namelist() and self.zf.read(order).strip() == b'big' else '<'
+        self.mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.obj = LazyUnpickler(io.BytesIO(self.zf.read(pkl))).load()
+        self._read = 0
+
+    def close(self):
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # a caller still holds a view; the map goes away with it
+        self.zf.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _data_offset(self, key):
+        info = self.zf.getinfo(f'{self.prefix}data/{key}')
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None, info
+        # local file header: 30 fixed bytes, then file name and extra field
+        name_len, extra_len = struct.unpack('<HH', self.mm[info.header_offset + 26:info.header_offset + 30])
+        return info.header_offset + 30 + name_len + extra_len, info
+
+    def array(self, t):
+        """numpy view of a TensorRef (bfloat16 widened to float32); zero-copy for stored entries."""
+        raw = 'uint16' if t.dtype == 'bfloat16' else t.dtype
+        dt = np.dtype(raw).newbyteorder(self.endian)
+        start, info = self._data_offset(t.storage.key)
+        buf = self.mm if start is not None else self.zf.read(info)  # compressed entry: one storage in memory
+        a = np.ndarray(t.shape, dt, buffer=buf, offset=(start or 0) + t.offset * dt.itemsize,
+                       strides=tuple(s * dt.itemsize for s in t.stride))
+        if t.dtype == 'bfloat16':
+            a = (a.astype(np.uint32) << 16).view(np.float32)
+        self._read += t.nbytes
+        return a
+
+    def release(self):
+        # mapped pages count as resident memory once touched; drop them every RELEASE_BYTES
+        if self._read >= RELEASE_BYTES and hasattr(mmap, 'MADV_DONTNEED'):
+            self.mm.madvise(mmap.MADV_DONTNEED)
+            self._read = 0
+
+
+def collect_tensors(obj, prefix='', out=None, seen=None):
+    """OrderedDict name -> TensorRef over dicts, lists and stubbed objects (nn.Module state in state_dict naming)."""
+    out = OrderedDict() if out is None else out
+    seen = set() if seen is None else seen
+    if isinstance(obj, TensorRef):
+        out.setdefault(prefix, obj)
+        return out
+    if id(obj) in seen:
+        return out
+    join = (lambda k: f'{prefix}.{k}') if prefix else str
+    if isinstance(obj, dict):
+        seen.add(id(obj))
+        for k, v in obj.items():
+            collect_tensors(v, join(k), out, seen)
+    elif isinstance(obj, (list, tuple)):
+        seen.add(id(obj))
+        for i, v in enumerate(obj):
+            collect_tensors(v, join(i), out, seen)
+    elif isinstance(obj, Stub):
+        seen.add(id(obj))
+        state = getattr(obj, 'state', None)
+        if isinstance(state, tuple):  # (dict state, slot state)
+            state = state[0]
+        if isinstance(state, dict) and '_modules' in state:
+            for part in ('_parameters', '_buffers', '_modules'):
+                for k, v in (state.get(part) or {}).items():
+                    collect_tensors(v, join(k), out, seen)
+        elif state is not None:
+            collect_tensors(state, prefix, out, seen)
+        elif getattr(obj, 'args', None):
+            collect_tensors(obj.args, prefix, out, seen)
+    return out
+
+
+def plain(v):
+    # printable value for metadata; stubs (Path, enums, ...) show their constructor args
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, Stub):
+        args = getattr(v, 'args', ())
+        return str(args[0]) if len(args) == 1 else repr(v)
+    return v
+
+
+def metadata(obj):
+    """Scalars and small dicts of the top-level checkpoint dict (epoch, best_fitness, train_metrics, ...)."""
+    meta = OrderedDict()
+    if not isinstance(obj, dict):
+        return meta
+    for k, v in obj.items():
+        if isinstance(v, (str, int, float, bool, np.generic)) or v is None:
+            meta[k] = plain(v)
+        elif k == 'train_args' and isinstance(v, dict):
+            meta[k] = {a: plain(v[a]) for a in TRAIN_ARG_KEYS if a in v}
+        elif isinstance(v, dict) and v and all(isinstance(x, (int, float, np.generic)) for x in v.values()):
+            meta[k] = {a: plain(x) for a, x in v.items()}
+    return meta
+
+
+def checksum(a):
+    h = hashlib.blake2b(digest_size=8)
+    flat = a.reshape(-1)  # a copy only for non-contiguous views
+    for i in range(0, flat.size, CHUNK):
+        h.update(np.ascontiguousarray(flat[i:i + CHUNK]).view(np.uint8))
+    return h.hexdigest()
+
+
+def delta(a, b):
+    # (||b - a||, ||a||, max |b - a|) in float64, CHUNK elements at a time
+    fa, fb = a.reshape(-1), b.reshape(-1)
+    d2 = n2 = mx = 0.0
+    for i in range(0, fa.size, CHUNK):
+        x = fa[i:i + CHUNK].astype(np.float64)
+        d = fb[i:i + CHUNK].astype(np.float64) - x
+        d2 += float(d @ d)
+        n2 += float(x @ x)
+        mx = max(mx, float(np.abs(d).max()) if d.size else 0.0)
+    return math.sqrt(d2), math.sqrt(n2), mx
+
+
+def fmt_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+
+
+def select(tensors, pattern):
+    if not pattern:
+        return tensors
+    rx = re.compile(pattern)
+    return OrderedDict((k, t) for k, t in tensors.items() if rx.search(k))
+
+
+def print_meta(meta):
+    for k, v in meta.items():
+        if isinstance(v, dict):
+            print(f'{k}:')
+            for a, x in v.items():
+                print(f'  {a:28s} {x:.5g}' if isinstance(x, float) else f'  {a:28s} {x}')
+        else:
+            print(f'{k:30s} {v}')
+
+
+def cmd_show(args):
+    with Checkpoint(args.ckpt) as ck:
+        tensors = select(collect_tensors(ck.obj), args.filter)
+        print(f'{ck.path}  ({fmt_bytes(ck.path.stat().st_size)}, {len(tensors)} tensors)')
+        print_meta(metadata(ck.obj))
+        groups = defaultdict(lambda: [0, 0, 0, set()])
+        for name, t in tensors.items():
+            g = groups['.'.join(name.split('.')[:args.depth])]
+            g[0] += 1
+            g[1] += t.numel
+            g[2] += t.nbytes
+            g[3].add(t.dtype)
+        print(f"\n{'group':40s} {'tensors':>8s} {'params':>12s} {'size':>10s}  dtypes")
+        for g, (n, numel, nbytes, dtypes) in groups.items():
+            print(f'{g:40s} {n:8d} {numel:12,d} {fmt_bytes(nbytes):>10s}  {",".join(sorted(dtypes))}')
+        if args.tensors:
+            print(f"\n{'tensor':56s} {'dtype':9s} {'shape':20s} {'size':>10s}" + ('  checksum' if args.checksum else ''))
+            for name, t in tensors.items():
+                line = f'{name:56s} {t.dtype:9s} {str(list(t.shape)):20s} {fmt_bytes(t.nbytes):>10s}'
+                if args.checksum:
+                    line += '  ' + checksum(ck.array(t))
+                    ck.release()
+                print(line)
+    report_peak()
+    return 0
+
+
+def diff_tensors(ca, cb, ta, tb):
+    """Per-tensor records in name order; identical checksums skip the delta pass."""
+    for name in list(ta) + [n for n in tb if n not in ta]:  # checkpoint (module) order
+        a, b = ta.get(name), tb.get(name)
+        rec = {'name': name}
+        if a is None or b is None:
+            rec['status'] = 'only_b' if a is None else 'only_a'
+        elif a.shape != b.shape or a.dtype != b.dtype:
+            rec.update(status='shape', a=[a.dtype, list(a.shape)], b=[b.dtype, list(b.shape)])
+        else:
+            xa, xb = ca.array(a), cb.array(b)
+            rec.update(sum_a=checksum(xa), sum_b=checksum(xb), numel=a.numel)
+            if rec['sum_a'] == rec['sum_b']:
+                rec['status'] = 'same'
+            else:
+                d, n, mx = delta(xa, xb)
+                rec.update(status='changed', l2=d, norm_a=n, rel=d / n if n else math.inf, max_abs=mx)
+            del xa, xb
+            ca.release()
+            cb.release()
+        yield rec
+
+
+def cmd_diff(args):
+    with Checkpoint(args.a) as ca, Checkpoint(args.b) as cb:
+        ta = select(collect_tensors(ca.obj), args.filter)
+        tb = select(collect_tensors(cb.obj), args.filter)
+        ma, mb = metadata(ca.obj), metadata(cb.obj)
+        print(f'A: {ca.path}\nB: {cb.path}\n')
+        for k in list(ma) + [k for k in mb if k not in ma]:
+            va, vb = ma.get(k), mb.get(k)
+            if isinstance(va, dict) or isinstance(vb, dict):
+                va, vb = va or {}, vb or {}
+                for a in list(va) + [a for a in vb if a not in va]:
+                    if va.get(a) != vb.get(a):
+                        print(f"{k + '.' + a:40s} {va.get(a)!s:>14s} -> {vb.get(a)!s}")
+            elif va != vb:
+                print(f'{k:40s} {va!s:>14s} -> {vb!s}')
+
+        records = list(diff_tensors(ca, cb, ta, tb))
+    status = defaultdict(int)
+    groups = defaultdict(lambda: [0, 0, 0.0, 0.0])  # changed, total, sum ||d||^2 and ||a||^2 over changed
+    for r in records:
+        status[r['status']] += 1
+        if r['status'] in ('same', 'changed'):
+            g = groups['.'.join(r['name'].split('.')[:args.depth])]
+            g[1] += 1
+            if r['status'] == 'changed':
+                g[0] += 1
+                g[2] += r['l2'] ** 2
+                g[3] += r['norm_a'] ** 2
+    print(f"\n{len(records)} tensors: {status['same']} identical, {status['changed']} changed, "
+          f"{status['shape']} shape/dtype changed, {status['only_a']} only in A, {status['only_b']} only in B")
+    for r in records:
+        if r['status'] in ('shape', 'only_a', 'only_b'):
+            print(f"  {r['status']:7s} {r['name']}" + (f"  {r['a']} -> {r['b']}" if r['status'] == 'shape' else ''))
+
+    if groups:
+        print(f"\n{'group':40s} {'changed':>9s} {'rel L2 of changed':>18s}")
+        for g, (changed, total, d2, n2) in groups.items():
+            rel = math.sqrt(d2 / n2) if n2 else (0.0 if not d2 else math.inf)
+            print(f'{g:40s} {changed:4d}/{total:<4d} {rel:18.3e}')
+    changed = sorted((r for r in records if r['status'] == 'changed'), key=lambda r: -r['rel'])
+    if changed:
+        print(f"\nTop {min(args.top, len(changed))} changed tensors by ||B-A||/||A||:")
+        for r in changed[:args.top]:
+            print(f"  {r['name']:56s} rel {r['rel']:.3e}  l2 {r['l2']:.3e}  max|d| {r['max_abs']:.3e}")
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'a': str(args.a), 'b': str(args.b), 'meta_a': ma, 'meta_b': mb, 'tensors': records},
+                      f, indent=1, default=str)
+        print('Wrote', args.json)
+    report_peak()
+    return 0
+
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest='cmd', required=True)
+    s = sub.add_parser('show', help='metadata and tensor sizes of one checkpoint')
+    s.add_argument('ckpt')
+    s.add_argument('--depth', type=int, default=2, help='name components to group tensors by')
+    s.add_argument('--tensors', action='store_true', help='list every tensor')
+    s.add_argument('--checksum', action='store_true', help='with --tensors: add a blake2b checksum per tensor')
+    s.add_argument('--filter', default=None, help='regex on tensor names')
+    s = sub.add_parser('diff', help='per-tensor checksum and L2 delta between two checkpoints')
+    s.add_argument('a')
+    s.add_argument('b')
+    s.add_argument('--depth', type=int, default=3, help='name components to group deltas by (3 = one model layer)')
+    s.add_argument('--top', type=int, default=20, help='changed tensors to list')
+    s.add_argument('--filter', default=None, help='regex on tensor names, e.g. ^model\\. to skip ema/optimizer')
+    s.add_argument('--json', default=None, help='write per-tensor records here')
+    args = p.parse_args()
+    try:
+        return {'show': cmd_show, 'diff': cmd_diff}[args.cmd](args)
+    except (ValueError, pickle.UnpicklingError) as e:
+        print(e)
+        return 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Shared helpers for reading YOLO label/prediction txt files as numpy arrays.
+
+Label rows are `cls x y w h` (normalized), prediction rows written by
+`yolo predict save_txt=True save_conf=True` are `cls x y w h conf`.
+"""
+from pathlib import Path
+
+import numpy as np
+
+import telemetry
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def read_label_array(path, ncols=5):
+    """Read a YOLO txt file into an (N, ncols) float32 array.
+
+    Class tokens like '0.0' are accepted. Lines with fewer than `ncols`
+    values are dropped; a missing file yields an empty array.
+    """
+    rows = []
+    try:
+        with telemetry.span('parse'), open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                toks = line.split()
+                if len(toks) < ncols:
+                    continue
+                rows.append(toks[:ncols])
+    except FileNotFoundError:
+        return np.zeros((0, ncols), dtype=np.float32)
+    telemetry.count('label_files')
+    if not rows:
+        return np.zeros((0, ncols), dtype=np.float32)
+    return np.asarray(rows, dtype=np.float32)
+
+
+def iter_label_files(lab_dir):
+    lab_dir = Path(lab_dir)
+    if not lab_dir.exists():
+        return
+    for p in lab_dir.iterdir():
+        if p.suffix.lower() == '.txt' and p.is_file():
+            yield p
+
+
+def xywh_to_xyxy(xywh):
+    out = np.empty_like(xywh)
+    half_w = xywh[..., 2] / 2
+    half_h = xywh[..., 3] / 2
+    out[..., 0] = xywh[..., 0] - half_w
+    out[..., 1] = xywh[..., 1] - half_h
+    out[..., 2] = xywh[..., 0] + half_w
+    out[..., 3] = xywh[..., 1] + half_h
+    return out
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""Transactional file edits for the label tools, with a rollback/replay journal.
+
+    with Transaction('fix-labels', journal_dir='runs/txn') as txn:
+        txn.write_text(path, text)     # staged to a temp file next to `path`
+        txn.move(src, dst)
+        txn.remove(path)
+    # leaving the block commits; an exception discards the staged temp files
+
+Commit protocol:
+  1. every op (and a backup location for whatever it replaces) is written to
+     <journal_dir>/<txn_id>/journal.jsonl and the journal is fsynced,
+  2. staged temp files are flushed once (os.sync where available),
+  3. ops are applied with atomic renames; replaced or removed files are kept
+     under <txn_id>/backup (hardlink/rename, no copy on the same filesystem),
+  4. each touched directory is fsynced once, then a `committed` record is appended.
+A crash during 3 leaves a journal without `committed`; `rollback` undoes the
+applied ops from the backups. `replay` re-applies a rolled-back transaction
+(new file contents are kept in the journal); a transaction whose ops are still
+applied must be rolled back first, since its backups hold the only copy of the
+pre-transaction files.
+
+  python tools/label_txn.py list
+  python tools/label_txn.py rollback <txn_id>
+  python tools/label_txn.py replay <txn_id>
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+DEFAULT_JOURNAL = 'runs/txn'
+
+
+def fsync_dir(path):
+    # directories can't be opened for fsync on Windows; rename durability is the FS's job there
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def place(src, dst):
+    """Rename src to dst, falling back to copy+remove across filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.move(src, dst)
+
+
+def keep_backup(path, backup):
+    """Preserve the current content of `path` at `backup` without copying where possible."""
+    try:
+        os.link(path, backup)
+    except OSError:
+        shutil.copy2(path, backup)
+
+
+class Transaction:
+    def __init__(self, tool, journal_dir=DEFAULT_JOURNAL, argv=None):
+        self.tool = tool
+        self.id = time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        self.dir = Path(journal_dir) / self.id
+        self.argv = sys.argv if argv is None else argv
+        self.ops = []
+        self.lock = threading.Lock()
+        self.applied = 0
+
+    # -- staging (thread-safe) -------------------------------------------
+    def write_text(self, path, text, encoding='utf-8'):
+        path = os.path.abspath(path)
+        tmp = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{self.id}.tmp')
+        with open(tmp, 'w', encoding=encoding, newline='') as f:
+            f.write(text)
+        self._add({'op': 'write', 'path': path, 'tmp': tmp, 'existed': os.path.exists(path)})
+
+    def move(self, src, dst):
+        src, dst = os.path.abspath(src), os.path.abspath(dst)
+        self._add({'op': 'move', 'path': src, 'dst': dst, 'existed': os.path.exists(dst)})
+
+    def remove(self, path):
+        path = os.path.abspath(path)
+        if os.path.exists(path):
+            self._add({'op': 'remove', 'path': path, 'existed': True})
+
+    def _add(self, op):
+        with self.lock:
+            op['n'] = len(self.ops)
+            self.ops.append(op)
+
+    def __len__(self):
+        return len(self.ops)
+
+    # -- commit / abort ----------------------------------------------------
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    def abort(self):
+        for op in self.ops:
+            if op['op'] == 'write' and os.path.exists(op['tmp']):
+                os.remove(op['tmp'])
+        self.ops = []
+
+    def commit(self):
+        if not self.ops:
+            return None
+        (self.dir / 'backup').mkdir(parents=True, exist_ok=True)
+        (self.dir / 'new').mkdir(exist_ok=True)
+        for op in self.ops:
+            op['backup'] = str(self.dir / 'backup' / str(op['n']))
+            if op['op'] == 'write':
+                # journal keeps the new content too, so the transaction can be replayed
+                op['new'] = str(self.dir / 'new' / str(op['n']))
+                shutil.copyfile(op['tmp'], op['new'])
+        journal = open(self.dir / 'journal.jsonl', 'w', encoding='utf-8')
+        journal.write(json.dumps({'txn': self.id, 'tool': self.tool, 'argv': self.argv, 'time': time.time(),
+                                  'cwd': os.getcwd()}) + '\n')
+        for op in self.ops:
+            journal.write(json.dumps(op) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+        # one flush for all staged temp files instead of an fsync per file
+        if hasattr(os, 'sync'):
+            os.sync()
+        else:
+            for op in self.ops:
+                if op['op'] == 'write':
+                    with open(op['tmp'], 'rb+') as f:
+                        os.fsync(f.fileno())
+
+        dirs = set()
+        try:
+            for op in self.ops:
+                apply_op(op)
+                self.applied += 1
+                dirs.add(os.path.dirname(op['path']))
+                if 'dst' in op:
+                    dirs.add(os.path.dirname(op['dst']))
+        except BaseException:
+            # an error (not a crash): put back what was applied and leave the journal marked
+            journal.close()
+            for op in reversed(self.ops):
+                undo_op(op)
+            append_state(self.dir, 'rolled_back')
+            raise
+        for d in dirs:
+            fsync_dir(d)
+        journal.write(json.dumps({'state': 'committed', 'time': time.time()}) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+        journal.close()
+        return self.id
+
+
+def apply_op(op):
+    if op['op'] == 'write':
+        if op['existed'] and os.path.exists(op['path']):
+            keep_backup(op['path'], op['backup'])
+        os.replace(op['tmp'], op['path'])
+    elif op['op'] == 'move':
+        if op['existed'] and os.path.exists(op['dst']):
+            keep_backup(op['dst'], op['backup'])
+        os.makedirs(os.path.dirname(op['dst']), exist_ok=True)
+        place(op['path'], op['dst'])
+    elif op['op'] == 'remove':
+        place(op['path'], op['backup'])
+
+
+def undo_op(op):
+    """Reverse one op; safe to call on ops that were never (or only partly) applied."""
+    kind = op['op']
+    if kind == 'write':
+        if os.path.exists(op.get('tmp', '')):
+            os.remove(op['tmp'])           # never applied
+        elif os.path.exists(op['backup']):
+            os.replace(op['backup'], op['path'])
+        elif not op['existed'] and os.path.exists(op['path']):
+            os.remove(op['path'])
+    elif kind == 'move':
+        if os.path.exists(op['dst']) and not os.path.exists(op['path']):
+            place(op['dst'], op['path'])
+            if os.path.exists(op['backup']):
+                os.replace(op['backup'], op['dst'])
+    elif kind == 'remove':
+        if os.path.exists(op['backup']) and not os.path.exists(op['path']):
+            place(op['backup'], op['path'])
+
+
+def read_journal(txn_dir):
+    """(header, ops, state) where state is the last recorded state or 'incomplete'."""
+    lines = (Path(txn_dir) / 'journal.jsonl').read_text(encoding='utf-8').splitlines()
+    recs = [json.loads(line) for line in lines if line.strip()]
+    states = [r['state'] for r in recs[1:] if 'state' in r]
+    return recs[0], [r for r in recs[1:] if 'op' in r], states[-1] if states else 'incomplete'
+
+
+def append_state(txn_dir, state):
+    with open(Path(txn_dir) / 'journal.jsonl', 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'state': state, 'time': time.time()}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def rollback(txn_dir):
+    head, ops, state = read_journal(txn_dir)
+    if state == 'rolled_back':
+        print('Already rolled back:', head['txn'])
+        return 0
+    for op in reversed(ops):
+        undo_op(op)
+    for d in {os.path.dirname(op['path']) for op in ops}:
+        if os.path.isdir(d):
+            fsync_dir(d)
+    append_state(txn_dir, 'rolled_back')
+    print(f"Rolled back {head['txn']} ({head['tool']}, {len(ops)} ops, was {state})")
+    return 0
+
+
+def replay(txn_dir):
+    """Re-apply the ops of a rolled-back transaction; backups are taken again so it can be rolled back."""
+    head, ops, state = read_journal(txn_dir)
+    if state != 'rolled_back':
+        # committed/replayed/incomplete: the backups are the only copy of the original files
+        print(f"Refusing to replay {head['txn']} ({state}): roll it back first")
+        return 1
+    done = skipped = 0
+    for op in ops:
+        if op['op'] != 'write' and not os.path.exists(op['path']):
+            skipped += 1
+            continue
+        op = dict(op)
+        if op['op'] == 'write':
+            op['tmp'] = op['path'] + f'.{head["txn"]}.tmp'
+            shutil.copyfile(op['new'], op['tmp'])
+            op['existed'] = os.path.exists(op['path'])
+        elif op['op'] == 'move':
+            op['existed'] = os.path.exists(op['dst'])
+        if os.path.exists(op['backup']):
+            os.remove(op['backup'])
+        apply_op(op)
+        done += 1
+    append_state(txn_dir, 'replayed')
+    print(f"Replayed {head['txn']}: {done} ops applied, {skipped} skipped (source missing)")
+    return 0
+
+
+def cmd_list(journal_dir):
+    root = Path(journal_dir)
+    if not root.is_dir():
+        print('No transactions in', root)
+        return 0
+    for d in sorted(p for p in root.iterdir() if (p / 'journal.jsonl').exists()):
+        head, ops, state = read_journal(d)
+        kinds = {}
+        for op in ops:
+            kinds[op['op']] = kinds.get(op['op'], 0) + 1
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(head['time']))
+        print(f"{head['txn']}  {when}  {head['tool']:12s} {state.upper() if state == 'incomplete' else state:11s} "
+              + ' '.join(f'{k}={v}' for k, v in sorted(kinds.items())))
+    return 0
+
+
+def incomplete(journal_dir):
+    """Transaction ids that started applying but never committed or rolled back."""
+    root = Path(journal_dir)
+    if not root.is_dir():
+        return []
+    out = []
+    for d in sorted(root.iterdir()):
+        if (d / 'journal.jsonl').exists():
+            if read_journal(d)[2] == 'incomplete':
+                out.append(d.name)
+    return out
+
+
+def warn_incomplete(journal_dir):
+    pending = incomplete(journal_dir)
+    if pending:
+        print(f'WARNING: unfinished transactions in {journal_dir}: {", ".join(pending)} '
+              f'(python tools/label_txn.py --journal {journal_dir} rollback <id>)')
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--journal', default=DEFAULT_JOURNAL, help='journal directory')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    sub.add_parser('list', help='list transactions')
+    s = sub.add_parser('rollback', help='undo a transaction (committed or interrupted)')
+    s.add_argument('txn')
+    s = sub.add_parser('replay', help='re-apply a rolled-back transaction')
+    s.add_argument('txn')
+    args = p.parse_args()
+    if args.cmd == 'list':
+        return cmd_list(args.journal)
+    txn_dir = Path(args.journal) / args.txn
+    if not (txn_dir / 'journal.jsonl').exists():
+        print('Unknown transaction:', args.txn)
+        return 1
+    return rollback(txn_dir) if args.cmd == 'rollback' else replay(txn_dir)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
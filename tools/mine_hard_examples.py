@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Mine hard training images from model predictions and emit a per-image weight list.
+
+  yolo predict model=best.pt source=Dataset_resplit_aug/images/train conf=0.01 save_txt=True save_conf=True
+  python tools/mine_hard_examples.py --labels Dataset_resplit_aug/labels/train --preds runs/detect/predict/labels
+  # or let the tool run the model:
+  python tools/mine_hard_examples.py --model runs/detect/resplit_train_gpu_patience3/weights/best.pt \
+      --images Dataset_resplit_aug/images/train --labels Dataset_resplit_aug/labels/train
+
+Per image, predictions are matched to ground truth class-agnostically (greedy by
+score, IoU >= --match_iou) so that every error gets one of these labels:
+  miss        GT box with no prediction above --conf
+  fp          prediction above --conf that overlaps no GT
+  confusion   matched box with the wrong class (healthy<->rotten of the same
+              fruit is counted separately as fresh_rotten and weighted higher)
+  low_conf    correct match, scored as -log(conf) (a loss proxy for uncertainty)
+The weighted sum is the image's hardness; weights = 1 + gain * hardness /
+mean hardness, capped at --max_weight. Writes hard_examples.json (ranked,
+with reasons and confused class pairs) and weights.txt (`image_path weight`),
+which `generate_augmented.py --weights` and compose recipes (`hard_examples:`)
+use to oversample the hard images. Mine the training pool: listing val/test
+images would leak evaluation data into training.
+"""
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from box_ops import box_iou
+from label_io import IMG_EXTS, iter_label_files, read_label_array, xywh_to_xyxy
+from project_config import load_names, read_classes
+
+DEFAULT_COST = {'miss': 1.0, 'fp': 1.0, 'confusion': 1.5, 'fresh_rotten': 3.0, 'low_conf': 0.5}
+
+
+def fruit_of(name):
+    # 'Apple_rotten' -> 'apple'
+    return name.rsplit('_', 1)[0].lower()
+
+
+def match_image(gt, pr, match_iou, conf):
+    """Greedy class-agnostic matching -> (matches [(pred_i, gt_j)], unmatched preds, unmatched gts)."""
+    pr = pr[pr[:, 5] >= conf]
+    pr = pr[np.argsort(-pr[:, 5], kind='stable')]
+    matches = []
+    taken = np.zeros(len(gt), dtype=bool)
+    if len(gt) and len(pr):
+        iou = box_iou(xywh_to_xyxy(pr[:, 1:5]), xywh_to_xyxy(gt[:, 1:5]))
+        for i in range(len(pr)):
+            cand = np.where(taken, -1.0, iou[i])
+            j = int(cand.argmax())
+            if cand[j] >= match_iou:
+                taken[j] = True
+                matches.append((i, j))
+    matched_p = {i for i, _ in matches}
+    return pr, matches, [i for i in range(len(pr)) if i not in matched_p], np.flatnonzero(~taken)
+
+
+def score_image(gt, pr, names, match_iou, conf, cost):
+    pr, matches, fps, misses = match_image(gt, pr, match_iou, conf)
+    reasons = Counter()
+    pairs = Counter()
+    low_conf = 0.0
+    for i, j in matches:
+        pc, gc = int(pr[i, 0]), int(gt[j, 0])
+        if pc == gc:
+            low_conf += -np.log(max(float(pr[i, 5]), 1e-6))
+            continue
+        pn = names[pc] if pc < len(names) else str(pc)
+        gn = names[gc] if gc < len(names) else str(gc)
+        pairs[(gn, pn)] += 1
+        reasons['fresh_rotten' if fruit_of(pn) == fruit_of(gn) else 'confusion'] += 1
+    reasons['fp'] = len(fps)
+    reasons['miss'] = len(misses)
+    # unconfident FPs cost less than confident ones
+    fp_cost = float(pr[fps, 5].sum()) if fps else 0.0
+    hardness = (cost['miss'] * reasons['miss'] + cost['fp'] * fp_cost + cost['confusion'] * reasons['confusion']
+                + cost['fresh_rotten'] * reasons['fresh_rotten'] + cost['low_conf'] * low_conf)
+    out = {k: v for k, v in reasons.items() if v}
+    if low_conf:
+        out['low_conf'] = round(float(low_conf), 4)
+    return hardness, out, pairs
+
+
+def run_predictions(model, images, conf, imgsz, out, name='predict', device=None, batch=1):
+    """Predict with Ultralytics and return the dir of its txt predictions."""
+    from ultralytics import YOLO
+    save_dir = None
+    for r in YOLO(model).predict(source=images, conf=conf, imgsz=imgsz, save=False, save_txt=True, save_conf=True,
+                                 project=str(out), name=name, exist_ok=True, stream=True, verbose=False,
+                                 device=device, batch=batch):
+        save_dir = r.save_dir
+    return Path(save_dir or Path(out) / name) / 'labels'
+
+
+def find_images(img_dir):
+    if not img_dir or not Path(img_dir).is_dir():
+        return {}
+    return {p.stem: str(p) for p in Path(img_dir).iterdir() if p.suffix.lower() in IMG_EXTS}
+
+
+def read_weights(path):
+    """`image_path weight` lines -> {stem: weight} (as written by this tool)."""
+    out = {}
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        parts = line.rsplit(None, 1)
+        if len(parts) == 2:
+            out[Path(parts[0]).stem] = float(parts[1])
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--labels', default='Dataset_resplit_aug/labels/train', help='ground-truth labels of the pool')
+    p.add_argument('--preds', default=None, help='prediction txt dir (cls x y w h conf)')
+    p.add_argument('--model', default=None, help='run this model to produce --preds')
+    p.add_argument('--images', default=None, help='image dir of the pool (default: labels dir with images/)')
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--conf', type=float, default=0.25, help='confidence at which predictions count as detections')
+    p.add_argument('--match_iou', type=float, default=0.5)
+    p.add_argument('--gain', type=float, default=1.0, help='weight = 1 + gain * hardness / mean hardness')
+    p.add_argument('--max_weight', type=float, default=4.0)
+    p.add_argument('--top', type=int, default=20, help='hardest images to print')
+    p.add_argument('--out', default='runs/mining')
+    args = p.parse_args()
+
+    names = read_classes(args.classes) if args.classes else load_names()
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    lab_dir = Path(args.labels)
+    images = args.images or str(lab_dir.parent.parent / 'images' / lab_dir.name)
+    preds = args.preds
+    if args.model:
+        # predict low so that misses are judged at --conf, not at the predictor's threshold
+        preds = run_predictions(args.model, images, min(0.01, args.conf), args.imgsz, out)
+    if not preds:
+        print('Pass --preds or --model')
+        return 1
+
+    img_paths = find_images(images)
+    stems = sorted({f.stem for f in iter_label_files(args.labels)} | {f.stem for f in iter_label_files(preds)})
+    rows = []
+    all_pairs = Counter()
+    totals = Counter()
+    for stem in stems:
+        gt = read_label_array(Path(args.labels) / (stem + '.txt'), 5)
+        pr = read_label_array(Path(preds) / (stem + '.txt'), 6)
+        hardness, reasons, pairs = score_image(gt, pr, names, args.match_iou, args.conf, DEFAULT_COST)
+        all_pairs.update(pairs)
+        totals.update({k: v for k, v in reasons.items() if k != 'low_conf'})
+        rows.append({'stem': stem, 'image': img_paths.get(stem), 'hardness': round(hardness, 4), 'reasons': reasons})
+
+    h = np.array([r['hardness'] for r in rows]) if rows else np.zeros(0)
+    mean = h[h > 0].mean() if (h > 0).any() else 1.0
+    for r in rows:
+        r['weight'] = round(float(min(args.max_weight, 1.0 + args.gain * r['hardness'] / mean)), 3)
+    rows.sort(key=lambda r: -r['hardness'])
+
+    report = {
+        'labels': args.labels, 'preds': str(preds), 'conf': args.conf, 'match_iou': args.match_iou,
+        'images': len(rows), 'errors': dict(totals),
+        'confused_pairs': [{'gt': g, 'pred': pn, 'count': c} for (g, pn), c in all_pairs.most_common()],
+        'examples': rows,
+    }
+    (out / 'hard_examples.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+    n_up = 0
+    with open(out / 'weights.txt', 'w', encoding='utf-8') as f:
+        for r in rows:
+            if r['weight'] > 1.0 and r['image']:
+                f.write(f"{Path(r['image']).as_posix()} {r['weight']}\n")
+                n_up += 1
+
+    print(f"{len(rows)} images: " + ', '.join(f'{k}={v}' for k, v in sorted(totals.items())))
+    if all_pairs:
+        print('Most confused (gt -> pred):')
+        for (g, pn), c in all_pairs.most_common(8):
+            print(f'  {g:16s} -> {pn:16s} {c}')
+    print(f'Hardest {min(args.top, len(rows))}:')
+    for r in rows[:args.top]:
+        print(f"  {r['stem']:40s} {r['hardness']:7.3f}  w={r['weight']:.2f}  {r['reasons']}")
+    print(f'{n_up} images up-weighted -> {out / "weights.txt"}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
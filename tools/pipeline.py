@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Declarative dataset pipeline runner (a small Makefile for dataset stages).
+
+Stages are declared in a YAML file (see pipeline.yaml at the repo root):
+
+  stages:
+    resplit:
+      cmd: [resplit, --out, Dataset_resplit]   # fruityolo subcommand, or any shell string
+      deps: [Dataset_Original]
+      outs: [Dataset_resplit]
+    augment:
+      cmd: [augment, --src, Dataset_resplit, --out, Dataset_resplit_aug]
+      deps: [Dataset_resplit]
+      outs: [Dataset_resplit_aug]
+
+A stage depends on every *earlier* stage whose outs overlap its deps (plus an
+optional explicit `after:` list), so in-place stages that read and write the
+same tree simply chain in file order. A stage is skipped when its command and
+the content hash of its deps match the last successful run and its outs exist;
+deps are re-hashed once the whole pipeline has succeeded, so in-place stages
+(including a chain of them rewriting the same tree) settle after one run.
+A stage whose command cannot start is recorded as failed; state is saved
+either way, so finished stages keep their hashes.
+File hashes are cached by (size, mtime) so unchanged trees are only stat'ed.
+Independent stages run in parallel (--jobs). Every stage appends wall time,
+file counts and bytes to `<state_dir>/run_log.jsonl`.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def load_pipeline(path):
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        d = yaml.safe_load(f) or {}
+    stages = {}
+    for name, s in (d.get('stages') or {}).items():
+        stages[name] = {
+            'cmd': s['cmd'],
+            'deps': [os.path.normpath(p) for p in s.get('deps', [])],
+            'outs': [os.path.normpath(p) for p in s.get('outs', [])],
+            'after': list(s.get('after', [])),
+        }
+    return stages
+
+
+def overlaps(a, b):
+    a = os.path.abspath(a)
+    b = os.path.abspath(b)
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+def build_graph(stages):
+    """name -> set of upstream stage names (earlier stages whose outs feed our deps)."""
+    names = list(stages)
+    upstream = {}
+    for i, name in enumerate(names):
+        up = set(stages[name]['after'])
+        for prev in names[:i]:
+            if any(overlaps(d, o) for d in stages[name]['deps'] for o in stages[prev]['outs']):
+                up.add(prev)
+        unknown = up - set(names)
+        if unknown:
+            raise ValueError(f'stage {name}: unknown after: {sorted(unknown)}')
+        upstream[name] = up
+    return upstream
+
+
+def iter_files(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for fn in sorted(filenames):
+            yield os.path.join(dirpath, fn)
+
+
+class HashCache:
+    """Content hashes keyed by path, reused while (size, mtime_ns) is unchanged."""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+        self.lock = threading.Lock()
+
+    def file_hash(self, path):
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            e = self.entries.get(key)
+        if e and e[0] == st.st_size and e[1] == st.st_mtime_ns:
+            return e[2], st.st_size
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self.lock:
+            self.entries[key] = (st.st_size, st.st_mtime_ns, digest)
+        return digest, st.st_size
+
+    def tree_hash(self, paths):
+        """(digest, n_files, n_bytes) over all files under `paths`; missing paths hash as absent."""
+        h = hashlib.blake2b(digest_size=16)
+        n_files = n_bytes = 0
+        for p in paths:
+            h.update(p.encode())
+            if not os.path.exists(p):
+                h.update(b'<missing>')
+                continue
+            for f in iter_files(p):
+                digest, size = self.file_hash(f)
+                h.update(os.path.relpath(f, p).encode())
+                h.update(digest.encode())
+                n_files += 1
+                n_bytes += size
+        return h.hexdigest(), n_files, n_bytes
+
+
+def command_argv(cmd):
+    """fruityolo subcommands run through this interpreter; anything else via the shell."""
+    if isinstance(cmd, list):
+        if str(ROOT) not in sys.path:
+            sys.path.insert(0, str(ROOT))
+        from fruityolo.cli import COMMANDS
+        if cmd and cmd[0] in COMMANDS:
+            return [sys.executable, '-m', 'fruityolo'] + [str(c) for c in cmd], False
+        return [str(c) for c in cmd], False
+    return cmd, True
+
+
+def cmd_signature(cmd):
+    return cmd if isinstance(cmd, str) else ' '.join(shlex.quote(str(c)) for c in cmd)
+
+
+def run_stage(name, stage, cache, state, force, dry_run, log_dir):
+    sig = cmd_signature(stage['cmd'])
+    dep_hash, n_dep, dep_bytes = cache.tree_hash(stage['deps'])
+    prev = state.get(name, {})
+    outs_ok = all(os.path.exists(o) for o in stage['outs'])
+    if not force and outs_ok and prev.get('cmd') == sig and prev.get('deps_hash') == dep_hash:
+        return {'stage': name, 'status': 'skipped', 'reason': 'up to date'}
+    reason = ('forced' if force else 'outs missing' if not outs_ok
+              else 'command changed' if prev.get('cmd') != sig else 'deps changed')
+    if dry_run:
+        return {'stage': name, 'status': 'would run', 'reason': reason}
+
+    argv, shell = command_argv(stage['cmd'])
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    log_path = Path(log_dir) / f'{name}.log'
+    t0 = time.perf_counter()
+    try:
+        with open(log_path, 'w', encoding='utf-8') as log:
+            returncode = subprocess.run(argv, shell=shell, stdout=log, stderr=subprocess.STDOUT, env=env).returncode
+    except OSError as e:  # e.g. executable not found
+        returncode = None
+        reason = f'{type(e).__name__}: {e}'
+    wall = time.perf_counter() - t0
+    rec = {'stage': name, 'reason': reason, 'wall_s': round(wall, 3), 'returncode': returncode,
+           'deps_files': n_dep, 'deps_bytes': dep_bytes, 'log': str(log_path)}
+    if returncode != 0:
+        rec['status'] = 'failed'
+        return rec
+    # re-hash deps after the run so stages that rewrite their own inputs settle
+    rec['deps_hash'], _, _ = cache.tree_hash(stage['deps'])
+    out_hash, rec['outs_files'], rec['outs_bytes'] = cache.tree_hash(stage['outs'])
+    rec['status'] = 'ran'
+    state[name] = {'cmd': sig, 'deps_hash': rec['deps_hash'], 'outs_hash': out_hash, 'finished': time.time()}
+    return rec
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('pipeline', nargs='?', default='pipeline.yaml', help='pipeline YAML')
+    p.add_argument('-j', '--jobs', type=int, default=2, help='stages run in parallel')
+    p.add_argument('--force', nargs='*', default=None, help='rerun these stages (no names = all)')
+    p.add_argument('--only', nargs='*', default=None, help='run only these stages (and nothing downstream)')
+    p.add_argument('-n', '--dry-run', action='store_true', help='report what would run')
+    p.add_argument('--state_dir', default='.pipeline', help='hash cache, state and run log')
+    args = p.parse_args()
+
+    stages = load_pipeline(args.pipeline)
+    upstream = build_graph(stages)
+    selected = set(args.only) if args.only else set(stages)
+    forced = set(stages) if args.force == [] else set(args.force or [])
+
+    state_dir = Path(args.state_dir)
+    (state_dir / 'logs').mkdir(parents=True, exist_ok=True)
+    state_file = state_dir / 'state.json'
+    saved = json.loads(state_file.read_text(encoding='utf-8')) if state_file.exists() else {}
+    state = saved.get('stages', {})
+    cache = HashCache({k: tuple(v) for k, v in saved.get('hashes', {}).items()})
+
+    run_id = time.strftime('%Y%m%d-%H%M%S')
+    done, failed, would_run, results = set(), set(), set(), []
+    pending = [n for n in stages if n in selected]
+    t_start = time.perf_counter()
+    complete = False
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    ups = upstream[name] & selected
+                    if ups & failed:
+                        pending.remove(name)
+                        failed.add(name)
+                        results.append({'stage': name, 'status': 'blocked', 'reason': f'upstream failed: {sorted(ups & failed)}'})
+                    elif args.dry_run and ups <= done and ups & would_run:
+                        pending.remove(name)
+                        done.add(name)
+                        would_run.add(name)
+                        results.append({'stage': name, 'status': 'would run', 'reason': 'upstream would run'})
+                        print(f'[would run] {name} (upstream would run)')
+                    elif ups <= done:
+                        pending.remove(name)
+                        # an upstream rerun invalidates us through the deps hash; --force cascades explicitly
+                        running[ex.submit(run_stage, name, stages[name], cache, state, name in forced,
+                                          args.dry_run, state_dir / 'logs')] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    try:
+                        rec = fut.result()
+                    except Exception as e:
+                        rec = {'stage': name, 'status': 'failed', 'reason': f'{type(e).__name__}: {e}'}
+                    rec['run_id'] = run_id
+                    results.append(rec)
+                    (failed if rec['status'] == 'failed' else done).add(name)
+                    if rec['status'] == 'would run':
+                        would_run.add(name)
+                    extra = f" {rec['wall_s']:.1f}s" if 'wall_s' in rec else ''
+                    print(f"[{rec['status']:9s}] {name}{extra} ({rec.get('reason', '')})")
+        complete = True
+    finally:
+        if not args.dry_run:
+            if complete and not failed:
+                # later in-place stages may have rewritten an earlier stage's deps: record the final trees
+                for rec in results:
+                    if rec['status'] in ('ran', 'skipped') and rec['stage'] in state:
+                        state[rec['stage']]['deps_hash'] = cache.tree_hash(stages[rec['stage']]['deps'])[0]
+            state_file.write_text(json.dumps({'stages': state, 'hashes': cache.entries}), encoding='utf-8')
+            with open(state_dir / 'run_log.jsonl', 'a', encoding='utf-8') as f:
+                for rec in results:
+                    f.write(json.dumps(rec) + '\n')
+    ran = sum(r['status'] == 'ran' for r in results)
+    print(f'{ran} ran, {sum(r["status"] == "skipped" for r in results)} skipped, {len(failed)} failed '
+          f'in {time.perf_counter() - t_start:.1f}s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Resumable progress journal for long per-item dataset jobs (augment, resplit).
+
+  pj = ProgressJournal(out / '.progress' / 'augment', config=vars(args))
+  with pj:
+      for item in items:
+          if pj.is_done(key): continue
+          try: ...
+          except Exception as e: pj.fail(key, 'stage', e); continue
+          pj.mark(key)
+          if pj.stopped: break
+
+Keys of finished items are appended to `done.txt` after their outputs are
+written, flushed and fsynced at most every `flush_every` seconds and on exit,
+so a killed run redoes at most the last few seconds of items. `config.json`
+stores the arguments that shape the output; resuming with different ones is
+refused (pass --restart to start over). Per-item failures go to
+`errors.jsonl` instead of being swallowed (`warn` records problems that do
+not stop the item, e.g. malformed label lines in a copied file). While the journal is open, the
+first Ctrl-C sets `stopped` so the loop ends at an item boundary and the
+journal is flushed; a second Ctrl-C interrupts immediately. The journal is
+removed after a run with no failures; otherwise it stays, so a rerun only
+retries the failed and unfinished items. With `indexed=True` keys are item
+numbers (positions in a plan file) and finished items are kept in a bytearray
+rather than a set of names, so the journal stays small on millions of items.
+"""
+import json
+import os
+import shutil
+import signal
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+
+EXIT_INTERRUPTED = 130
+
+
+class ConfigMismatch(Exception):
+    pass
+
+
+class ProgressJournal:
+
+    def __init__(self, path, config, restart=False, flush_every=1.0, indexed=False):
+        self.path = Path(path)
+        self.config = json.loads(json.dumps(config, default=str))
+        self.flush_every = flush_every
+        self.stopped = False
+        self.failures = Counter()
+        self.warnings = Counter()
+        self.n_marked = 0
+        if restart and self.path.exists():
+            shutil.rmtree(self.path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        cfg = self.path / 'config.json'
+        if cfg.exists():
+            old = json.loads(cfg.read_text(encoding='utf-8'))
+            if old != self.config:
+                changed = sorted(k for k in set(old) | set(self.config) if old.get(k) != self.config.get(k))
+                raise ConfigMismatch(f'{self.path} was started with different arguments ({", ".join(changed)}); '
+                                     'rerun with the same arguments to resume or pass --restart')
+        else:
+            cfg.write_text(json.dumps(self.config, indent=2), encoding='utf-8')
+        self.indexed = indexed
+        self.done = bytearray() if indexed else set()
+        self.n_done = 0
+        for key in self._read_done():
+            self._add(key)
+        self.resumed = self.n_done
+        self._done_f = None
+        self._err_f = None
+        self._last_flush = time.monotonic()
+        self._old_handler = None
+
+    def _read_done(self):
+        p = self.path / 'done.txt'
+        if not p.exists():
+            return
+        with open(p, 'r', encoding='utf-8', newline='\n') as f:
+            for line in f:
+                # a run killed mid-write leaves a partial last line; that item is simply redone
+                if line.endswith('\n'):
+                    yield line[:-1]
+
+    def __enter__(self):
+        self._done_f = open(self.path / 'done.txt', 'a', encoding='utf-8')
+        # errors are per attempt: items that failed before are retried, so start a fresh report
+        self._err_f = open(self.path / 'errors.jsonl', 'w', encoding='utf-8')
+        self._old_handler = signal.signal(signal.SIGINT, self._on_sigint)
+        return self
+
+    def _on_sigint(self, signum, frame):
+        if self.stopped:
+            raise KeyboardInterrupt
+        self.stopped = True
+        print('\nInterrupted: finishing the current item and saving progress (Ctrl-C again to abort now)')
+
+    def __exit__(self, exc_type, exc, tb):
+        signal.signal(signal.SIGINT, self._old_handler)
+        self.flush()
+        self._done_f.close()
+        self._err_f.close()
+        if exc_type is KeyboardInterrupt:
+            self.stopped = True
+        return False
+
+    def _add(self, key):
+        if self.indexed:
+            i = int(key)
+            if i >= len(self.done):
+                self.done.extend(bytes(max(i + 1 - len(self.done), len(self.done))))
+            if not self.done[i]:
+                self.done[i] = 1
+                self.n_done += 1
+        elif key not in self.done:
+            self.done.add(key)
+            self.n_done += 1
+
+    def is_done(self, key):
+        if self.indexed:
+            return key < len(self.done) and bool(self.done[key])
+        return key in self.done
+
+    def mark(self, key):
+        self._add(key)
+        self.n_marked += 1
+        self._done_f.write(f'{key}\n')
+        if time.monotonic() - self._last_flush >= self.flush_every:
+            self.flush()
+
+    def fail(self, key, stage, exc=None, detail=None):
+        self.failures[stage] += 1
+        self._record(key, stage, exc, detail)
+
+    def warn(self, key, stage, detail):
+        self.warnings[stage] += 1
+        self._record(key, stage, None, detail, level='warning')
+
+    def _record(self, key, stage, exc, detail, level='error'):
+        rec = {'item': key, 'stage': stage, 'level': level}
+        if exc is not None:
+            rec['error'] = f'{type(exc).__name__}: {exc}'
+            tb = traceback.extract_tb(exc.__traceback__)
+            if tb:
+                rec['where'] = f'{Path(tb[-1].filename).name}:{tb[-1].lineno}'
+        if detail is not None:
+            rec['detail'] = detail
+        self._err_f.write(json.dumps(rec) + '\n')
+
+    def flush(self):
+        for f in (self._done_f, self._err_f):
+            if f and not f.closed:
+                f.flush()
+                os.fsync(f.fileno())
+        self._last_flush = time.monotonic()
+
+    def finish(self):
+        """Drop the journal after a complete run without failures (a warnings-only report is kept)."""
+        if self.stopped or self.failures:
+            return
+        if self.warnings:
+            for f in self.path.iterdir():
+                if f.name != 'errors.jsonl':
+                    f.unlink()
+        else:
+            shutil.rmtree(self.path, ignore_errors=True)
+            try:
+                self.path.parent.rmdir()  # the shared .progress dir, once no journal is left in it
+            except OSError:
+                pass
+
+    def report(self, total):
+        """Print a one-line summary (plus failures) and return the exit code."""
+        print(f'{self.n_done}/{total} items done ({self.resumed} from a previous run, {self.n_marked} now)')
+        for what, counts in (('failures', self.failures), ('warnings', self.warnings)):
+            if counts:
+                print(f'{sum(counts.values())} {what} (' + ', '.join(f'{k}={v}' for k, v in sorted(counts.items())) +
+                      f') -> {self.path / "errors.jsonl"}')
+        if self.stopped:
+            print('Stopped early; rerun with the same arguments to resume')
+            return EXIT_INTERRUPTED
+        return 1 if self.failures else 0
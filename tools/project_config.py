@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Shared project configuration: repo root, class names and data.yaml handling.
+
+Tools used to resolve `classes.txt` / `data.yaml` relative to whatever the
+current directory was; everything now goes through `resolve()` (cwd first,
+then repo root) and `load_names()`. Kept dependency-free apart from a lazy
+yaml import so lightweight commands stay fast to start.
+"""
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def resolve(path):
+    """Return `path` as given if it exists (or is absolute), else relative to the repo root."""
+    p = Path(path)
+    if p.is_absolute() or p.exists():
+        return p
+    return ROOT / p
+
+
+def read_classes(path):
+    path = Path(path)
+    if not path.exists():
+        return []
+    names = [l.strip() for l in path.read_text(encoding='utf-8').splitlines() if l.strip()]
+    # the checked-in classes.txt files list the 16 names twice; keep first occurrence
+    return list(dict.fromkeys(names))
+
+
+def read_data_yaml(path):
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def names_from_data(d):
+    names = d.get('names')
+    if isinstance(names, dict):
+        return [names[k] for k in sorted(names)]
+    return list(names or [])
+
+
+def load_names(data_yaml=None, classes=None):
+    """Target class names in project order.
+
+    Explicit `data_yaml` / `classes` win; otherwise data.yaml then classes.txt
+    are looked up in the cwd and then the repo root.
+    """
+    if classes:
+        return read_classes(resolve(classes))
+    if data_yaml:
+        return names_from_data(read_data_yaml(resolve(data_yaml)))
+    for base in (Path.cwd(), ROOT):
+        p = base / 'data.yaml'
+        if p.exists():
+            names = names_from_data(read_data_yaml(p))
+            if names:
+                return names
+        names = read_classes(base / 'classes.txt')
+        if names:
+            return names
+    return []
+
+
+def write_data_yaml(out_root, names, splits=('train', 'val', 'test'), header=None):
+    """Write `<out_root>/data.yaml` with images/<split> paths, nc and names."""
+    out_root = Path(out_root)
+    with (out_root / 'data.yaml').open('w', encoding='utf-8') as f:
+        if header:
+            f.write(f'# {header}\n')
+        for split in splits:
+            f.write(f"{split}: {Path('images', split).as_posix()}\n")
+        f.write(f"\nnc: {len(names)}\n")
+        f.write('names: ' + str(list(names)) + '\n')
+    return out_root / 'data.yaml'
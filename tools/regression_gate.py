@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Promotion gate: benchmark a candidate checkpoint against production on the test split, on CPU.
+
+  python tools/regression_gate.py runs/detect/new_run/weights/best.pt runs/production/best.pt
+  python tools/regression_gate.py cand.pt prod.pt --class_drop Grape_rotten=0.01 --max_p99_increase 0.1
+
+Both checkpoints run the same fixed image list (--split of --data, in file
+order) at batch 1 on CPU with --threads torch threads, each in a fresh
+process so peak memory is per model. Per image the timed section is
+letterbox + forward + decode/NMS (file decoding excluded); AP uses COCO-style
+score-greedy matching with 101-point interpolation (det_metrics.py), with model
+classes mapped to the project classes by name.
+
+Checks (all thresholds are flags):
+  mAP50-95, mAP50          absolute drop <= --max_map_drop / --max_map50_drop
+  per-class AP50-95        absolute drop <= --max_class_drop (or --class_drop NAME=X);
+                           classes with fewer than --min_class_gt GT boxes are shown, not gated
+  p50 / p99 latency        relative increase <= --max_p50_increase / --max_p99_increase
+  peak memory              relative increase <= --max_mem_increase
+The report is printed as a table and written to --out; exit 1 if any check
+fails, so the gate can run in a script before copying best.pt to production.
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from det_metrics import DetectionStats
+from distill import split_images
+from project_config import load_names
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+def bench(weights, paths, names, imgsz, conf, iou, threads, warmup):
+    """Runs in a fresh process: per-class AP, latency percentiles and own peak RSS of one checkpoint."""
+    import torch
+    from ultralytics import YOLO
+    from ensemble import decode_pass, read_gt, round32
+    from export_int8 import to_input
+    from image_codec import get_codec, imread
+    from stream_io import peak_rss_mb
+
+    if threads:
+        torch.set_num_threads(threads)
+    t0 = time.perf_counter()
+    yolo = YOLO(weights)
+    model = yolo.model.float().eval()
+    load_s = time.perf_counter() - t0
+    to_project = np.array([names.index(n) if n in names else -1 for _, n in sorted(yolo.names.items())])
+    size = round32(imgsz)
+    codec = get_codec('auto')
+    stats = DetectionStats(len(names))
+    lat = []
+    with torch.inference_mode():
+        x = torch.zeros((1, 3, size, size))
+        for _ in range(warmup):
+            model(x)
+        for p in paths:
+            img = imread(codec, p)
+            if img is None:
+                continue
+            t0 = time.perf_counter()
+            pred = model(torch.from_numpy(to_input(img, size)))
+            pred = (pred[0] if isinstance(pred, (list, tuple)) else pred).float().numpy()[0]
+            b, s, c = decode_pass(pred, size, img.shape[:2], False, conf, iou, 300)
+            lat.append((time.perf_counter() - t0) * 1000)
+            c = to_project[c]
+            gb, gc = read_gt(p)
+            stats.add(b[c >= 0], s[c >= 0], c[c >= 0], gb, gc)
+    ap = stats.ap()
+    return {'weights': str(weights), 'images': len(lat), 'load_s': load_s,
+            'map50': stats.map50(ap), 'map50_95': stats.map(ap),
+            'ap50_95': [None if np.isnan(a[0]) else float(a.mean()) for a in ap],
+            'n_gt': stats.n_gt.tolist(),
+            'p50_ms': percentile(lat, 50), 'p90_ms': percentile(lat, 90), 'p99_ms': percentile(lat, 99),
+            'mean_ms': float(np.mean(lat)) if lat else float('nan'), 'peak_mb': peak_rss_mb()[0]}
+
+
+def run_isolated(*args):
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+        return ex.submit(bench, *args).result()
+
+
+def check(rows, name, prod, cand, limit, relative=False, gated=True):
+    # lower is worse for accuracy (limit = max drop), higher is worse for cost (limit = max relative increase)
+    if prod is None or cand is None:
+        rows.append((name, prod, cand, None, limit, 'n/a'))
+        return
+    if relative:
+        delta = cand / prod - 1 if prod else 0.0
+        ok = delta <= limit
+    else:
+        delta = cand - prod
+        ok = -delta <= limit
+    rows.append((name, prod, cand, delta, limit, ('ok' if ok else 'FAIL') if gated else 'info'))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('candidate', help='new checkpoint')
+    p.add_argument('production', help='checkpoint currently in production')
+    p.add_argument('--data', default='Dataset_resplit_aug/data.yaml')
+    p.add_argument('--split', default='test')
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--threads', type=int, default=4, help='torch CPU threads for both models')
+    p.add_argument('--warmup', type=int, default=10)
+    p.add_argument('--conf', type=float, default=0.001)
+    p.add_argument('--iou', type=float, default=0.7)
+    p.add_argument('--max_map_drop', type=float, default=0.005, help='max absolute mAP50-95 drop')
+    p.add_argument('--max_map50_drop', type=float, default=0.005, help='max absolute mAP50 drop')
+    p.add_argument('--max_class_drop', type=float, default=0.02, help='max absolute AP50-95 drop of any class')
+    p.add_argument('--class_drop', action='append', default=[], metavar='NAME=X', help='per-class override')
+    p.add_argument('--min_class_gt', type=int, default=20, help='classes with fewer GT boxes are not gated')
+    p.add_argument('--max_p50_increase', type=float, default=0.10, help='max relative p50 latency increase')
+    p.add_argument('--max_p99_increase', type=float, default=0.25, help='max relative p99 latency increase')
+    p.add_argument('--max_mem_increase', type=float, default=0.10, help='max relative peak memory increase')
+    p.add_argument('--out', default='runs/gate/report.json')
+    args = p.parse_args()
+
+    names = load_names(data_yaml=args.data, classes=args.classes)
+    overrides = {}
+    for spec in args.class_drop:
+        name, _, value = spec.partition('=')
+        if name not in names:
+            print(f'--class_drop: unknown class {name!r}')
+            return 1
+        overrides[name] = float(value)
+    paths = split_images(args.data, args.split)
+    if not paths:
+        print('No images for split', args.split, 'in', args.data)
+        return 1
+    print(f'{len(paths)} {args.split} images, imgsz {args.imgsz}, CPU with {args.threads} threads')
+
+    res = {}
+    for role in ('production', 'candidate'):
+        r = res[role] = run_isolated(getattr(args, role), paths, names, args.imgsz, args.conf, args.iou,
+                                     args.threads, args.warmup)
+        print(f"{role:10s} mAP50-95 {r['map50_95']:.4f}  p50 {r['p50_ms']:.1f} ms  p99 {r['p99_ms']:.1f} ms  "
+              f"peak {r['peak_mb'] or 0:.0f} MB  ({r['weights']})")
+    pr, ca = res['production'], res['candidate']
+
+    rows = []
+    check(rows, 'mAP50-95', pr['map50_95'], ca['map50_95'], args.max_map_drop)
+    check(rows, 'mAP50', pr['map50'], ca['map50'], args.max_map50_drop)
+    for c, name in enumerate(names):
+        if pr['ap50_95'][c] is None and ca['ap50_95'][c] is None:
+            continue
+        check(rows, f'AP50-95 {name}', pr['ap50_95'][c], ca['ap50_95'][c], overrides.get(name, args.max_class_drop),
+              gated=pr['n_gt'][c] >= args.min_class_gt)
+    check(rows, 'p50 latency (ms)', pr['p50_ms'], ca['p50_ms'], args.max_p50_increase, relative=True)
+    check(rows, 'p99 latency (ms)', pr['p99_ms'], ca['p99_ms'], args.max_p99_increase, relative=True)
+    check(rows, 'peak memory (MB)', pr['peak_mb'], ca['peak_mb'], args.max_mem_increase, relative=True)
+
+    print(f"\n{'check':28s} {'production':>11s} {'candidate':>10s} {'delta':>9s} {'limit':>8s}  result")
+    for name, a, b, d, limit, result in rows:
+        rel = name.endswith(')')
+        fa = f'{a:11.1f}' if rel and a is not None else f'{a:11.4f}' if a is not None else f"{'-':>11s}"
+        fb = f'{b:10.1f}' if rel and b is not None else f'{b:10.4f}' if b is not None else f"{'-':>10s}"
+        fd = f"{'-':>9s}" if d is None else f'{d:+9.1%}' if rel else f'{d:+9.4f}'
+        fl = f'+{limit:.0%}' if rel else f'-{limit:.3f}'
+        print(f'{name:28s} {fa} {fb} {fd} {fl:>8s}  {result}')
+    failed = [r[0] for r in rows if r[5] == 'FAIL']
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({'production': pr, 'candidate': ca, 'names': names, 'failed': failed,
+                               'checks': [dict(zip(('check', 'production', 'candidate', 'delta', 'limit', 'result'), r))
+                                          for r in rows]}, indent=2), encoding='utf-8')
+    if failed:
+        print(f'\nREJECTED: {len(failed)} check(s) failed: {", ".join(failed)} (report: {out})')
+        return 1
+    print(f'\nPASSED: candidate may replace production (report: {out})')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
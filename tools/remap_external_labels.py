@@ -1,8 +1,3 @@
-import os
-import shutil
-import argparse
-import json
-
 """
 Remap external dataset labels to this project's class ordering.
 
@@ -11,16 +6,38 @@ python tools/remap_external_labels.py \
   --src external_test \
   --dst_images Dataset_Original/images/test \
   --dst_labels Dataset_Original/labels/test \
-  --src_classes external_test/classes.txt
+  --src_classes external_test/classes.txt \
+  --mapping tools/external_name_to_target.json --workers 8 --link hardlink
 
 If the source has a classes.txt, the script will read it and build a mapping
 by matching class names. If names don't match, provide a JSON mapping file
 with keys being source class names and values being target class names, e.g.
   {"apple_fresh":"Apple_healthy", "apple_rotten":"Apple_rotten", ...}
 
-The script copies images and rewrites YOLO txt labels (class indices) using
-the target ordering from this project's `data.yaml`.
+The mapping is compiled once into an integer lookup array (source index ->
+target index, -1 = drop), so each label file is translated with one array
+lookup on its class column. Files are streamed from os.scandir to a worker
+pool with a bounded number of chunks in flight, so memory does not grow with
+the size of the source, and images can be hardlinked/symlinked instead of copied.
+
+With --fruit_from_filename the fruit is taken from the file name (e.g.
+`rotten_apple_012.jpg` -> Apple) and only the healthy/rotten state comes
+from the source class, which is what fresh-and-rotten-fruits-3 needs.
 """
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from project_config import load_names, names_from_data, read_data_yaml
+from stream_io import bounded_map, report_peak
+
+IMG_EXTS = ('.jpg', '.png', '.jpeg')
+
 
 def read_lines(path):
     with open(path, 'r', encoding='utf-8') as f:
@@ -28,153 +45,221 @@ def read_lines(path):
 
 
 def load_target_names():
-    import yaml
-    root = os.path.dirname(os.path.dirname(__file__))
-    # try repo-root data.yaml
-    p = os.path.join(root, 'data.yaml')
-    if os.path.exists(p):
-        with open(p, 'r', encoding='utf-8') as f:
-            d = yaml.safe_load(f)
-        names = d.get('names')
-        if names:
-            return names
-    # try repo-root classes.txt
-    ct = os.path.join(root, 'classes.txt')
-    if os.path.exists(ct):
-        with open(ct, 'r', encoding='utf-8') as f:
-            return [ln.strip() for ln in f if ln.strip()]
-    # try current working directory as fallback
-    p2 = os.path.join(os.getcwd(), 'data.yaml')
-    if os.path.exists(p2):
-        with open(p2, 'r', encoding='utf-8') as f:
-            d = yaml.safe_load(f)
-        names = d.get('names')
-        if names:
-            return names
-    ct2 = os.path.join(os.getcwd(), 'classes.txt')
-    if os.path.exists(ct2):
-        with open(ct2, 'r', encoding='utf-8') as f:
-            return [ln.strip() for ln in f if ln.strip()]
-    return None
+    return load_names() or None
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--src', required=True, help='Source dataset root (images and labels subfolders)')
-    parser.add_argument('--src_classes', help='Source classes.txt path (optional)')
-    parser.add_argument('--mapping', help='JSON file mapping source class name -> target class name')
-    parser.add_argument('--dst_images', default='Dataset_Original/images/test', help='Destination images folder')
-    parser.add_argument('--dst_labels', default='Dataset_Original/labels/test', help='Destination labels folder')
-    args = parser.parse_args()
+def load_source_names(src, src_classes=None):
+    if src_classes and os.path.exists(src_classes):
+        return read_lines(src_classes)
+    for fname in ['classes.txt', 'names.txt']:
+        p = os.path.join(src, fname)
+        if os.path.exists(p):
+            return read_lines(p)
+    # roboflow exports keep names in data.yaml one level up from the split
+    for p in (os.path.join(src, 'data.yaml'), os.path.join(os.path.dirname(os.path.abspath(src)), 'data.yaml')):
+        if os.path.exists(p):
+            names = names_from_data(read_data_yaml(p))
+            if names:
+                return names
+    return []
 
-    src = args.src
-    if not os.path.exists(src):
-        print('Source path not found:', src)
+
+def build_lookup(src_names, target_names, mapping=None):
+    """Compile source->target class translation into an int array (-1 = drop)."""
+    mapping = mapping or {}
+    t2i = {n: i for i, n in enumerate(target_names)}
+    t2i_lower = {n.lower(): i for i, n in enumerate(target_names)}
+    lut = np.full(len(src_names), -1, dtype=np.int64)
+    for i, sname in enumerate(src_names):
+        tgt_name = mapping.get(sname)
+        if tgt_name:
+            if tgt_name not in t2i:
+                print(f'Warning: mapped target name "{tgt_name}" not found in target names')
+                continue
+            lut[i] = t2i[tgt_name]
+        elif sname.lower() in t2i_lower:
+            lut[i] = t2i_lower[sname.lower()]
+        else:
+            print(f'Warning: source class "{sname}" not mapped to any target; set to -1')
+    return lut
+
+
+def build_fruit_lookups(lut, target_names):
+    """Per-fruit LUTs keeping each source class's healthy/rotten state but forcing the fruit.
+
+    Returns {fruit_keyword: lut}; fruit keywords are the lowercased target
+    prefixes (`Apple_healthy` -> `apple`).
+    """
+    t2i = {n: i for i, n in enumerate(target_names)}
+    fruits = list(dict.fromkeys(n.split('_')[0] for n in target_names))
+    out = {}
+    for fruit in fruits:
+        f_lut = np.full(len(lut), -1, dtype=np.int64)
+        for i, t in enumerate(lut):
+            if t < 0:
+                continue
+            state = target_names[t].split('_', 1)[-1]
+            f_lut[i] = t2i.get(f'{fruit}_{state}', -1)
+        out[fruit.lower()] = f_lut
+    return out
+
+
+# worker state, set once per process by _init_worker
+_W = {}
+
+
+def _init_worker(lut, token_to_src, fruit_luts, link):
+    _W.update(lut=lut, token_to_src=token_to_src, fruit_luts=fruit_luts, link=link)
+
+
+def place_image(src_im, dst_im, link):
+    if os.path.exists(dst_im):
+        os.remove(dst_im)
+    if link == 'hardlink':
+        try:
+            os.link(src_im, dst_im)
+            return
+        except OSError:
+            pass  # cross-device or unsupported fs: fall back to copy
+    elif link == 'symlink':
+        os.symlink(os.path.abspath(src_im), dst_im)
+        return
+    shutil.copy2(src_im, dst_im)
+
+
+def remap_label_text(text, lut, token_to_src):
+    """Translate the class column of one label file; returns (lines, kept, dropped, unknown)."""
+    rows = [ln.split() for ln in text.splitlines()]
+    rows = [r for r in rows if r]
+    if not rows:
+        return [], 0, 0, 0
+    src_idx = np.fromiter((token_to_src.get(r[0], -2) for r in rows), dtype=np.int64, count=len(rows))
+    unknown = src_idx == -2
+    tgt = np.where(src_idx >= 0, lut[np.clip(src_idx, 0, max(len(lut) - 1, 0))], -1)
+    keep = tgt >= 0
+    lines = [' '.join([str(t)] + r[1:]) for t, r, k in zip(tgt.tolist(), rows, keep.tolist()) if k]
+    return lines, int(keep.sum()), int((~keep).sum() - unknown.sum()), int(unknown.sum())
+
+
+def remap_one(task):
+    src_im, src_lbl, dst_im, dst_lbl = task
+    if dst_im is not None:
+        place_image(src_im, dst_im, _W['link'])
+    if not os.path.exists(src_lbl):
+        # create empty label
+        open(dst_lbl, 'w', encoding='utf-8').close()
+        return 0, 0, 0
+    lut = _W['lut']
+    if _W['fruit_luts']:
+        stem = os.path.splitext(os.path.basename(src_lbl))[0].lower()
+        for fruit, f_lut in _W['fruit_luts'].items():
+            if fruit in stem:
+                lut = f_lut
+                break
+    with open(src_lbl, 'r', encoding='utf-8') as f:
+        lines, kept, dropped, unknown = remap_label_text(f.read(), lut, _W['token_to_src'])
+    with open(dst_lbl, 'w', encoding='utf-8') as fw:
+        fw.write('\n'.join(lines))
+    return kept, dropped, unknown
+
+
+def iter_tasks(src_images, src_labels, dst_images, dst_labels, labels_only=False):
+    if labels_only:
+        with os.scandir(src_labels) as it:
+            for e in it:
+                if e.name.lower().endswith('.txt') and e.is_file():
+                    yield None, e.path, None, os.path.join(dst_labels, e.name)
         return
+    with os.scandir(src_images) as it:
+        for e in it:
+            if not e.name.lower().endswith(IMG_EXTS) or not e.is_file():
+                continue
+            base = os.path.splitext(e.name)[0]
+            yield (e.path, os.path.join(src_labels, base + '.txt'),
+                   os.path.join(dst_images, e.name), os.path.join(dst_labels, base + '.txt'))
 
-    src_images = os.path.join(src, 'images') if os.path.isdir(os.path.join(src,'images')) else src
-    src_labels = os.path.join(src, 'labels') if os.path.isdir(os.path.join(src,'labels')) else os.path.join(src, 'labels')
 
-    dst_images = args.dst_images
-    dst_labels = args.dst_labels
-    os.makedirs(dst_images, exist_ok=True)
+def remap(src, dst_images, dst_labels, src_classes=None, mapping_file=None, fruit_from_filename=False,
+          workers=None, link='copy', labels_only=False):
+    if not os.path.exists(src):
+        print('Source path not found:', src)
+        return 1
+
+    src_images = os.path.join(src, 'images') if os.path.isdir(os.path.join(src, 'images')) else src
+    src_labels = os.path.join(src, 'labels')
+    if not labels_only:
+        os.makedirs(dst_images, exist_ok=True)
     os.makedirs(dst_labels, exist_ok=True)
 
     target_names = load_target_names()
     if target_names is None:
         print('Could not load target names from data.yaml')
-        return
-
-    # load source names
-    src_names = []
-    if args.src_classes and os.path.exists(args.src_classes):
-        src_names = read_lines(args.src_classes)
-    else:
-        # try common files
-        for fname in ['classes.txt', 'names.txt']:
-            p = os.path.join(src, fname)
-            if os.path.exists(p):
-                src_names = read_lines(p)
-                break
+        return 1
 
     mapping = {}
-    if args.mapping:
-        with open(args.mapping, 'r', encoding='utf-8') as f:
+    if mapping_file:
+        with open(mapping_file, 'r', encoding='utf-8') as f:
             mapping = json.load(f)
 
-    # build source->target index map
-    src_to_target_idx = {}
-    if src_names:
-        for i, sname in enumerate(src_names):
-            # if mapping provided map by name
-            tgt_name = mapping.get(sname) if mapping else None
-            if not tgt_name:
-                # try exact match ignoring case and non-alnum
-                for tn in target_names:
-                    if tn.lower() == sname.lower():
-                        tgt_name = tn
-                        break
-            if not tgt_name:
-                print(f'Warning: source class "{sname}" not mapped to any target; set to -1')
-                src_to_target_idx[i] = -1
-            else:
-                try:
-                    tidx = target_names.index(tgt_name)
-                    src_to_target_idx[i] = tidx
-                except ValueError:
-                    print(f'Warning: mapped target name "{tgt_name}" not found in target names')
-                    src_to_target_idx[i] = -1
-    elif mapping:
-        # mapping keys are source names
-        # invert target names to idx
-        t2i = {n: i for i,n in enumerate(target_names)}
-        for sname, tgt_name in mapping.items():
-            src_to_target_idx[sname] = t2i.get(tgt_name, -1)
+    src_names = load_source_names(src, src_classes)
+    if not src_names:
+        if not mapping:
+            print('No source class list or mapping provided. Cannot remap automatically.')
+            return 1
+        # label files are expected to carry class names; mapping order defines the indices
+        src_names = list(mapping.keys())
+        print('No source class list found; using mapping keys as source classes')
+
+    lut = build_lookup(src_names, target_names, mapping)
+    # accept '3', '3.0' and literal class names in the class column
+    token_to_src = {}
+    for i, n in enumerate(src_names):
+        token_to_src[str(i)] = i
+        token_to_src[f'{i}.0'] = i
+        token_to_src.setdefault(n, i)
+    fruit_luts = build_fruit_lookups(lut, target_names) if fruit_from_filename else {}
+
+    t0 = time.perf_counter()
+    files = kept = dropped = unknown = 0
+    tasks = iter_tasks(src_images, src_labels, dst_images, dst_labels, labels_only)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(lut, token_to_src, fruit_luts, link)) as ex:
+        for k, d, u in bounded_map(ex, remap_one, tasks, chunksize=64):
+            files += 1
+            kept += k
+            dropped += d
+            unknown += u
+    dt = time.perf_counter() - t0
+
+    print(f'Files: {files}  boxes kept: {kept}  unmapped dropped: {dropped}  unrecognized tokens: {unknown}')
+    print(f'Elapsed: {dt:.2f}s ({files / max(dt, 1e-9):.0f} files/s)')
+    if labels_only:
+        print('Remapping complete. Labels written to', dst_labels)
     else:
-        print('No source class list or mapping provided. Cannot remap automatically.')
-        return
+        print('Remapping complete. Images placed in', dst_images, f'({link}), labels in', dst_labels)
+    report_peak()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', required=True, help='Source dataset root (images and labels subfolders)')
+    parser.add_argument('--src_classes', help='Source classes.txt path (optional)')
+    parser.add_argument('--mapping', help='JSON file mapping source class name -> target class name')
+    parser.add_argument('--dst_images', default='Dataset_Original/images/test', help='Destination images folder')
+    parser.add_argument('--dst_labels', default='Dataset_Original/labels/test', help='Destination labels folder')
+    parser.add_argument('--fruit_from_filename', action='store_true',
+                        help='take the fruit from the file name, keep only healthy/rotten from the source class')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--link', choices=['copy', 'hardlink', 'symlink'], default='copy',
+                        help='how to place images in dst (hardlink falls back to copy across devices)')
+    parser.add_argument('--labels_only', action='store_true', help='rewrite labels only, do not touch images')
+    args = parser.parse_args()
 
-    # copy images and remap labels
-    imgs = [f for f in os.listdir(src_images) if f.lower().endswith(('.jpg','.png','.jpeg'))]
-    print('Found', len(imgs), 'images in', src_images)
-
-    for im in imgs:
-        src_im = os.path.join(src_images, im)
-        dst_im = os.path.join(dst_images, im)
-        shutil.copy2(src_im, dst_im)
-        base = os.path.splitext(im)[0]
-        src_lbl = os.path.join(src_labels, base + '.txt')
-        dst_lbl = os.path.join(dst_labels, base + '.txt')
-        if not os.path.exists(src_lbl):
-            # create empty label
-            open(dst_lbl, 'w', encoding='utf-8').close()
-            continue
-        out_lines = []
-        with open(src_lbl, 'r', encoding='utf-8') as f:
-            for line in f:
-                parts = line.strip().split()
-                if not parts:
-                    continue
-                s_idx = parts[0]
-                try:
-                    s_idx_i = int(s_idx)
-                except Exception:
-                    # maybe label file uses names; try mapping
-                    if s_idx in src_names:
-                        s_idx_i = src_names.index(s_idx)
-                    else:
-                        print('Unrecognized label token:', s_idx, 'in', src_lbl)
-                        continue
-                tgt_idx = src_to_target_idx.get(s_idx_i, -1)
-                if tgt_idx < 0:
-                    # skip or set to 0; here we skip
-                    continue
-                out_lines.append(' '.join([str(tgt_idx)] + parts[1:]))
-        with open(dst_lbl, 'w', encoding='utf-8') as fw:
-            fw.write('\n'.join(out_lines))
-
-    print('Remapping complete. Images copied to', dst_images, 'labels to', dst_labels)
+    return remap(args.src, args.dst_images, args.dst_labels, src_classes=args.src_classes,
+                 mapping_file=args.mapping, fruit_from_filename=args.fruit_from_filename,
+                 workers=args.workers, link=args.link, labels_only=args.labels_only)
 
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
@@ -1,142 +1,271 @@
 #!/usr/bin/env python3
-"""Resplit dataset into stratified train/val/test (per-class) and write YOLO data.yaml for new dataset.
+"""Resplit dataset into train/val/test by a seeded hash of each image (or image group) and write YOLO data.yaml.
 Creates directory `Dataset_resplit/` with images/labels subfolders.
-Default split: 80% train, 10% val, 10% test (per-class stratified).
+Default split: 80% train, 10% val, 10% test.
+
+The split of an image is a pure function of (seed, group key): the key is hashed
+to a number in [0, 1) and cut at train_frac and train_frac + val_frac, so the
+result does not depend on listing order, can be computed in parallel, and adding
+images never moves existing ones. The group key is the file stem, or with
+--group_by the regex match on the stem (first capture group if any), so related
+images share a split, e.g. '^(.+?)(?:_aug\\d+)?$' keeps augmented copies with
+their source. Every class is cut the same way, so per-class fractions hold in
+expectation rather than exactly; the per-class table printed after planning
+shows the actual counts.
+
+Sources are the train/val dirs under --src_images/--src_labels, or a list of
+image paths (--src_manifest, e.g. a compose_dataset.py txt manifest; labels are
+found via the images/ -> labels/ convention). The assignment is written to
+<out>/split_manifest.tsv; rerunning into the same --out with more images only
+copies what is new or changed, and a rerun with another seed, fractions or
+--group_by is refused since it would move images between splits.
+Copy progress is journaled under <out>/.progress/resplit, so an interrupted run
+resumes when rerun with the same arguments; unreadable labels and failed copies
+are listed in errors.jsonl there. Images are streamed from os.scandir and the
+plan lives on disk, so memory stays flat; peak memory is printed at the end.
 """
+import hashlib
 import os
-import shutil
-import random
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 import argparse
 
-def read_label_classes(label_path):
-    # read first token (class) from label file; return set of class ids in file
-    try:
-        with open(label_path, 'r', encoding='utf-8') as f:
-            classes = set()
-            for l in f:
-                toks = l.strip().split()
-                if not toks: continue
+from progress_journal import ConfigMismatch, ProgressJournal
+from project_config import load_names, write_data_yaml
+from stream_io import bounded_map, copy_if_changed, report_peak, scan_files
+import telemetry
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+SPLITS = ('train', 'val', 'test')
+MANIFEST = 'split_manifest.tsv'
+
+def read_label_classes(label_path, bad=None):
+    # read first token (class) from label file; return set of class ids in file.
+    # Lines whose class token is not a number are skipped and appended to `bad` as (line_no, text).
+    with open(label_path, 'r', encoding='utf-8') as f:
+        classes = set()
+        for n, l in enumerate(f, 1):
+            toks = l.strip().split()
+            if not toks: continue
+            try:
                 classes.add(int(float(toks[0])))
-            return classes
-    except Exception:
-        return set()
+            except ValueError:
+                if bad is not None:
+                    bad.append((n, l.strip()))
+        return classes
+
+def label_main_class(lab):
+    # (lowest class id, or -1 for missing/empty/unreadable labels; problem to report or None)
+    if not (lab and os.path.exists(lab)):
+        return -1, None
+    bad = []
+    try:
+        classes = read_label_classes(lab, bad)
+    except (OSError, UnicodeDecodeError) as e:
+        return -1, f'{type(e).__name__}: {e}'
+    problem = {'malformed_lines': len(bad), 'first': bad[:3]} if bad else None
+    return (min(classes) if classes else -1), problem
+
+def group_key(stem, rx):
+    m = rx.search(stem) if rx else None
+    if not m:
+        return stem
+    if rx.groups and m.group(1) is not None:
+        return m.group(1)
+    return m.group(0)
+
+def hash_split(key, seed, train_frac, val_frac):
+    # 64-bit blake2b of "seed:key" -> [0, 1); unlike hash() stable across processes and Python versions
+    h = hashlib.blake2b(f'{seed}:{key}'.encode('utf-8'), digest_size=8).digest()
+    u = int.from_bytes(h, 'big') / 2**64
+    if u < train_frac:
+        return 'train'
+    return 'val' if u < train_frac + val_frac else 'test'
+
+def label_for(img):
+    # same rule as Ultralytics img2label_paths: last /images/ -> /labels/, extension -> .txt
+    sa, sb = f'{os.sep}images{os.sep}', f'{os.sep}labels{os.sep}'
+    return os.path.splitext(sb.join(os.path.normpath(img).rsplit(sa, 1)))[0] + '.txt'
+
+def iter_source(args):
+    # (image, label or None) straight from os.scandir or the manifest, nothing held in memory
+    if args.src_manifest:
+        base = os.path.dirname(os.path.abspath(args.src_manifest))
+        with open(args.src_manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                img = line.strip()
+                if not img or img.startswith('#'):
+                    continue
+                img = os.path.join(base, img)  # no-op for absolute paths
+                lab = label_for(img)
+                yield img, lab if os.path.exists(lab) else None
+        return
+    for split in ['train','val']:
+        lab_dir = os.path.join(args.src_labels, split)
+        for e in scan_files(os.path.join(args.src_images, split), IMG_EXTS):
+            lab = os.path.join(lab_dir, os.path.splitext(e.name)[0] + '.txt')
+            yield e.path, lab if os.path.exists(lab) else None
+
+_RX = {}  # compiled --group_by per worker process
+
+def assign_one(item, seed, train_frac, val_frac, group_by):
+    # worker: (image, label, split, group key, main class, label problem)
+    img, lab = item
+    rx = None
+    if group_by:
+        rx = _RX.get(group_by) or _RX.setdefault(group_by, re.compile(group_by))
+    group = group_key(os.path.splitext(os.path.basename(img))[0], rx)
+    main, problem = label_main_class(lab)
+    return img, lab, hash_split(group, seed, train_frac, val_frac), group, main, problem
+
+def make_plan(args, pj, plan_path):
+    """Write `image<TAB>label<TAB>split<TAB>group` lines to plan_path.
+
+    Labels are read and keys hashed in --workers processes; the plan keeps the
+    listing order. Returns the line count and a Counter of (main class, split).
+    """
+    fn = partial(assign_one, seed=args.seed, train_frac=args.train_frac, val_frac=args.val_frac,
+                 group_by=args.group_by)
+    per_class = Counter()
+    examples = {}
+    n = 0
+    tmp = plan_path.with_suffix('.tmp')
+    ex = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        results = bounded_map(ex, fn, iter_source(args), chunksize=256) if ex else map(fn, iter_source(args))
+        with open(tmp, 'w', encoding='utf-8') as fw:
+            for img, lab, split, group, main, problem in results:
+                if problem:
+                    pj.warn(lab, 'label', problem)
+                per_class[main, split] += 1
+                fw.write(f"{img}\t{lab or ''}\t{split}\t{group}\n")
+                n += 1
+                if args.group_by and len(examples) < 3 and group not in examples:
+                    examples[group] = os.path.basename(img)
+    finally:
+        if ex:
+            ex.shutdown()
+    os.replace(tmp, plan_path)
+    if examples:
+        print('Group keys, e.g. ' + ', '.join(f'{img} -> {g}' for g, img in examples.items()))
+    return n, per_class
+
+def read_plan(plan_path):
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            img, lab, split, group = line.rstrip('\n').split('\t')
+            yield img, lab or None, split, group
+
+def copy_one(task, out):
+    # thread worker: copy one planned image and its label; (plan index, image, OSError or None)
+    i, (img, lab, split, _) = task
+    try:
+        copy_if_changed(img, os.path.join(out, 'images', split, os.path.basename(img)))
+        if lab:
+            copy_if_changed(lab, os.path.join(out, 'labels', split, os.path.basename(lab)))
+    except OSError as e:
+        return i, img, e
+    return i, img, None
+
+def manifest_header(args):
+    return f"# seed={args.seed} train_frac={args.train_frac} val_frac={args.val_frac} group_by={args.group_by or ''}"
+
+def print_class_table(per_class, names):
+    print(f"{'class':16s} {'train':>7s} {'val':>6s} {'test':>6s}   fractions")
+    for c in sorted({c for c, _ in per_class}):
+        n = [per_class[c, s] for s in SPLITS]
+        tot = sum(n)
+        name = names[c] if 0 <= c < len(names) else ('(no label)' if c < 0 else str(c))
+        print(f'{name:16s} {n[0]:7d} {n[1]:6d} {n[2]:6d}   ' + ' / '.join(f'{x / tot:.2f}' for x in n))
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--src_images', default='Dataset_Original/images', help='source images root with train/val subdirs')
     parser.add_argument('--src_labels', default='Dataset_Original/labels', help='source labels root with train/val subdirs')
+    parser.add_argument('--src_manifest', default=None, help='txt list of image paths to split instead of the src dirs')
     parser.add_argument('--out', default='Dataset_resplit', help='output root')
     parser.add_argument('--train_frac', type=float, default=0.8)
     parser.add_argument('--val_frac', type=float, default=0.1)
     parser.add_argument('--test_frac', type=float, default=0.1)
     parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--group_by', '--group-by', default=None,
+                        help='regex on the file stem; images with the same match (group 1 if present) share a split')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes for reading labels, threads for copying')
+    parser.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    parser.add_argument('--restart', action='store_true', help='discard the progress journal of an interrupted run')
     args = parser.parse_args()
 
-    random.seed(args.seed)
+    if abs(args.train_frac + args.val_frac + args.test_frac - 1) > 1e-6:
+        print('train_frac + val_frac + test_frac must sum to 1')
+        return 1
+    if args.group_by:
+        try:
+            re.compile(args.group_by)
+        except re.error as e:
+            print(f'Invalid --group_by regex: {e}')
+            return 1
     out = Path(args.out)
     out.mkdir(parents=True, exist_ok=True)
     for d in ['images/train','images/val','images/test','labels/train','labels/val','labels/test']:
         (out / d).mkdir(parents=True, exist_ok=True)
-
-    # collect all image-label pairs from src train+val
-    src_imgs = []
-    for split in ['train','val']:
-        img_dir = Path(args.src_images) / split
-        lab_dir = Path(args.src_labels) / split
-        if not img_dir.exists():
-            continue
-        for img in img_dir.iterdir():
-            if img.suffix.lower() not in ['.jpg','.jpeg','.png','bmp']:
-                continue
-            lab = lab_dir / (img.stem + '.txt')
-            src_imgs.append((str(img), str(lab) if lab.exists() else None))
-
-    # map class -> list of image entries (use first class in file or multiple entries duplicated)
-    class_to_items = {}
-    for img, lab in src_imgs:
-        if lab and Path(lab).exists():
-            classes = read_label_classes(lab)
-            if not classes:
-                # put into class -1 bucket
-                class_to_items.setdefault(-1, []).append((img, lab))
-            else:
-                for c in classes:
-                    class_to_items.setdefault(c, []).append((img, lab))
-        else:
-            class_to_items.setdefault(-1, []).append((img, lab))
-
-    # For images appearing in multiple class buckets, we risk duplicates; instead create a unique list and choose main class as first token
-    unique_items = {}
-    for img, lab in src_imgs:
-        if img in unique_items:
-            continue
-        if lab and Path(lab).exists():
-            classes = read_label_classes(lab)
-            main = min(classes) if classes else -1
+    manifest = out/MANIFEST
+    if manifest.exists():
+        with open(manifest, 'r', encoding='utf-8') as f:
+            old = f.readline().rstrip('\n')
+        if old != manifest_header(args):
+            print(f'{manifest} was written with other split settings ({old.lstrip("# ")}); '
+                  'rerunning would move images between splits, use a new --out')
+            return 1
+    try:
+        config = {k: v for k, v in vars(args).items() if k not in ('restart', 'workers')}
+        pj = ProgressJournal(out/'.progress'/'resplit', config, restart=args.restart, indexed=True)
+    except ConfigMismatch as e:
+        print(e)
+        return 1
+    names = load_names(classes=args.classes)
+    with pj:
+        plan_path = pj.path/'plan.tsv'
+        if plan_path.exists():
+            # resume the interrupted run's plan rather than re-listing a possibly changed source
+            n_plan = sum(1 for _ in read_plan(plan_path))
+            print(f'Resuming: {pj.resumed}/{n_plan} files already copied')
         else:
-            main = -1
-        unique_items[img] = (img, lab, main)
-
-    # rebuild class mapping
-    class_to_items = {}
-    for img,lab,main in unique_items.values():
-        class_to_items.setdefault(main, []).append((img,lab))
-
-    # split per class
-    train_list=[]
-    val_list=[]
-    test_list=[]
-    for cls, items in class_to_items.items():
-        random.shuffle(items)
-        n = len(items)
-        ntrain = int(n * args.train_frac)
-        nval = int(n * args.val_frac)
-        # ensure at least one in each if possible
-        if n > 0 and ntrain == 0:
-            ntrain = max(1, n-2)
-        if n - ntrain - nval <= 0 and n - ntrain > 0:
-            nval = max(1, n - ntrain - 1)
-        train_items = items[:ntrain]
-        val_items = items[ntrain:ntrain+nval]
-        test_items = items[ntrain+nval:]
-        train_list.extend(train_items)
-        val_list.extend(val_items)
-        test_list.extend(test_items)
-
-    # deduplicate if same image assigned multiple times
-    def copy_list(lst, target_img_dir, target_lab_dir):
-        seen=set()
-        for img, lab in lst:
-            if img in seen: continue
-            seen.add(img)
-            src_img = Path(img)
-            dst_img = Path(args.out)/target_img_dir/src_img.name
-            shutil.copy2(src_img, dst_img)
-            if lab and Path(lab).exists():
-                dst_lab = Path(args.out)/target_lab_dir/(Path(lab).stem + '.txt')
-                shutil.copy2(lab, dst_lab)
-
-    copy_list(train_list, 'images/train', 'labels/train')
-    copy_list(val_list, 'images/val', 'labels/val')
-    copy_list(test_list, 'images/test', 'labels/test')
+            with telemetry.span('plan'):
+                n_plan, per_class = make_plan(args, pj, plan_path)
+            print_class_table(per_class, names)
+
+        # copies run in threads; marks stay in this thread, so the journal sees them in plan order
+        todo = ((i, item) for i, item in enumerate(read_plan(plan_path)) if not pj.is_done(i))
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+            for i, img, err in bounded_map(ex, partial(copy_one, out=str(out)), todo, chunksize=4):
+                if err is not None:
+                    pj.fail(img, 'copy', err)
+                else:
+                    pj.mark(i)
+                if pj.stopped:
+                    break
+
+    rc = pj.report(n_plan)
+    if pj.stopped:
+        return rc
+    tmp = manifest.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as fw:
+        fw.write(manifest_header(args) + '\n')
+        for img, _, split, group in read_plan(plan_path):
+            fw.write(f'{split}\t{group}\t{img}\n')
+    os.replace(tmp, manifest)
+    pj.finish()
 
     # write data.yaml
-    classes_file = Path('classes.txt')
-    names = []
-    if classes_file.exists():
-        with classes_file.open('r', encoding='utf-8') as f:
-            names = [l.strip() for l in f.readlines() if l.strip()]
-
-    data_yaml = Path(args.out)/'data.yaml'
-    with data_yaml.open('w', encoding='utf-8') as f:
-        f.write(f"train: {str(Path('images/train').as_posix())}\n")
-        f.write(f"val: {str(Path('images/val').as_posix())}\n")
-        f.write(f"test: {str(Path('images/test').as_posix())}\n\n")
-        f.write(f"nc: {len(names)}\n")
-        f.write('names: ' + str(names) + '\n')
+    write_data_yaml(args.out, names)
 
     print('Wrote resplit dataset to', args.out)
+    report_peak()
+    return rc
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
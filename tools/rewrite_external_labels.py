@@ -1,60 +1,29 @@
-import os
-from pathlib import Path
-
-root = Path('fresh-and-rotten-fruits-3') / 'test'
-images_dir = root / 'images'
-labels_dir = root / 'labels'
-out_dir = root / 'labels_rewritten'
-out_dir.mkdir(parents=True, exist_ok=True)
+"""Rewrite fresh-and-rotten-fruits-3 labels into this project's class ordering.
 
-mapping = {
-    'apple': {'healthy': 0, 'rotten': 5},
-    'banana': {'healthy': 1, 'rotten': 3},
-    'orange': {'healthy': 2, 'rotten': 4},
-}
+The external set only distinguishes healthy/rotten per source class reliably;
+the fruit is taken from the file name (apple/banana/orange). This is a thin
+preset over remap_external_labels.py: labels only, written to labels_rewritten.
+"""
+import argparse
+from pathlib import Path
 
-for lbl_path in labels_dir.glob('*.txt'):
-    name = lbl_path.stem
-    name_lower = name.lower()
-    # determine fruit from filename
-    if 'apple' in name_lower:
-        fruit = 'apple'
-    elif 'banana' in name_lower:
-        fruit = 'banana'
-    elif 'orange' in name_lower:
-        fruit = 'orange'
-    else:
-        fruit = None
+from remap_external_labels import remap
 
-    out_lines = []
-    with lbl_path.open('r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split()
-            try:
-                orig_c = int(float(parts[0]))
-            except:
-                orig_c = None
-            coords = parts[1:]
 
-            # determine rotten/healthy from original class
-            if orig_c is None:
-                target_c = parts[0]
-            else:
-                is_rotten = orig_c >= 3
-                if fruit is None:
-                    # unknown fruit: keep original mapping
-                    target_c = orig_c
-                else:
-                    kind = 'rotten' if is_rotten else 'healthy'
-                    target_c = mapping[fruit][kind]
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--src', default=str(Path('fresh-and-rotten-fruits-3') / 'test'), help='external split root')
+    p.add_argument('--mapping', default=str(Path(__file__).with_name('external_to_target_mapping.json')),
+                   help='JSON mapping source class name -> target class name')
+    p.add_argument('--src_classes', help='source classes.txt (default: looked up next to the split)')
+    p.add_argument('--out', default=None, help='output labels dir (default: <src>/labels_rewritten)')
+    p.add_argument('--workers', type=int, default=None)
+    args = p.parse_args()
 
-            out_lines.append(' '.join([str(target_c)] + coords))
+    out = args.out or str(Path(args.src) / 'labels_rewritten')
+    return remap(args.src, None, out, src_classes=args.src_classes, mapping_file=args.mapping,
+                 fruit_from_filename=True, workers=args.workers, labels_only=True)
 
-    out_file = out_dir / lbl_path.name
-    with out_file.open('w', encoding='utf-8') as f:
-        f.write('\n'.join(out_lines))
 
-print('Rewritten labels saved to', str(out_dir))
+if __name__ == '__main__':
+    raise SystemExit(main())
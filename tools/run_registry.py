@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Index training runs (args.yaml + results.csv) into SQLite and query across them.
+
+  python tools/run_registry.py index                      # scan runs/detect/*, incremental
+  python tools/run_registry.py runs                       # one line per run
+  python tools/run_registry.py best --by model,data       # best mAP50-95 per group
+  python tools/run_registry.py trend resplit_train_gpu_patience3
+  python tools/run_registry.py sql "select name, max(map50) from epochs join runs using(run_id) group by name"
+
+Indexing only reads the bytes appended to each results.csv since the last
+index (stored offset), so re-indexing hundreds of runs costs a stat per run.
+`CsvTail` is the same incremental reader for live runs (the plateau controller).
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_DB = 'runs/registry.sqlite'
+
+# results.csv column -> epochs table column
+METRIC_COLUMNS = {
+    'time': 'time',
+    'train/box_loss': 'train_box_loss',
+    'train/cls_loss': 'train_cls_loss',
+    'train/dfl_loss': 'train_dfl_loss',
+    'metrics/precision(B)': 'precision',
+    'metrics/recall(B)': 'recall',
+    'metrics/mAP50(B)': 'map50',
+    'metrics/mAP50-95(B)': 'map50_95',
+    'val/box_loss': 'val_box_loss',
+    'val/cls_loss': 'val_cls_loss',
+    'val/dfl_loss': 'val_dfl_loss',
+    'lr/pg0': 'lr0',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT, path TEXT UNIQUE, model TEXT, data TEXT,
+    epochs INTEGER, imgsz INTEGER, batch INTEGER, device TEXT, optimizer TEXT,
+    args_json TEXT, args_mtime INTEGER,
+    csv_offset INTEGER DEFAULT 0, csv_header TEXT, indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS epochs (
+    run_id INTEGER, epoch INTEGER,
+    time REAL, epoch_time REAL,
+    train_box_loss REAL, train_cls_loss REAL, train_dfl_loss REAL,
+    precision REAL, recall REAL, map50 REAL, map50_95 REAL, fitness REAL,
+    val_box_loss REAL, val_cls_loss REAL, val_dfl_loss REAL, lr0 REAL,
+    extra_json TEXT,
+    PRIMARY KEY (run_id, epoch)
+);
+CREATE INDEX IF NOT EXISTS epochs_map ON epochs (map50_95);
+"""
+
+
+def fitness(map50, map50_95):
+    # Ultralytics default fitness weights: 0.1 * mAP50 + 0.9 * mAP50-95
+    if map50 is None or map50_95 is None:
+        return None
+    return 0.1 * map50 + 0.9 * map50_95
+
+
+def to_float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class CsvTail:
+    """Read a growing CSV incrementally: each `read_new()` returns only rows appended since the last call."""
+
+    def __init__(self, path, offset=0, header=None):
+        self.path = path
+        self.offset = offset
+        self.header = header
+        self.rows = []
+
+    def read_new(self):
+        if not os.path.exists(self.path):
+            return []
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            # file was rewritten (resume from scratch); start over
+            self.offset, self.header, self.rows = 0, None, []
+        if size == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        # only consume complete lines; a partially flushed row is read next time
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return []
+        self.offset += end
+        lines = chunk[:end].decode('utf-8').splitlines()
+        if self.header is None and lines:
+            self.header = [h.strip() for h in next(csv.reader([lines[0]]))]
+            lines = lines[1:]
+        new = []
+        for rec in csv.reader(io.StringIO('\n'.join(lines))):
+            if rec:
+                new.append({k: v.strip() for k, v in zip(self.header, rec)})
+        self.rows.extend(new)
+        return new
+
+
+def connect(db_path):
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path)
+    con.executescript(SCHEMA)
+    return con
+
+
+def index_run(con, run_dir):
+    import yaml
+    run_dir = Path(run_dir)
+    path = str(run_dir.resolve())
+    row = con.execute('SELECT run_id, args_mtime, csv_offset, csv_header FROM runs WHERE path = ?', (path,)).fetchone()
+    if row is None:
+        con.execute('INSERT INTO runs (name, path) VALUES (?, ?)', (run_dir.name, path))
+        row = con.execute('SELECT run_id, args_mtime, csv_offset, csv_header FROM runs WHERE path = ?', (path,)).fetchone()
+    run_id, args_mtime, offset, header = row
+
+    args_file = run_dir / 'args.yaml'
+    if args_file.exists() and args_file.stat().st_mtime_ns != args_mtime:
+        with args_file.open('r', encoding='utf-8') as f:
+            a = yaml.safe_load(f) or {}
+        con.execute('UPDATE runs SET model=?, data=?, epochs=?, imgsz=?, batch=?, device=?, optimizer=?, '
+                    'args_json=?, args_mtime=? WHERE run_id=?',
+                    (a.get('model'), a.get('data'), a.get('epochs'), a.get('imgsz'), a.get('batch'),
+                     str(a.get('device')), a.get('optimizer'), json.dumps(a, default=str),
+                     args_file.stat().st_mtime_ns, run_id))
+
+    csv_path = str(run_dir / 'results.csv')
+    if not offset or (os.path.exists(csv_path) and os.path.getsize(csv_path) < offset):
+        # first index, or the CSV was rewritten: rebuild this run's epochs
+        con.execute('DELETE FROM epochs WHERE run_id = ?', (run_id,))
+        tail = CsvTail(csv_path)
+    else:
+        tail = CsvTail(csv_path, offset, json.loads(header) if header else None)
+    new_rows = tail.read_new()
+    prev = con.execute('SELECT time FROM epochs WHERE run_id = ? ORDER BY epoch DESC LIMIT 1', (run_id,)).fetchone()
+    prev_time = prev[0] if prev else 0.0
+    records = []
+    for r in new_rows:
+        vals = {col: to_float(r.get(src)) for src, col in METRIC_COLUMNS.items()}
+        t = vals['time']
+        # results.csv stores cumulative seconds; keep the per-epoch delta too
+        epoch_time = t - prev_time if t is not None and prev_time is not None else None
+        prev_time = t
+        extra = {k: v for k, v in r.items() if k not in METRIC_COLUMNS and k != 'epoch'}
+        records.append((run_id, int(float(r['epoch'])), vals['time'], epoch_time,
+                        vals['train_box_loss'], vals['train_cls_loss'], vals['train_dfl_loss'],
+                        vals['precision'], vals['recall'], vals['map50'], vals['map50_95'],
+                        fitness(vals['map50'], vals['map50_95']),
+                        vals['val_box_loss'], vals['val_cls_loss'], vals['val_dfl_loss'], vals['lr0'],
+                        json.dumps(extra) if extra else None))
+    con.executemany('INSERT OR REPLACE INTO epochs VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', records)
+    con.execute('UPDATE runs SET csv_offset=?, csv_header=?, indexed_at=? WHERE run_id=?',
+                (tail.offset, json.dumps(tail.header) if tail.header else None, time.time(), run_id))
+    return len(records)
+
+
+def cmd_index(con, args):
+    t0 = time.perf_counter()
+    n_runs = n_rows = 0
+    for project in args.projects:
+        if not os.path.isdir(project):
+            continue
+        for d in sorted(Path(project).iterdir()):
+            if d.is_dir() and ((d / 'results.csv').exists() or (d / 'args.yaml').exists()):
+                n_rows += index_run(con, d)
+                n_runs += 1
+    con.commit()
+    print(f'Indexed {n_runs} runs, {n_rows} new epoch rows in {(time.perf_counter() - t0) * 1000:.1f} ms')
+
+
+def print_rows(cur):
+    cols = [c[0] for c in cur.description]
+    rows = cur.fetchall()
+    widths = [max(len(c), *(len(fmt(r[i])) for r in rows)) if rows else len(c) for i, c in enumerate(cols)]
+    print('  '.join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print('  '.join(fmt(v).ljust(w) for v, w in zip(r, widths)))
+
+
+def fmt(v):
+    if isinstance(v, float):
+        return f'{v:.4f}'
+    return '' if v is None else str(v)
+
+
+def cmd_runs(con, args):
+    print_rows(con.execute(
+        'SELECT r.name, r.model, r.data, COUNT(e.epoch) AS epochs, MAX(e.map50) AS best_map50, '
+        'MAX(e.map50_95) AS best_map50_95, AVG(e.epoch_time) AS mean_epoch_s '
+        'FROM runs r LEFT JOIN epochs e USING (run_id) GROUP BY r.run_id ORDER BY best_map50_95 DESC'))
+
+
+def cmd_best(con, args):
+    allowed = {'model', 'data', 'imgsz', 'batch', 'optimizer', 'name'}
+    keys = [k for k in args.by.split(',') if k]
+    bad = set(keys) - allowed
+    if bad:
+        print('Unsupported --by keys:', ', '.join(sorted(bad)))
+        return 1
+    metric = {'map50': 'map50', 'map50-95': 'map50_95', 'fitness': 'fitness'}[args.metric]
+    group = ', '.join(f'r.{k}' for k in keys)
+    # SQLite returns the bare columns from the row holding MAX()
+    print_rows(con.execute(
+        f'SELECT {group}, MAX(e.{metric}) AS best_{metric}, r.name AS run, e.epoch '
+        f'FROM epochs e JOIN runs r USING (run_id) GROUP BY {group} ORDER BY best_{metric} DESC'))
+
+
+def cmd_trend(con, args):
+    print_rows(con.execute(
+        'SELECT e.epoch, e.epoch_time, e.map50, e.map50_95, e.fitness, e.train_box_loss, e.val_box_loss '
+        'FROM epochs e JOIN runs r USING (run_id) WHERE r.name = ? ORDER BY e.epoch', (args.run,)))
+
+
+def cmd_sql(con, args):
+    print_rows(con.execute(args.query))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--db', default=DEFAULT_DB, help='SQLite registry path')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    s = sub.add_parser('index', help='ingest/refresh runs incrementally')
+    s.add_argument('projects', nargs='*', default=['runs/detect'], help='run parent dirs')
+    sub.add_parser('runs', help='list runs')
+    s = sub.add_parser('best', help='best metric per group')
+    s.add_argument('--by', default='model,data', help='comma list of run fields')
+    s.add_argument('--metric', choices=['map50', 'map50-95', 'fitness'], default='map50-95')
+    s = sub.add_parser('trend', help='per-epoch time and metrics of one run')
+    s.add_argument('run', help='run name')
+    s = sub.add_parser('sql', help='raw SQL against runs/epochs')
+    s.add_argument('query')
+    args = p.parse_args()
+
+    con = connect(args.db)
+    t0 = time.perf_counter()
+    rc = {'index': cmd_index, 'runs': cmd_runs, 'best': cmd_best, 'trend': cmd_trend, 'sql': cmd_sql}[args.cmd](con, args)
+    if args.cmd != 'index':
+        print(f'({(time.perf_counter() - t0) * 1000:.1f} ms)')
+    con.close()
+    return rc or 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Memory-bounded building blocks for dataset tools on huge directories.
+
+  scan_files()     os.scandir generator; no directory listing is held in memory
+  external_sort()  sorted, de-duplicated stream of keys, spilling sorted runs to disk
+  merge_join()     walk two sorted key streams together (replaces set differences)
+  bounded_map()    Executor.map that keeps only a window of chunks in flight
+  peak_rss_mb()    peak resident memory of this process and of its largest child
+  copy_if_changed()  copy2 unless a copy with the same size and mtime is already there
+
+With these, a tool's memory depends on the sort buffer and the worker window,
+not on the number of files in a split.
+"""
+import heapq
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+from collections import deque
+
+import telemetry
+
+SORT_BUFFER = 200_000  # keys held in memory per sorted run
+MAXRSS_PER_MB = 1e6 if sys.platform == 'darwin' else 1e3  # ru_maxrss: bytes on macOS, KB on Linux
+
+
+def scan_files(path, exts=None):
+    """Yield os.DirEntry of the regular files in `path` (optionally filtered by lower-case extension)."""
+    if not os.path.isdir(path):
+        return
+    with os.scandir(path) as it:
+        for e in it:
+            if exts and not e.name.lower().endswith(exts):
+                continue
+            if e.is_file():
+                yield e
+
+
+def scan_stems(path, exts):
+    for e in scan_files(path, exts):
+        yield os.path.splitext(e.name)[0]
+
+
+def _write_run(keys, tmp_dir):
+    fd, path = tempfile.mkstemp(prefix='run_', suffix='.txt', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+        for k in sorted(keys):
+            f.write(k + '\n')
+    return path
+
+
+def _read_run(path):
+    with open(path, 'r', encoding='utf-8', newline='\n') as f:
+        for line in f:
+            yield line[:-1]
+
+
+def external_sort(keys, buffer=SORT_BUFFER, tmp_dir=None):
+    """Sorted unique keys (str without newlines). In memory while they fit in `buffer`, else merged from disk runs."""
+    buf = set()
+    runs = []
+    try:
+        for k in keys:
+            buf.add(k)
+            if len(buf) >= buffer:
+                runs.append(_write_run(buf, tmp_dir))
+                buf = set()
+        if not runs:
+            yield from sorted(buf)
+            return
+        if buf:
+            runs.append(_write_run(buf, tmp_dir))
+            buf = set()
+        last = None
+        for k in heapq.merge(*(_read_run(p) for p in runs)):
+            if k != last:
+                yield k
+                last = k
+    finally:
+        for p in runs:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+def merge_join(a, b):
+    """Yield (key, in_a, in_b) over two sorted unique key streams."""
+    sentinel = object()
+    a, b = iter(a), iter(b)
+    x, y = next(a, sentinel), next(b, sentinel)
+    while x is not sentinel or y is not sentinel:
+        if y is sentinel or (x is not sentinel and x < y):
+            yield x, True, False
+            x = next(a, sentinel)
+        elif x is sentinel or y < x:
+            yield y, False, True
+            y = next(b, sentinel)
+        else:
+            yield x, True, True
+            x, y = next(a, sentinel), next(b, sentinel)
+
+
+def copy_if_changed(src, dst):
+    # copy2 keeps mtime, so copies left by an earlier (possibly interrupted) run are skipped
+    st = os.stat(src)
+    try:
+        dt = os.stat(dst)
+        if dt.st_size == st.st_size and dt.st_mtime_ns == st.st_mtime_ns:
+            telemetry.count('files_unchanged')
+            return False
+    except FileNotFoundError:
+        pass
+    with telemetry.span('copy'):
+        shutil.copy2(src, dst)
+    telemetry.count('files_copied')
+    telemetry.count('bytes_copied', st.st_size)
+    return True
+
+
+def _run_chunk(fn, chunk):
+    return [fn(x) for x in chunk]
+
+
+def bounded_map(ex, fn, iterable, chunksize=64, window=None):
+    """Ordered results of fn over iterable, like ex.map, but reading the input lazily.
+
+    Executor.map submits the whole input up front, which for a generator over
+    millions of files builds millions of futures; here at most `window` chunks
+    (default 4 per worker) are pending at any time.
+    """
+    window = window or 4 * (getattr(ex, '_max_workers', None) or os.cpu_count() or 1)
+    it = iter(iterable)
+    pending = deque()
+
+    def submit():
+        chunk = list(itertools.islice(it, chunksize))
+        if chunk:
+            pending.append(ex.submit(_run_chunk, fn, chunk))
+        return bool(chunk)
+
+    for _ in range(window):
+        if not submit():
+            break
+    while pending:
+        results = pending.popleft().result()
+        submit()
+        yield from results
+
+
+def peak_rss_mb():
+    """(self, largest child) peak RSS in MB; None where the platform cannot tell."""
+    try:
+        import resource
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / MAXRSS_PER_MB
+        child = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / MAXRSS_PER_MB
+        return own, child or None
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1e6, None  # Windows
+    except (ImportError, AttributeError):
+        return None, None
+
+
+def report_peak():
+    own, child = peak_rss_mb()
+    if own is None:
+        return
+    print(f'Peak memory: {own:.0f} MB' + (f' (largest worker {child:.0f} MB)' if child else ''))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Sweep per-class confidence and NMS-IoU thresholds over one set of raw predictions.
+
+Predictions are the txt files written by a single low-threshold run, e.g.
+  yolo predict model=best.pt source=Dataset_resplit_aug/images/val conf=0.001 iou=0.9 save_txt=True save_conf=True
+(rows: `cls x y w h conf`). Ground truth comes from the matching labels dir.
+
+Greedy NMS and greedy score-ordered matching both commute with a confidence
+cut, so for every (class, nms_iou) a single NMS + matching pass gives the
+TP/FP curve for the whole confidence grid through one cumulative sum.
+The Pareto-optimal (precision, recall) settings per class and one recommended
+setting (max F-beta; rotten classes weight recall by --rotten_beta) are
+written to a YAML that inference tools load with `load_thresholds()`
+(`ensemble.py --thresholds` for saved predictions, `ingest_unlabeled.py
+--thresholds` for draft labels).
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from box_ops import box_iou, nms
+from label_io import read_label_array, iter_label_files, xywh_to_xyxy
+from project_config import load_names
+
+
+def parse_grid(spec):
+    # 'start:stop:step' (inclusive stop) or comma separated values
+    if ':' in spec:
+        start, stop, step = (float(x) for x in spec.split(':'))
+        n = int(round((stop - start) / step)) + 1
+        return np.round(start + step * np.arange(n), 6)
+    return np.asarray([float(x) for x in spec.split(',')])
+
+
+def load_split(lab_dir, pred_dir):
+    """Return list of (gt[N,5], pred[M,6]) per image, xyxy-normalized boxes."""
+    stems = {p.stem for p in iter_label_files(lab_dir)}
+    stems |= {p.stem for p in iter_label_files(pred_dir)}
+    items = []
+    for stem in sorted(stems):
+        gt = read_label_array(Path(lab_dir) / (stem + '.txt'), 5)
+        pr = read_label_array(Path(pred_dir) / (stem + '.txt'), 6)
+        gt[:, 1:5] = xywh_to_xyxy(gt[:, 1:5])
+        pr[:, 1:5] = xywh_to_xyxy(pr[:, 1:5])
+        items.append((gt, pr))
+    return items
+
+
+def match_tp(pboxes, gboxes, match_iou):
+    # pboxes sorted by descending score; each GT can be claimed once
+    tp = np.zeros(len(pboxes), dtype=bool)
+    if len(gboxes) == 0 or len(pboxes) == 0:
+        return tp
+    iou = box_iou(pboxes, gboxes)
+    taken = np.zeros(len(gboxes), dtype=bool)
+    for i in range(len(pboxes)):
+        cand = np.where(taken, -1.0, iou[i])
+        j = int(cand.argmax())
+        if cand[j] >= match_iou:
+            taken[j] = True
+            tp[i] = True
+    return tp
+
+
+def sweep_class(items, cls, conf_grid, iou_grid, match_iou):
+    """Precision/recall arrays of shape (len(iou_grid), len(conf_grid)) for one class."""
+    per_image = []
+    n_gt = 0
+    min_conf = conf_grid.min()
+    for gt, pr in items:
+        g = gt[gt[:, 0] == cls, 1:5]
+        p = pr[(pr[:, 0] == cls) & (pr[:, 5] >= min_conf)]
+        n_gt += len(g)
+        if len(p):
+            per_image.append((g, p[:, 1:5], p[:, 5]))
+
+    prec = np.zeros((len(iou_grid), len(conf_grid)))
+    rec = np.zeros_like(prec)
+    for k, iou_thr in enumerate(iou_grid):
+        scores, tps = [], []
+        for g, boxes, conf in per_image:
+            keep = nms(boxes, conf, iou_thr)
+            scores.append(conf[keep])
+            tps.append(match_tp(boxes[keep], g, match_iou))
+        if not scores:
+            continue
+        scores = np.concatenate(scores)
+        tps = np.concatenate(tps)
+        order = np.argsort(-scores, kind='stable')
+        scores, tps = scores[order], tps[order]
+        cum_tp = np.cumsum(tps)
+        # number of detections with conf >= t for every t at once
+        n_det = len(scores) - np.searchsorted(scores[::-1], conf_grid, side='left')
+        tp_at = np.where(n_det > 0, cum_tp[np.maximum(n_det - 1, 0)], 0)
+        prec[k] = np.where(n_det > 0, tp_at / np.maximum(n_det, 1), 1.0)
+        rec[k] = tp_at / n_gt if n_gt else 0.0
+    return prec, rec, n_gt
+
+
+def pareto_mask(prec, rec):
+    p = prec.ravel()
+    r = rec.ravel()
+    ge = (p[None, :] >= p[:, None]) & (r[None, :] >= r[:, None])
+    gt = (p[None, :] > p[:, None]) | (r[None, :] > r[:, None])
+    dominated = (ge & gt).any(axis=1)
+    return ~dominated.reshape(prec.shape)
+
+
+def f_beta(prec, rec, beta):
+    b2 = beta * beta
+    return (1 + b2) * prec * rec / np.maximum(b2 * prec + rec, 1e-12)
+
+
+def load_thresholds(path, names):
+    """Load a sweep YAML into per-class (conf[nc], iou[nc]) arrays in `names` order."""
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        d = yaml.safe_load(f)
+    default_conf = float(d.get('predict_conf', 0.25))
+    default_iou = float(d.get('predict_iou', 0.7))
+    conf = np.full(len(names), default_conf, dtype=np.float32)
+    iou = np.full(len(names), default_iou, dtype=np.float32)
+    for i, n in enumerate(names):
+        c = d.get('classes', {}).get(n)
+        if c:
+            conf[i] = c['conf']
+            iou[i] = c['iou']
+    return conf, iou
+
+
+def apply_thresholds(boxes, scores, classes, conf, iou):
+    """Per-class conf cut + per-class NMS; returns kept indices into the inputs."""
+    classes = classes.astype(np.int64)
+    keep = []
+    for c in np.unique(classes):
+        idx = np.where((classes == c) & (scores >= conf[c]))[0]
+        if len(idx):
+            keep.append(idx[nms(boxes[idx], scores[idx], iou[c])])
+    if not keep:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(keep)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--labels', default='Dataset_resplit_aug/labels/val', help='ground-truth labels dir')
+    p.add_argument('--preds', required=True, help='prediction txt dir (cls x y w h conf)')
+    p.add_argument('--classes', default=None, help='classes file (default: project data.yaml/classes.txt)')
+    p.add_argument('--conf_grid', default='0.05:0.95:0.01', help='start:stop:step or comma list')
+    p.add_argument('--iou_grid', default='0.3:0.8:0.05', help='start:stop:step or comma list')
+    p.add_argument('--match_iou', type=float, default=0.5, help='IoU for a prediction to count as TP')
+    p.add_argument('--beta', type=float, default=1.0, help='F-beta used to pick healthy-class settings')
+    p.add_argument('--rotten_beta', type=float, default=2.0, help='F-beta used to pick *_rotten settings')
+    p.add_argument('--out', default='runs/detect/thresholds.yaml', help='output YAML')
+    args = p.parse_args()
+
+    import yaml
+
+    names = load_names(classes=args.classes)
+    if not names:
+        print('Could not resolve class names')
+        return 1
+    conf_grid = parse_grid(args.conf_grid)
+    iou_grid = parse_grid(args.iou_grid)
+
+    t0 = time.perf_counter()
+    items = load_split(args.labels, args.preds)
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    result = {'classes': {}}
+    for cls, name in enumerate(names):
+        prec, rec, n_gt = sweep_class(items, cls, conf_grid, iou_grid, args.match_iou)
+        if n_gt == 0:
+            print(f'{name}: no ground truth boxes, skipped')
+            continue
+        beta = args.rotten_beta if 'rotten' in name.lower() else args.beta
+        score = f_beta(prec, rec, beta)
+        k, j = np.unravel_index(int(score.argmax()), score.shape)
+        front = np.argwhere(pareto_mask(prec, rec))
+        pareto = sorted(
+            ([float(conf_grid[b]), float(iou_grid[a]), round(float(prec[a, b]), 4), round(float(rec[a, b]), 4)]
+             for a, b in front),
+            key=lambda x: (-x[3], -x[2]))
+        result['classes'][name] = {
+            'conf': float(conf_grid[j]),
+            'iou': float(iou_grid[k]),
+            'precision': round(float(prec[k, j]), 4),
+            'recall': round(float(rec[k, j]), 4),
+            'beta': beta,
+            'gt_boxes': int(n_gt),
+            'pareto': pareto,
+        }
+    t_sweep = time.perf_counter() - t0
+
+    chosen = result['classes'].values()
+    result = {
+        'match_iou': args.match_iou,
+        # run the detector at least this loose, then apply_thresholds() per class
+        'predict_conf': min((c['conf'] for c in chosen), default=0.25),
+        'predict_iou': max((c['iou'] for c in chosen), default=0.7),
+        'labels': str(args.labels),
+        'preds': str(args.preds),
+        **result,
+    }
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open('w', encoding='utf-8') as f:
+        yaml.safe_dump(result, f, sort_keys=False, default_flow_style=None)
+
+    n_configs = len(names) * len(conf_grid) * len(iou_grid)
+    print(f'images: {len(items)}  configs: {n_configs}  load: {t_load:.2f}s  sweep: {t_sweep:.2f}s')
+    for name, c in result['classes'].items():
+        print(f"{name:16s} conf={c['conf']:.2f} iou={c['iou']:.2f} P={c['precision']:.3f} R={c['recall']:.3f} "
+              f"pareto={len(c['pareto'])}")
+    print('Wrote thresholds to', out)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
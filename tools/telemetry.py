@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Structured telemetry for the tools: JSON-lines events, span timers and counters.
+
+  fruityolo --telemetry runs/telemetry.jsonl augment --src Dataset_resplit ...
+  fruityolo --profile cprofile resplit ...              # or pyinstrument
+  FRUITYOLO_TELEMETRY=runs/telemetry.jsonl python tools/resplit_dataset.py ...
+
+  with telemetry.span('decode'):        # timed section, aggregated per name
+      img = ...
+  telemetry.count('bytes_written', n)   # counters
+  telemetry.event('plateau', epoch=41)  # one JSON line
+
+Off unless --telemetry / FRUITYOLO_TELEMETRY is set; then span() hands out a
+shared no-op context and costs one call. When on, every line of the file is
+one event `{"ts", "run", "tool", "pid", "event", ...}`: `run_start`, custom
+events, and `run_end` with the exit code, wall time, peak memory, counters and
+per-span totals (n, total_s, mean_ms, max_ms). FRUITYOLO_TELEMETRY_SPANS=1
+also writes one `span` event per timed section (large on big datasets).
+The shared helpers are instrumented (image_codec decode/write, label_io parse,
+stream_io copy), so every tool reports those without changes of its own.
+Spans and counters are per process: work done inside pool workers is not
+included in the parent's totals (their per-span events, if enabled, carry
+the parent's run id). Tools started as subprocesses (pipeline stages, bench
+suite runs) record their own run, with `parent_run` in run_start.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+ENV_PATH = 'FRUITYOLO_TELEMETRY'
+ENV_SPANS = 'FRUITYOLO_TELEMETRY_SPANS'
+ENV_RUN = 'FRUITYOLO_TELEMETRY_RUN'  # set by the recording process; its multiprocessing workers join that run
+
+_state = None  # None: not configured yet, False: disabled, else _Recorder
+_lock = threading.Lock()
+
+
+class _Null:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _Null()
+
+
+class _Recorder:
+
+    def __init__(self, path, tool, per_span):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.f = open(self.path, 'a', encoding='utf-8', buffering=1)
+        self.tool = tool
+        self.per_span = per_span
+        self.t0 = time.perf_counter()
+        self.run = f'{tool}-{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}'
+        self.spans = {}     # name -> [n, total_s, max_s]
+        self.counters = {}
+        self.finished = False
+        self.owner = os.getpid()
+
+    def write(self, event, fields):
+        rec = {'ts': round(time.time(), 3), 'run': self.run, 'tool': self.tool, 'pid': os.getpid(), 'event': event}
+        rec.update(fields)
+        line = json.dumps(rec, default=str)
+        with _lock:
+            self.f.write(line + '\n')
+
+
+class _Span:
+    __slots__ = ('name', 'fields', 't0')
+
+    def __init__(self, name, fields):
+        self.name, self.fields = name, fields
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dt = time.perf_counter() - self.t0
+        rec = _state
+        with _lock:
+            s = rec.spans.get(self.name)
+            if s is None:
+                rec.spans[self.name] = [1, dt, dt]
+            else:
+                s[0] += 1
+                s[1] += dt
+                if dt > s[2]:
+                    s[2] = dt
+        if rec.per_span:
+            rec.write('span', dict(self.fields, name=self.name, ms=round(dt * 1000, 3),
+                                   **({'error': exc_type.__name__} if exc_type else {})))
+        return False
+
+
+def _is_pool_worker():
+    # spawned/forked multiprocessing children have a parent_process(); plain subprocesses do not.
+    # A worker always has multiprocessing imported, so this never imports it in the main process.
+    mp = sys.modules.get('multiprocessing')
+    return mp is not None and mp.parent_process() is not None
+
+
+def start(tool=None, path=None):
+    """Enable telemetry for this process (path defaults to $FRUITYOLO_TELEMETRY); no-op if already on."""
+    global _state
+    path = path or os.environ.get(ENV_PATH)
+    if _state or not path:
+        _state = _state or False
+        return bool(_state)
+    tool = tool or Path(sys.argv[0]).stem
+    _state = _Recorder(path, tool, os.environ.get(ENV_SPANS, '') not in ('', '0'))
+    parent_run = os.environ.get(ENV_RUN)
+    if parent_run and _is_pool_worker():  # spans only, no run_start/run_end
+        _state.run = parent_run
+        _state.finished = True
+        return True
+    os.environ[ENV_RUN] = _state.run
+    _state.write('run_start', {'argv': sys.argv[1:], 'cwd': os.getcwd(), 'python': sys.version.split()[0],
+                               **({'parent_run': parent_run} if parent_run else {})})
+    atexit.register(finish)  # direct `python tools/x.py` runs; the CLI calls finish() itself
+    return True
+
+
+def enabled():
+    if _state is None:
+        start()
+    return bool(_state)
+
+
+def span(name, **fields):
+    if _state is None:
+        start()
+    return _Span(name, fields) if _state else _NULL
+
+
+def count(name, n=1):
+    if _state is None:
+        start()
+    if _state:
+        with _lock:
+            _state.counters[name] = _state.counters.get(name, 0) + n
+
+
+def event(name, **fields):
+    if _state is None:
+        start()
+    if _state:
+        _state.write(name, fields)
+
+
+def summary():
+    """Per-span totals of this process so far: {name: {n, total_s, mean_ms, max_ms}}."""
+    if not _state:
+        return {}
+    with _lock:
+        return {k: {'n': n, 'total_s': round(t, 4), 'mean_ms': round(t / n * 1000, 4), 'max_ms': round(mx * 1000, 3)}
+                for k, (n, t, mx) in sorted(_state.spans.items(), key=lambda kv: -kv[1][1])}
+
+
+def finish(rc=None):
+    """Write `run_end` once and print where the events went."""
+    rec = _state
+    if not rec or rec.finished or rec.owner != os.getpid():  # forked children inherit the recorder
+        return
+    rec.finished = True
+    from stream_io import peak_rss_mb
+    own, child = peak_rss_mb()
+    wall = time.perf_counter() - rec.t0
+    spans = summary()
+    rec.write('run_end', {'rc': rc, 'wall_s': round(wall, 3), 'peak_mb': own, 'child_peak_mb': child,
+                          'counters': dict(rec.counters), 'spans': spans})
+    rec.f.close()
+    print(f'Telemetry: {rec.run} -> {rec.path} ({wall:.1f}s wall)')
+    for name, s in list(spans.items())[:8]:
+        print(f"  {name:16s} {s['n']:9d} x {s['mean_ms']:9.3f} ms = {s['total_s']:8.2f} s")
+
+
+def profile_call(fn, kind, out=None):
+    """Run fn() under cProfile or pyinstrument; write the dump and print the top entries."""
+    out = Path(out or f'runs/profile/{(_state.tool if _state else Path(sys.argv[0]).stem)}-'
+                      f'{time.strftime("%Y%m%dT%H%M%S")}.{"html" if kind == "pyinstrument" else "prof"}')
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print('pyinstrument is not installed (pip install pyinstrument); using cProfile')
+            return profile_call(fn, 'cprofile', out.with_suffix('.prof'))
+        prof = Profiler()
+        prof.start()
+        try:
+            return fn()
+        finally:
+            prof.stop()
+            out.write_text(prof.output_html(), encoding='utf-8')
+            print(prof.output_text(unicode=False, color=False, show_all=False)[:4000])
+            print('Profile written to', out)
+            event('profile', kind=kind, path=str(out))
+    import cProfile
+    import pstats
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        return fn()
+    finally:
+        prof.disable()
+        prof.dump_stats(out)
+        pstats.Stats(prof).sort_stats('cumulative').print_stats(15)
+        print(f'Profile written to {out} (view with `python -m pstats {out}` or snakeviz)')
+        event('profile', kind='cprofile', path=str(out))
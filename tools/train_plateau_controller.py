@@ -4,53 +4,43 @@ import time
 import os
 import signal
 import sys
-try:
-    import pandas as pd
-except Exception:
-    pd = None
 
+import telemetry
+from run_registry import CsvTail
 
-def read_metric(csv_path, metric, window=3):
+
+def read_metric(csv_path, metric, window=3, tail=None):
+    """Smoothed metric series; with a CsvTail only newly appended rows are parsed."""
     if not os.path.exists(csv_path):
         return None
-    if pd:
-        df = pd.read_csv(csv_path)
-        # accept common column names
-        col = None
-        for c in df.columns:
-            if metric in c or c.replace('_','') == metric.replace('_',''):
-                col = c
+    if tail is None:
+        tail = CsvTail(csv_path)
+    tail.read_new()
+    rows = tail.rows
+    if not rows:
+        return None
+    if metric not in rows[0]:
+        # try some variants
+        for k in rows[0].keys():
+            if metric in k or k.replace('_', '') == metric.replace('_', ''):
+                metric = k
                 break
-        if col is None:
-            return None
-        s = df[col].rolling(window, min_periods=1).mean()
-        return s
-    else:
-        # fallback: simple CSV parse
-        import csv
-        with open(csv_path, newline='') as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            if not rows:
-                return None
-            if metric not in rows[0]:
-                # try some variants
-                for k in rows[0].keys():
-                    if metric in k:
-                        metric = k
-                        break
-            vals = []
-            for r in rows:
-                try:
-                    vals.append(float(r.get(metric, 'nan')))
-                except Exception:
-                    vals.append(float('nan'))
-            # simple moving average
-            out = []
-            for i in range(len(vals)):
-                window_vals = [v for v in vals[max(0, i-window+1):i+1] if not (v!=v)]
-                out.append(sum(window_vals)/len(window_vals) if window_vals else float('nan'))
-            return out
+    vals = []
+    for r in rows:
+        try:
+            if metric == 'fitness' and 'fitness' not in r:
+                # results.csv has no fitness column; Ultralytics uses 0.1*mAP50 + 0.9*mAP50-95
+                vals.append(0.1 * float(r['metrics/mAP50(B)']) + 0.9 * float(r['metrics/mAP50-95(B)']))
+            else:
+                vals.append(float(r.get(metric, 'nan')))
+        except Exception:
+            vals.append(float('nan'))
+    # simple moving average
+    out = []
+    for i in range(len(vals)):
+        window_vals = [v for v in vals[max(0, i-window+1):i+1] if not (v!=v)]
+        out.append(sum(window_vals)/len(window_vals) if window_vals else float('nan'))
+    return out
 
 
 def build_command(base_cmd, lr=None, resume=False):
@@ -85,6 +75,8 @@ def main():
 
     lr = args.initial_lr
     reductions = 0
+    # one incremental reader per CSV: each check parses only the rows appended since the last one
+    tails = {}
 
     # function to start training subprocess
     def start_train(cmd):
@@ -98,6 +90,7 @@ def main():
     current_cmd = build_command(args.base, lr=lr, resume=False)
     print('Start command:', current_cmd)
     proc = start_train(current_cmd)
+    telemetry.event('train_start', cmd=current_cmd, lr=lr, pid=proc.pid)
     start_time = time.time()
 
     try:
@@ -106,6 +99,8 @@ def main():
             # if process ended, exit
             if proc.poll() is not None:
                 print('Training process exited with', proc.returncode)
+                telemetry.event('train_exit', rc=proc.returncode, reductions=reductions,
+                                elapsed_s=round(time.time() - start_time, 1))
                 break
 
             # prefer metrics.csv but fallback to results.csv
@@ -114,99 +109,60 @@ def main():
                 print('No metrics file found yet; waiting...')
                 time.sleep(args.check_interval)
                 continue
-            s = read_metric(csv_to_use, args.metric, window=args.smooth)
+            if csv_to_use not in tails:
+                tails[csv_to_use] = CsvTail(csv_to_use)
+            with telemetry.span('metrics_read'):
+                s = read_metric(csv_to_use, args.metric, window=args.smooth, tail=tails[csv_to_use])
             if s is None:
                 print('metrics.csv not ready yet; waiting...')
                 continue
 
-            if pd:
-                sm = s.dropna()
-                if sm.empty:
-                    continue
-                best = sm.max()
-                # require at least min_epochs rows
-                epochs_done = len(sm)
-                recent = sm.tail(args.patience)
-                print(f'epochs={epochs_done} best={best:.6f} recent_tail={list(recent.round(6))}')
-                if epochs_done < args.min_epochs:
-                    continue
-                # check plateau
-                if ((best - recent) <= args.min_delta).all():
-                    print('Plateau detected')
-                    if reductions < args.max_reductions:
-                        # reduce LR and resume
-                        reductions += 1
-                        if lr is None:
-                            # can't determine lr: set a default
-                            lr = 0.01
-                        lr = lr * args.lr_reduce_factor
-                        print(f'Reducing LR -> {lr}, restarting with resume')
-                        # send ctrl-break to allow YOLO to save
-                        try:
-                            if os.name == 'nt':
-                                proc.send_signal(signal.CTRL_BREAK_EVENT)
-                            else:
-                                os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-                        except Exception as e:
-                            print('Failed to send interrupt to process:', e)
-                            proc.terminate()
-                        proc.wait()
-                        # restart with resume and new lr
-                        current_cmd = build_command(args.base, lr=lr, resume=True)
-                        proc = start_train(current_cmd)
-                        continue
-                    else:
-                        print('Max LR reductions reached — stopping training')
-                        try:
-                            if os.name == 'nt':
-                                proc.send_signal(signal.CTRL_BREAK_EVENT)
-                            else:
-                                os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-                        except Exception:
-                            proc.terminate()
-                        proc.wait()
-                        break
-            else:
-                # fallback simple list
-                sm = s
-                epochs_done = len(sm)
-                if epochs_done < args.min_epochs:
+            sm = [v for v in s if v == v]
+            epochs_done = len(sm)
+            if epochs_done < args.min_epochs:
+                continue
+            best = max(sm)
+            recent = sm[-args.patience:]
+            print(f'epochs={epochs_done} best={best:.6f} recent_tail={recent}')
+            telemetry.event('epoch_check', epochs=epochs_done, metric=args.metric, best=best, recent=recent)
+            if all((best - v) <= args.min_delta for v in recent):
+                print('Plateau detected')
+                telemetry.event('plateau', epochs=epochs_done, best=best, reductions=reductions)
+                if reductions < args.max_reductions:
+                    reductions += 1
+                    if lr is None:
+                        lr = 0.01
+                    lr = lr * args.lr_reduce_factor
+                    print(f'Reducing LR -> {lr}, restarting with resume')
+                    telemetry.event('lr_reduce', epochs=epochs_done, lr=lr, reduction=reductions)
+                    try:
+                        if os.name == 'nt':
+                            proc.send_signal(signal.CTRL_BREAK_EVENT)
+                        else:
+                            os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+                    except Exception:
+                        proc.terminate()
+                    proc.wait()
+                    current_cmd = build_command(args.base, lr=lr, resume=True)
+                    proc = start_train(current_cmd)
                     continue
-                best = max(sm)
-                recent = sm[-args.patience:]
-                print(f'epochs={epochs_done} best={best:.6f} recent_tail={recent}')
-                if all((best - v) <= args.min_delta for v in recent):
-                    print('Plateau detected (fallback)')
-                    if reductions < args.max_reductions:
-                        reductions += 1
-                        if lr is None:
-                            lr = 0.01
-                        lr = lr * args.lr_reduce_factor
-                        print(f'Reducing LR -> {lr}, restarting with resume')
-                        try:
-                            if os.name == 'nt':
-                                proc.send_signal(signal.CTRL_BREAK_EVENT)
-                            else:
-                                os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-                        except Exception:
-                            proc.terminate()
-                        proc.wait()
-                        current_cmd = build_command(args.base, lr=lr, resume=True)
-                        proc = start_train(current_cmd)
-                        continue
-                    else:
-                        print('Max LR reductions reached — stopping training')
-                        try:
-                            if os.name == 'nt':
-                                proc.send_signal(signal.CTRL_BREAK_EVENT)
-                            else:
-                                os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-                        except Exception:
-                            proc.terminate()
-                        proc.wait()
-                        break
+                else:
+                    print('Max LR reductions reached — stopping training')
+                    telemetry.event('train_exit', rc=None, reason='max_reductions', reductions=reductions,
+                                    elapsed_s=round(time.time() - start_time, 1))
+                    try:
+                        if os.name == 'nt':
+                            proc.send_signal(signal.CTRL_BREAK_EVENT)
+                        else:
+                            os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+                    except Exception:
+                        proc.terminate()
+                    proc.wait()
+                    break
     except KeyboardInterrupt:
         print('Controller interrupted by user, terminating training')
+        telemetry.event('train_exit', rc=None, reason='interrupted', reductions=reductions,
+                        elapsed_s=round(time.time() - start_time, 1))
         try:
             proc.terminate()
         except Exception:
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Epoch-time and data-loader throughput profiler for Ultralytics training.
+
+Attaches to the trainer callbacks and records, per epoch:
+  - data wait: time between the end of one batch and the start of the next
+    (dataloader + mosaic/augmentation not hidden by the workers)
+  - compute: batch start -> batch end (preprocess, forward, backward, optimizer)
+  - forward: model forward time via module hooks (part of compute)
+  - val: train epoch end -> fit epoch end (validation + checkpoint save)
+  - images/s, process CPU %, current RSS (with psutil, incl. workers) and
+    the main process's peak RSS
+Writes `profile.csv` (per epoch), `profile_batches.csv` and `profile_summary.json`
+into the run directory and prints a summary.
+
+Usage (CPU-only smoke profile with a tiny model):
+  python tools/train_profiler.py --model yolov8n.yaml --data Dataset_resplit_aug/data.yaml \
+      --epochs 1 --imgsz 160 --batch 8 --device cpu --fraction 0.05 workers=2
+
+Or from code: TrainProfiler().attach(YOLO('yolov8s.pt')) before model.train(...).
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from pathlib import Path
+
+from stream_io import peak_rss_mb
+
+
+def process_usage():
+    """(cpu_seconds, rss_mb, peak_rss_mb): CPU and current RSS of this process + dataloader workers
+    (current RSS needs psutil, NaN without it), peak RSS of this process."""
+    peak = peak_rss_mb()[0]
+    peak = float('nan') if peak is None else peak
+    try:
+        import psutil
+        proc = psutil.Process()
+        procs = [proc] + proc.children(recursive=True)
+        cpu = rss = 0.0
+        for p in procs:
+            try:
+                t = p.cpu_times()
+                cpu += t.user + t.system
+                rss += p.memory_info().rss
+            except psutil.Error:
+                continue
+        return cpu, rss / 1e6, peak
+    except ImportError:
+        t = os.times()
+        return t.user + t.system + t.children_user + t.children_system, float('nan'), peak
+
+
+class TrainProfiler:
+    EPOCH_FIELDS = ['epoch', 'epoch_s', 'train_s', 'val_s', 'batches', 'images', 'images_per_s',
+                    'data_wait_s', 'compute_s', 'forward_s', 'data_wait_frac', 'cpu_percent', 'rss_mb', 'peak_rss_mb']
+
+    def __init__(self, sync_cuda=True, probe_samples=0):
+        self.sync_cuda = sync_cuda
+        self.probe_samples = probe_samples
+        self.epochs = []
+        self.batches = []
+        self.save_dir = None
+        self._fwd_total = 0.0
+        self._fwd_t0 = None
+        self._batch_n = None
+
+    def attach(self, model):
+        """Register callbacks on a `YOLO` model (or anything with add_callback)."""
+        for event in ('on_train_start', 'on_train_epoch_start', 'on_train_batch_start', 'on_train_batch_end',
+                      'on_train_epoch_end', 'on_fit_epoch_end', 'on_train_end'):
+            model.add_callback(event, getattr(self, event))
+        return self
+
+    def _now(self, trainer=None):
+        if self.sync_cuda and trainer is not None and getattr(trainer.device, 'type', 'cpu') == 'cuda':
+            import torch
+            torch.cuda.synchronize(trainer.device)
+        return time.perf_counter()
+
+    # forward hooks on the top-level module (the first call wraps the whole forward)
+    def _fwd_pre(self, module, inputs):
+        if module.training:
+            self._fwd_t0 = time.perf_counter()
+            # the trainer calls model(batch) with the batch dict; BaseTrainer keeps it local, not on trainer
+            x = inputs[0] if inputs else None
+            x = x.get('img') if isinstance(x, dict) else x
+            if self._batch_n is None and hasattr(x, 'shape'):
+                self._batch_n = int(x.shape[0])
+
+    def _fwd_post(self, module, inputs, output):
+        if module.training and self._fwd_t0 is not None:
+            self._fwd_total += time.perf_counter() - self._fwd_t0
+            self._fwd_t0 = None
+
+    def on_train_start(self, trainer):
+        self.save_dir = Path(trainer.save_dir)
+        trainer.model.register_forward_pre_hook(self._fwd_pre)
+        trainer.model.register_forward_hook(self._fwd_post)
+        if self.probe_samples:
+            self.probe = probe_dataset(trainer.train_loader.dataset, self.probe_samples)
+            print('Dataset probe:', self.probe)
+
+    def on_train_epoch_start(self, trainer):
+        self._ep = {'epoch': trainer.epoch + 1, 'batches': 0, 'images': 0,
+                    'data_wait_s': 0.0, 'compute_s': 0.0}
+        self._fwd_total = 0.0
+        self._cpu0 = process_usage()[0]
+        self._ep_t0 = self._last_end = self._now(trainer)
+
+    def on_train_batch_start(self, trainer):
+        self._b_t0 = self._now(trainer)
+        self._wait = self._b_t0 - self._last_end
+        self._batch_n = None
+
+    def on_train_batch_end(self, trainer):
+        t = self._now(trainer)
+        compute = t - self._b_t0
+        n = self._batch_n if self._batch_n is not None else trainer.batch_size  # partial last batch included
+        ep = self._ep
+        ep['batches'] += 1
+        ep['images'] += n
+        ep['data_wait_s'] += self._wait
+        ep['compute_s'] += compute
+        self.batches.append({'epoch': ep['epoch'], 'batch': ep['batches'], 'images': n,
+                             'data_wait_s': round(self._wait, 5), 'compute_s': round(compute, 5)})
+        self._last_end = t
+
+    def on_train_epoch_end(self, trainer):
+        self._train_end = self._now(trainer)
+
+    def on_fit_epoch_end(self, trainer):
+        t = self._now(trainer)
+        cpu1, rss, peak = process_usage()
+        ep = self._ep
+        ep['train_s'] = self._train_end - self._ep_t0
+        ep['val_s'] = t - self._train_end
+        ep['epoch_s'] = t - self._ep_t0
+        ep['forward_s'] = self._fwd_total
+        ep['images_per_s'] = ep['images'] / max(ep['train_s'], 1e-9)
+        ep['data_wait_frac'] = ep['data_wait_s'] / max(ep['train_s'], 1e-9)
+        ep['cpu_percent'] = 100.0 * (cpu1 - self._cpu0) / max(ep['epoch_s'], 1e-9)
+        ep['rss_mb'] = rss
+        ep['peak_rss_mb'] = peak
+        self.epochs.append({k: round(v, 4) if isinstance(v, float) else v for k, v in ep.items()})
+        self.write()
+
+    def on_train_end(self, trainer):
+        self.write()
+        print(self.summary_text())
+
+    def summary(self):
+        if not self.epochs:
+            return {}
+        tot = {k: sum(e[k] for e in self.epochs) for k in ('epoch_s', 'train_s', 'val_s', 'data_wait_s',
+                                                           'compute_s', 'forward_s', 'images')}
+        return {
+            'epochs': len(self.epochs),
+            'mean_epoch_s': tot['epoch_s'] / len(self.epochs),
+            'share_data_wait': tot['data_wait_s'] / max(tot['epoch_s'], 1e-9),
+            'share_forward': tot['forward_s'] / max(tot['epoch_s'], 1e-9),
+            'share_backward_optim': (tot['compute_s'] - tot['forward_s']) / max(tot['epoch_s'], 1e-9),
+            'share_val': tot['val_s'] / max(tot['epoch_s'], 1e-9),
+            'train_images_per_s': tot['images'] / max(tot['train_s'], 1e-9),
+            'max_rss_mb': max((e['rss_mb'] for e in self.epochs if e['rss_mb'] == e['rss_mb']), default=None),
+            'peak_rss_mb': max((e['peak_rss_mb'] for e in self.epochs if e['peak_rss_mb'] == e['peak_rss_mb']),
+                               default=None),
+            'probe': getattr(self, 'probe', None),
+        }
+
+    def summary_text(self):
+        s = self.summary()
+        if not s:
+            return 'No epochs profiled'
+        return (f"Profiled {s['epochs']} epochs, mean {s['mean_epoch_s']:.1f}s/epoch, "
+                f"{s['train_images_per_s']:.1f} img/s\n"
+                f"  data wait {s['share_data_wait']:.1%}  forward {s['share_forward']:.1%}  "
+                f"backward+optim {s['share_backward_optim']:.1%}  val+save {s['share_val']:.1%}"
+                + (f"  peak RSS {s['peak_rss_mb']:.0f} MB" if s['peak_rss_mb'] is not None else ''))
+
+    def write(self):
+        if self.save_dir is None:
+            return
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.save_dir / 'profile.csv', 'w', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, fieldnames=self.EPOCH_FIELDS)
+            w.writeheader()
+            w.writerows(self.epochs)
+        with open(self.save_dir / 'profile_batches.csv', 'w', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, fieldnames=['epoch', 'batch', 'images', 'data_wait_s', 'compute_s'])
+            w.writeheader()
+            w.writerows(self.batches)
+        (self.save_dir / 'profile_summary.json').write_text(json.dumps(self.summary(), indent=2), encoding='utf-8')
+
+
+def probe_dataset(dataset, n):
+    """Time image decode (load_image) vs the full __getitem__ (mosaic + transforms) on n samples."""
+    n = min(n, len(dataset))
+    t0 = time.perf_counter()
+    for i in range(n):
+        dataset.load_image(i)
+    t_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(n):
+        dataset[i]
+    t_item = time.perf_counter() - t0
+    return {'samples': n, 'load_image_ms': 1000 * t_load / n, 'getitem_ms': 1000 * t_item / n,
+            'augment_ms_est': 1000 * max(t_item - t_load, 0.0) / n}
+
+
+def parse_overrides(extra):
+    out = {}
+    for kv in extra:
+        k, _, v = kv.partition('=')
+        try:
+            v = json.loads(v)
+        except ValueError:
+            pass
+        out[k] = v
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--model', default='yolov8n.yaml', help='model yaml/pt (yaml = untrained, fastest to set up)')
+    p.add_argument('--data', default='Dataset_resplit_aug/data.yaml')
+    p.add_argument('--epochs', type=int, default=1)
+    p.add_argument('--imgsz', type=int, default=160)
+    p.add_argument('--batch', type=int, default=8)
+    p.add_argument('--device', default='cpu')
+    p.add_argument('--fraction', type=float, default=0.05, help='fraction of the train set to use')
+    p.add_argument('--name', default='profile')
+    p.add_argument('--probe', type=int, default=32, help='dataset samples for the decode/augment probe (0 = off)')
+    p.add_argument('overrides', nargs='*', help='extra trainer args as key=value (e.g. workers=2 mosaic=0.0)')
+    args = p.parse_args()
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.model)
+    prof = TrainProfiler(probe_samples=args.probe).attach(model)
+    model.train(data=args.data, epochs=args.epochs, imgsz=args.imgsz, batch=args.batch, device=args.device,
+                fraction=args.fraction, name=args.name, exist_ok=True, plots=False,
+                **parse_overrides(args.overrides))
+    print('Profile written to', prof.save_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())